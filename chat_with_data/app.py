@@ -1,13 +1,17 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-import sqlite3
 import os
+import tempfile
+import weakref
 import logging
+from functools import partial
 from dotenv import load_dotenv
 
 from src.agent import DataAgent
-from src.tools import get_sample_queries, get_schema
+from src.tools import get_sample_queries, get_schema, export_query, get_cache_stats, EXPORT_FORMATS
+from src.pool import get_pool
+from src.tracing import TRACER, span, start_metrics_server
 
 load_dotenv()
 
@@ -28,46 +32,99 @@ def get_conn():
     if not os.path.exists(DB_PATH):
         st.error(f"Database not found at {DB_PATH}. Run database_setup.py first!")
         st.stop()
-    return sqlite3.connect(DB_PATH)
+    # Pooled read-only connection, returned to the pool on exit
+    return get_pool(DB_PATH).connection()
 
-def get_stats():
-    conn = get_conn()
+def db_version():
+    if not os.path.exists(DB_PATH):
+        st.error(f"Database not found at {DB_PATH}. Run database_setup.py first!")
+        st.stop()
+    # stat() only, so an idle dashboard doesn't hit sqlite at all
+    return get_pool(DB_PATH).stamp()
+
+# One pass over the data, grouped by printer x material. Totals and both
+# charts are derived from this small frame in pandas.
+STATS_SQL = """
+    SELECT printer_name, material_type,
+           SUM(jobs) AS jobs, SUM(successes) AS successes,
+           SUM(grams) AS grams, SUM(hours) AS hours, SUM(cost) AS cost
+    FROM print_daily_rollup
+    GROUP BY printer_name, material_type
+"""
+
+# Pre-rollup dbs only, scans the whole table
+RAW_STATS_SQL = """
+    SELECT printer_name, material_type,
+           COUNT(*) AS jobs, SUM(success_status) AS successes,
+           SUM(weight_used_grams) AS grams, SUM(print_time_hours) AS hours, SUM(cost_usd) AS cost
+    FROM print_jobs
+    GROUP BY printer_name, material_type
+"""
+
+# version is only there to key the cache: shared by every session, recomputed
+# only when the db files actually change
+@st.cache_data(show_spinner=False, max_entries=4)
+def get_stats(version):
+    with span("dashboard.get_stats") as sp, get_conn() as conn:
+        has_rollup = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name='print_daily_rollup'"
+        ).fetchone()
+        if not has_rollup:
+            log.warning("No rollup table, falling back to raw scans. Run database_setup.py --migrate")
+        df = pd.read_sql(STATS_SQL if has_rollup else RAW_STATS_SQL, conn)
+        sp.set(rollup=bool(has_rollup), groups=len(df))
+    log.info("Stats recomputed")
+    return summarize_stats(df.fillna(0))
+
+def summarize_stats(df):
     stats = {}
     
-    # Basic counts
-    stats['total_prints'] = conn.execute("SELECT COUNT(*) FROM print_jobs").fetchone()[0]
-    stats['success_count'] = conn.execute("SELECT COUNT(*) FROM print_jobs WHERE success_status = 1").fetchone()[0]
+    stats['total_prints'] = int(df['jobs'].sum())
+    stats['success_count'] = int(df['successes'].sum())
+    stats['total_kg'] = df['grams'].sum() / 1000.0
+    stats['total_hours'] = df['hours'].sum()
+    stats['total_cost'] = df['cost'].sum()
     
     if stats['total_prints'] > 0:
         stats['success_rate'] = (stats['success_count'] / stats['total_prints']) * 100
     else:
         stats['success_rate'] = 0
-        
-    # Totals
-    res = conn.execute("""
-        SELECT 
-            SUM(weight_used_grams) / 1000.0,
-            SUM(print_time_hours),
-            SUM(cost_usd)
-        FROM print_jobs
-    """).fetchone()
-    
-    stats['total_kg'] = res[0] or 0
-    stats['total_hours'] = res[1] or 0
-    stats['total_cost'] = res[2] or 0
     
     # Grouped data for charts
-    stats['by_material'] = pd.read_sql("SELECT material_type, count(*) as count FROM print_jobs GROUP BY material_type", conn)
-    stats['by_printer'] = pd.read_sql("SELECT printer_name, AVG(success_status)*100 as success_rate FROM print_jobs GROUP BY printer_name", conn)
+    by_material = df.groupby('material_type', as_index=False, dropna=False)['jobs'].sum()
+    stats['by_material'] = by_material.rename(columns={'jobs': 'count'})
+    
+    by_printer = df.groupby('printer_name', as_index=False, dropna=False)[['successes', 'jobs']].sum()
+    by_printer['success_rate'] = by_printer['successes'] * 100.0 / by_printer['jobs']
+    stats['by_printer'] = by_printer[['printer_name', 'success_rate']]
     
-    conn.close()
     return stats
 
+@st.cache_resource(show_spinner=False, max_entries=4)
+def get_figures(version):
+    # Built once per db version and shared, Plotly figure building isn't free either
+    s = get_stats(version)
+    figs = {}
+    
+    if not s['by_material'].empty:
+        fig = px.pie(s['by_material'], values='count', names='material_type', hole=0.4)
+        fig.update_layout(height=200, margin=dict(l=0, r=0, t=0, b=0), showlegend=False)
+        figs['materials'] = fig
+        
+    if not s['by_printer'].empty:
+        fig2 = px.bar(s['by_printer'], x='success_rate', y='printer_name', orientation='h')
+        fig2.update_layout(height=200, margin=dict(l=0, r=0, t=0, b=0), xaxis_title="Success %", yaxis_title=None)
+        figs['printers'] = fig2
+    
+    return figs
+
 def sidebar():
     st.sidebar.title("🧊 Print Lab Stats")
     
     try:
-        s = get_stats()
+        version = db_version()
+        s = get_stats(version)
+        figs = get_figures(version)
     except Exception as e:
         st.sidebar.error(f"DB Error: {e}")
         return
@@ -87,16 +144,12 @@ def sidebar():
     
     # Mini Charts
     st.sidebar.subheader("Materials Used")
-    if not s['by_material'].empty:
-        fig = px.pie(s['by_material'], values='count', names='material_type', hole=0.4)
-        fig.update_layout(height=200, margin=dict(l=0, r=0, t=0, b=0), showlegend=False)
-        st.sidebar.plotly_chart(fig, use_container_width=True)
+    if 'materials' in figs:
+        st.sidebar.plotly_chart(figs['materials'], use_container_width=True)
         
     st.sidebar.subheader("Printer Reliability")
-    if not s['by_printer'].empty:
-        fig2 = px.bar(s['by_printer'], x='success_rate', y='printer_name', orientation='h')
-        fig2.update_layout(height=200, margin=dict(l=0, r=0, t=0, b=0), xaxis_title="Success %", yaxis_title=None)
-        st.sidebar.plotly_chart(fig2, use_container_width=True)
+    if 'printers' in figs:
+        st.sidebar.plotly_chart(figs['printers'], use_container_width=True)
 
     # Queries
     st.sidebar.markdown("---")
@@ -116,12 +169,38 @@ def init_agent():
             
         config = {
             "db_path": DB_PATH,
-            "github_token": os.environ.get("GITHUB_TOKEN")
+            "github_token": os.environ.get("GITHUB_TOKEN"),
+            "embed_schema": True,
+            "plan_cache": "data/plan_cache.db",
+            "result_format": os.environ.get("RESULT_FORMAT", "columnar")  # json | columnar | markdown
         }
         st.session_state.agent = DataAgent(key, config=config)
         log.info("Agent started")
     return st.session_state.agent
 
+def render_stream(events):
+    # Tool progress goes in a status box, answer tokens are drawn as they arrive
+    status = None
+    placeholder = st.empty()
+    placeholder.caption("Analyzing print logs...")
+    text = ""
+    for ev in events:
+        if ev["type"] == "tool_start":
+            if status is None:
+                status = st.status("Querying print logs...")
+            status.write(f"Running `{ev['name']}`")
+        elif ev["type"] == "tool_done":
+            status.write(f"`{ev['name']}` {'done' if ev['success'] else 'failed'}")
+        elif ev["type"] == "token":
+            text += ev["text"]
+            placeholder.markdown(text + "▌")
+        elif ev["type"] == "done":
+            text = ev["text"]
+    placeholder.markdown(text)
+    if status is not None:
+        status.update(label="Queried print logs", state="complete")
+    return text
+
 def chat_interface():
     st.title("🖨️ 3D Printing Analytics Assistant")
     st.markdown("Ask about your print history, failures, costs, or printer stats.")
@@ -152,14 +231,14 @@ def chat_interface():
         agent = init_agent()
         if agent:
             with st.chat_message("assistant"):
-                with st.spinner("Analyzing print logs..."):
-                    try:
-                        resp = agent.chat_sync(user_input)
-                        st.markdown(resp)
-                        st.session_state.messages.append({"role": "assistant", "content": resp})
-                    except Exception as e:
-                        st.error(f"Agent crashed: {e}")
-                        log.error(f"Agent failed: {e}")
+                try:
+                    resp = render_stream(agent.chat_stream(user_input))
+                    st.session_state.messages.append({"role": "assistant", "content": resp})
+                    st.session_state.last_queries = agent.last_queries
+                    st.session_state.pop("export_file", None)
+                except Exception as e:
+                    st.error(f"Agent crashed: {e}")
+                    log.error(f"Agent failed: {e}")
 
     # Utilities
     with st.expander("🛠️ Tools & Settings"):
@@ -177,7 +256,116 @@ def chat_interface():
             })
             st.rerun()
 
+        cs = get_cache_stats()
+        st.caption(f"Query cache: {cs['hits']} hits / {cs['misses']} misses ({cs['hit_rate']:.0f}%), {cs['bytes'] / 1024:.0f} KB")
+
+        if "agent" in st.session_state and st.session_state.agent.agent.plans:
+            ps = st.session_state.agent.agent.plans.stats()
+            st.caption(f"Question cache: {ps['hits']} hits / {ps['misses']} misses ({ps['hit_rate']:.0f}%)")
+
+        if "agent" in st.session_state and st.session_state.agent.turn_tokens:
+            t = st.session_state.agent.turn_tokens[-1]
+            st.caption(f"Last answer: {t['prompt_tokens']} prompt tokens over {t['calls']} call(s), history {t['history_tokens']} tokens before compaction")
+
+        st.toggle("Show performance breakdown", key="show_perf")
+
+        export_panel()
+
+    if st.session_state.get("show_perf"):
+        performance_panel()
+
+def performance_panel():
+    # Where the time went for the last answer: LLM calls vs tools vs SQL
+    agent = st.session_state.get("agent")
+    spans = TRACER.get_trace(agent.last_trace_id) if agent and agent.last_trace_id else []
+    if not spans:
+        return
+
+    with st.expander("⏱️ Performance", expanded=True):
+        total = sum(s["duration_ms"] for s in spans if s["name"] == "agent.turn")
+        llm = sum(s["duration_ms"] for s in spans if s["name"] == "llm.completion")
+        tools = sum(s["duration_ms"] for s in spans if s["name"] == "tool.execute")
+        sql = sum(s["duration_ms"] for s in spans if s["name"] == "sql.execute")
+
+        c1, c2, c3, c4 = st.columns(4)
+        c1.metric("Total", f"{total:,.0f} ms")
+        c2.metric("LLM", f"{llm:,.0f} ms")
+        c3.metric("Tools", f"{tools:,.0f} ms")
+        c4.metric("SQL", f"{sql:,.0f} ms")
+
+        # Span tree as a table, children indented under their parent
+        depth = {}
+        t0 = spans[0]["start"]
+        rows = []
+        for s in spans:
+            d = depth[s["span_id"]] = depth.get(s["parent_id"], -1) + 1
+            rows.append({
+                "span": "· " * d + s["name"],
+                "start ms": round((s["start"] - t0) * 1000, 1),
+                "duration ms": round(s["duration_ms"], 1),
+                "details": ", ".join(f"{k}={v}" for k, v in s["attrs"].items() if k != "sql"),
+            })
+        st.dataframe(pd.DataFrame(rows), hide_index=True)
+
+@st.cache_resource(show_spinner=False)
+def metrics_server(port):
+    # One Prometheus scrape endpoint per process, survives Streamlit reruns
+    return start_metrics_server(port)
+
+class ExportFile:
+    # A session's prepared export, in its own temp file. The file is removed
+    # when the export is replaced or dropped (next answer) and when the session
+    # goes away, whichever comes first: both drop the last reference.
+    def __init__(self, fmt):
+        f = tempfile.NamedTemporaryFile(prefix="print_export_", suffix=f".{fmt}", delete=False)
+        f.close()
+        self.path = f.name
+        self.fmt = fmt
+        self.count = 0
+        self.discard = weakref.finalize(self, _remove_file, self.path)
+
+def _read_file(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+def _remove_file(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+def export_panel():
+    # Full result export for the SQL behind the last answer (chat only shows 50 rows)
+    queries = st.session_state.get("last_queries") or []
+    if not queries:
+        return
+
+    st.markdown("**Export full results**")
+    sql = st.selectbox("Query", queries)
+    fmt = st.selectbox("Format", EXPORT_FORMATS)
+
+    if st.button("Prepare export"):
+        st.session_state.pop("export_file", None)
+        export = ExportFile(fmt)
+        with st.spinner("Writing export..."):
+            res = export_query(sql, export.path, fmt=fmt, db_path=DB_PATH)
+        if res["success"]:
+            export.count = res["count"]
+            st.session_state.export_file = export
+        else:
+            export.discard()
+            st.error(f"Export failed: {res['error']}")
+
+    export = st.session_state.get("export_file")
+    if export and os.path.exists(export.path):
+        # A callable, so the file is only read when the button is clicked, not on every rerun.
+        # It holds the path, not the export, or Streamlit would keep the temp file alive.
+        st.download_button(f"Download {export.count} rows", data=partial(_read_file, export.path),
+                           file_name=f"print_export.{export.fmt}")
+
 def main():
+    if os.environ.get("METRICS_PORT"):
+        metrics_server(int(os.environ["METRICS_PORT"]))
     sidebar()
     chat_interface()
 
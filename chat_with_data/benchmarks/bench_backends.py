@@ -0,0 +1,159 @@
+"""
+SQLite vs columnar (DuckDB over Parquet) on the agent's typical queries.
+
+    python benchmarks/bench_backends.py --sizes 100k,1m
+    python benchmarks/bench_backends.py --sizes 10m --repeat 5
+
+Also times the initial Parquet snapshot and an incremental refresh after
+appending rows, and checks that both backends return the same rows for every
+query (exits non-zero if they don't). Needs duckdb installed.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import sqlite3
+import argparse
+import logging
+import tempfile
+from datetime import datetime
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from src import database_setup
+from src.tools import query_db, get_backend, RESULT_CACHE, UnsupportedQuery
+from src.columnar import ParquetSnapshot
+from src.governor import QueryGovernor
+from src.tracing import TRACER
+from bench_data_layer import AGENT_QUERIES, SIZES, fixture, timed
+
+import app
+
+QUERIES = dict(AGENT_QUERIES, dashboard_stats=app.STATS_SQL,
+               # case-insensitive in SQLite, DuckDB needs ILIKE for the same answer
+               model_search="SELECT COUNT(*) FROM print_jobs WHERE model_name LIKE '%dragon%'",
+               # failure_reason is NULL for every success, both must sort it first
+               null_order="SELECT failure_reason, COUNT(*) FROM print_jobs GROUP BY 1 ORDER BY 1 LIMIT 3")
+
+PARITY_ROWS = 10_000  # bigger results (select_star) aren't compared
+
+# no time limit, a slow SQLite scan on 10M rows is exactly what we want to see
+UNLIMITED = QueryGovernor(timeout=None, max_steps=None, max_result_bytes=None)
+
+
+def runs_natively(backend, sql):
+    try:
+        with backend.session() as (_, fetch):
+            fetch(sql, 1, UNLIMITED)
+        return True
+    except UnsupportedQuery:
+        return False
+
+
+def _canonical(rows):
+    # order-insensitive, floats to 6 significant digits (summation order differs)
+    return sorted((tuple(f"{v:.6g}" if isinstance(v, float) else v for v in r) for r in rows), key=repr)
+
+
+def parity(sqlite, columnar, sql):
+    # None when it can't be compared (columnar falls back, or too many rows)
+    results = []
+    for backend in (sqlite, columnar):
+        try:
+            with backend.session() as (_, fetch):
+                rows = fetch(sql, PARITY_ROWS + 1, UNLIMITED)[1]
+        except UnsupportedQuery:
+            return None
+        if len(rows) > PARITY_ROWS:
+            return None
+        results.append(_canonical(rows))
+    return results[0] == results[1]
+
+
+def bench_size(size_label, db_path, repeat, append_rows):
+    results = {}
+    # scratch copy, the refresh test appends rows
+    work = os.path.join(os.path.dirname(db_path), f"backends_{size_label}.db")
+    shutil.copy(db_path, work)
+    snap_dir = work.replace(".db", "_parquet")
+    shutil.rmtree(snap_dir, ignore_errors=True)
+
+    start = time.perf_counter()
+    ParquetSnapshot(work, snap_dir).refresh(full=True)
+    results[f"snapshot.build@{size_label}"] = {"median_ms": (time.perf_counter() - start) * 1000, "runs": 1}
+
+    columnar = get_backend(work, "columnar")
+    for name, sql in QUERIES.items():
+        for kind in ("sqlite", "columnar"):
+            def cold(sql=sql, kind=kind):
+                RESULT_CACHE.clear()
+                assert query_db(sql, work, limit=50, governor=UNLIMITED, backend=kind)["success"]
+            res = timed(cold, repeat)
+            if kind == "columnar" and not runs_natively(columnar, sql):
+                res["fallback"] = True  # SQLite-only SQL, timing is SQLite + a failed DuckDB parse
+            if kind == "columnar":
+                res["parity"] = parity(get_backend(work, "sqlite"), columnar, sql)
+            results[f"{name}.{kind}@{size_label}"] = res
+
+    conn = sqlite3.connect(work)
+    conn.executemany(database_setup.INSERT_SQL,
+                     database_setup._make_chunk(np.random.default_rng(7), append_rows, datetime.now()))
+    conn.commit()
+    conn.close()
+    start = time.perf_counter()
+    added = columnar.snapshot.refresh()
+    results[f"snapshot.refresh_{append_rows}@{size_label}"] = {"median_ms": (time.perf_counter() - start) * 1000, "runs": 1}
+    assert added == append_rows, added
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SQLite vs columnar backend")
+    parser.add_argument("--sizes", default="100k,1m", help=f"Comma separated fixture sizes ({', '.join(SIZES)})")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--append-rows", type=int, default=10_000, help="Rows appended before the refresh test")
+    parser.add_argument("--fixtures-dir", default=os.path.join(tempfile.gettempdir(), "print_bench"))
+    parser.add_argument("--out", default="bench_backends.json")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    TRACER.path = None
+    os.makedirs(args.fixtures_dir, exist_ok=True)
+
+    results = {}
+    for size_label in args.sizes.split(","):
+        db_path = fixture(size_label.strip(), args.fixtures_dir, args.seed)
+        results.update(bench_size(size_label.strip(), db_path, args.repeat, args.append_rows))
+
+    for size_label in args.sizes.split(","):
+        size_label = size_label.strip()
+        print(f"\n{size_label}: {'query':22s} {'sqlite ms':>12s} {'columnar ms':>12s} {'speedup':>8s}")
+        for name in QUERIES:
+            lite = results[f"{name}.sqlite@{size_label}"]
+            col = results[f"{name}.columnar@{size_label}"]
+            note = "  (falls back to sqlite)" if col.get("fallback") else ""
+            if col.get("parity") is False:
+                note += "  RESULTS DIFFER"
+            print(f"{'':{len(size_label) + 1}s} {name:22s} {lite['median_ms']:12.2f} {col['median_ms']:12.2f} "
+                  f"{lite['median_ms'] / max(col['median_ms'], 1e-6):7.1f}x{note}")
+        print(f"  snapshot build {results[f'snapshot.build@{size_label}']['median_ms']:.0f} ms, "
+              f"refresh +{args.append_rows} rows {results[f'snapshot.refresh_{args.append_rows}@{size_label}']['median_ms']:.0f} ms")
+
+    with open(args.out, "w") as f:
+        json.dump({"created": time.time(), "results": results}, f, indent=2)
+    print(f"\nResults written to {args.out}")
+
+    differ = [k for k, v in results.items() if v.get("parity") is False]
+    if differ:
+        print(f"Backends disagree on: {', '.join(differ)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+Microbenchmarks for the data layer (tools + dashboard stats + generator).
+
+    python benchmarks/bench_data_layer.py --sizes 1k,100k --out bench.json
+    python benchmarks/bench_data_layer.py --baseline bench.json   # exit 1 on regressions
+
+10M row fixtures are opt-in (--sizes 1k,100k,10m), building one takes a few minutes.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import logging
+import tempfile
+import statistics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from src import database_setup
+from src.pool import get_pool
+from src.tools import check_query, query_db, get_schema, RESULT_CACHE
+
+# Representative agent questions
+AGENT_QUERIES = {
+    "success_by_printer": "SELECT printer_name, SUM(success_status) * 100.0 / COUNT(*) AS success_rate FROM print_jobs GROUP BY printer_name",
+    "top5_cost": "SELECT model_name, printer_name, cost_usd FROM print_jobs ORDER BY cost_usd DESC LIMIT 5",
+    "failure_reasons": "SELECT failure_reason, COUNT(*) AS n FROM print_jobs WHERE success_status = 0 GROUP BY failure_reason ORDER BY n DESC",
+    "spend_last_month": "SELECT SUM(cost) FROM print_daily_rollup WHERE day >= date('now', 'start of month', '-1 month') AND day < date('now', 'start of month')",
+    "select_star": "SELECT * FROM print_jobs",
+}
+
+SIZES = {"1k": 1_000, "100k": 100_000, "1m": 1_000_000, "10m": 10_000_000}
+
+
+def timed(fn, repeat):
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        runs.append((time.perf_counter() - start) * 1000)
+    runs.sort()
+    return {
+        "median_ms": statistics.median(runs),
+        "p95_ms": runs[min(len(runs) - 1, int(len(runs) * 0.95))],
+        "min_ms": runs[0],
+        "runs": repeat,
+    }
+
+
+def fixture(size_label, fixtures_dir, seed):
+    rows = SIZES[size_label]
+    path = os.path.join(fixtures_dir, f"bench_{size_label}_s{seed}.db")
+    if not os.path.exists(path):
+        print(f"Building fixture {path}...")
+        database_setup.build_db(path, rows, seed=seed, chunk_size=min(rows, 200_000))
+    return path
+
+
+def bench_size(size_label, db_path, repeat):
+    results = {}
+
+    def add(name, fn, n=repeat):
+        results[f"{name}@{size_label}"] = timed(fn, n)
+
+    for name, sql in AGENT_QUERIES.items():
+        # cold = real SQL work, warm = result cache hit
+        def cold(sql=sql):
+            RESULT_CACHE.clear()
+            assert query_db(sql, db_path)["success"]
+        add(f"query_db.{name}.cold", cold)
+        add(f"query_db.{name}.warm", lambda sql=sql: query_db(sql, db_path))
+
+    add("check_query", lambda: [check_query(q, db_path) for q in AGENT_QUERIES.values()])
+    add("get_schema", lambda: get_schema(db_path))
+
+    # dashboard stats, uncached path (same SQL + summary the app runs)
+    import app
+    def stats():
+        with get_pool(db_path).connection() as conn:
+            app.summarize_stats(app.pd.read_sql(app.STATS_SQL, conn).fillna(0))
+    add("get_stats", stats)
+
+    return results
+
+
+def bench_generate(repeat):
+    results = {}
+    for label, rows in (("1k", 1_000), ("100k", 100_000)):
+        def gen(rows=rows):
+            with tempfile.TemporaryDirectory() as d:
+                database_setup.build_db(os.path.join(d, "gen.db"), rows, seed=1, chunk_size=50_000)
+        results[f"generate_data.{label}"] = timed(gen, max(1, repeat // 5))
+    return results
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, res in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        ratio = res["median_ms"] / max(base["median_ms"], 1e-6)
+        if ratio > 1 + tolerance:
+            regressions.append((name, base["median_ms"], res["median_ms"], ratio))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Data layer microbenchmarks")
+    parser.add_argument("--sizes", default="1k,100k", help=f"Comma separated fixture sizes ({', '.join(SIZES)})")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--fixtures-dir", default=os.path.join(tempfile.gettempdir(), "print_bench"))
+    parser.add_argument("--skip-generate", action="store_true", help="Don't time data generation")
+    parser.add_argument("--out", default="bench_results.json", help="Where to write the JSON results")
+    parser.add_argument("--baseline", help="Previous results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown vs baseline (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)  # tools log every query, way too noisy here
+    os.makedirs(args.fixtures_dir, exist_ok=True)
+
+    results = {}
+    for size_label in args.sizes.split(","):
+        db_path = fixture(size_label.strip(), args.fixtures_dir, args.seed)
+        results.update(bench_size(size_label.strip(), db_path, args.repeat))
+    if not args.skip_generate:
+        results.update(bench_generate(args.repeat))
+
+    for name, res in results.items():
+        print(f"{name:45s} median {res['median_ms']:9.3f} ms   p95 {res['p95_ms']:9.3f} ms")
+
+    with open(args.out, "w") as f:
+        json.dump({"created": time.time(), "results": results}, f, indent=2)
+    print(f"Results written to {args.out}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.tolerance)
+        for name, old, new, ratio in regressions:
+            print(f"REGRESSION {name}: {old:.3f} -> {new:.3f} ms ({ratio:.2f}x)")
+        if regressions:
+            sys.exit(1)
+        print("No regressions")
+
+
+if __name__ == "__main__":
+    main()
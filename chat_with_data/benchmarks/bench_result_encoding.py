@@ -0,0 +1,70 @@
+"""
+Token and CPU cost of each tool-result format (tools.RESULT_FORMATS) on the
+agent's typical queries.
+
+    python benchmarks/bench_result_encoding.py --size 100k
+"""
+import os
+import sys
+import time
+import json
+import argparse
+import logging
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from src.tools import query_db, encode_result, RESULT_FORMATS
+from src.history import count_text
+from bench_data_layer import AGENT_QUERIES, SIZES, fixture
+
+# a few wider ones on top, these are where the encoding matters most
+EXTRA_QUERIES = {
+    "cost_by_printer_material": "SELECT printer_name, material_type, AVG(cost_usd) AS avg_cost, SUM(success_status) * 1.0 / COUNT(*) AS rate FROM print_jobs GROUP BY 1, 2",
+    "recent_failures": "SELECT date, model_name, printer_name, material_type, failure_reason, nozzle_temp FROM print_jobs WHERE success_status = 0 ORDER BY date DESC LIMIT 50",
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare tool-result encodings")
+    parser.add_argument("--size", default="1k", choices=list(SIZES))
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--fixtures-dir", default=os.path.join(tempfile.gettempdir(), "print_bench"))
+    parser.add_argument("--out", help="Optional JSON output")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    os.makedirs(args.fixtures_dir, exist_ok=True)
+    db_path = fixture(args.size, args.fixtures_dir, args.seed)
+
+    totals = {fmt: {"tokens": 0, "encode_ms": 0.0} for fmt in RESULT_FORMATS}
+    rows = {}
+    for name, sql in {**AGENT_QUERIES, **EXTRA_QUERIES}.items():
+        res = query_db(sql, db_path)
+        rows[name] = {}
+        for fmt in RESULT_FORMATS:
+            start = time.perf_counter()
+            for _ in range(50):
+                text = encode_result(res, fmt)
+            ms = (time.perf_counter() - start) * 1000 / 50
+            tokens = count_text(text)
+            rows[name][fmt] = {"tokens": tokens, "encode_ms": ms}
+            totals[fmt]["tokens"] += tokens
+            totals[fmt]["encode_ms"] += ms
+
+    print(f"{'query':28s}" + "".join(f"{fmt:>14s}" for fmt in RESULT_FORMATS))
+    for name, by_fmt in rows.items():
+        print(f"{name:28s}" + "".join(f"{by_fmt[fmt]['tokens']:>14d}" for fmt in RESULT_FORMATS))
+    base = totals["json"]["tokens"]
+    print()
+    for fmt, t in totals.items():
+        print(f"{fmt:10s} {t['tokens']:7d} tokens ({t['tokens'] / base * 100:5.1f}% of json)   encode {t['encode_ms']:.3f} ms")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"per_query": rows, "totals": totals}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
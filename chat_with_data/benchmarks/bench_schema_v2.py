@@ -0,0 +1,176 @@
+"""
+Schema v1 (wide print_jobs table) vs v2 (dictionary-encoded job_facts behind
+a print_jobs view): file size, migration time, the agent's queries and writes.
+
+    python benchmarks/bench_schema_v2.py --sizes 100k,1m
+    python benchmarks/bench_schema_v2.py --sizes 10m --repeat 5
+
+Both sides are vacuumed copies of the same fixture, so sizes compare fairly.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import sqlite3
+import argparse
+import logging
+import tempfile
+from datetime import datetime
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from src import database_setup
+from src.tools import query_db, RESULT_CACHE
+from src.governor import QueryGovernor
+from src.tracing import TRACER
+from bench_data_layer import AGENT_QUERIES, SIZES, fixture, timed
+
+import app
+
+QUERIES = dict(
+    AGENT_QUERIES,
+    dashboard_stats=app.STATS_SQL,
+    material_usage="SELECT material_type, SUM(weight_used_grams) / 1000.0 AS kg, SUM(cost_usd) AS cost FROM print_jobs GROUP BY material_type",
+    petg_by_temp="SELECT nozzle_temp, AVG(success_status) AS rate, COUNT(*) AS n FROM print_jobs WHERE material_type = 'PETG' GROUP BY nozzle_temp",
+    brand_by_printer="SELECT printer_name, filament_brand, COUNT(*) AS n FROM print_jobs GROUP BY printer_name, filament_brand",
+)
+
+# The same answers written against the v2 tables directly: group by id, then look up names
+NATIVE_V2 = {
+    "success_by_printer": "SELECT p.name AS printer_name, s.rate AS success_rate FROM "
+                          "(SELECT printer_id, SUM(success_status) * 100.0 / COUNT(*) AS rate FROM job_facts GROUP BY printer_id) s "
+                          "LEFT JOIN dim_printer p ON p.id = s.printer_id",
+    "failure_reasons": "SELECT d.name AS failure_reason, s.n FROM "
+                       "(SELECT failure_id, COUNT(*) AS n FROM job_facts WHERE success_status = 0 GROUP BY failure_id) s "
+                       "LEFT JOIN dim_failure d ON d.id = s.failure_id ORDER BY s.n DESC",
+    "material_usage": "SELECT d.name AS material_type, s.kg, s.cost FROM "
+                      "(SELECT material_id, SUM(weight_used_grams) / 1000.0 AS kg, SUM(cost_usd) AS cost FROM job_facts GROUP BY material_id) s "
+                      "LEFT JOIN dim_material d ON d.id = s.material_id",
+}
+
+UNLIMITED = QueryGovernor(timeout=None, max_steps=None, max_result_bytes=None)
+
+
+def table_sizes(db_path):
+    # bytes per table (indexes counted with their table), needs sqlite built with dbstat
+    conn = sqlite3.connect(db_path)
+    try:
+        rows = conn.execute("""
+            SELECT COALESCE(m.tbl_name, s.name), SUM(s.pgsize) FROM dbstat s
+            LEFT JOIN sqlite_master m ON m.name = s.name GROUP BY 1 ORDER BY 2 DESC
+        """).fetchall()
+    except sqlite3.OperationalError:
+        rows = []
+    conn.close()
+    return dict(rows)
+
+
+def write_rows(db_path, n, bulk):
+    rows = database_setup._make_chunk(np.random.default_rng(7), n, datetime.now())
+    conn = sqlite3.connect(db_path)
+    start = time.perf_counter()
+    if bulk:
+        # the ingest path: stage, then set-based insert_jobs_sql
+        conn.execute(f"CREATE TEMP TABLE staged ({', '.join(database_setup.JOB_COLUMNS)})")
+        conn.executemany(f"INSERT INTO staged VALUES ({', '.join('?' * len(database_setup.JOB_COLUMNS))})", rows)
+        for sql in database_setup.insert_jobs_sql(conn, "temp.staged"):
+            conn.execute(sql)
+    else:
+        # row by row, through the view's triggers on v2
+        conn.executemany(database_setup.INSERT_SQL, rows)
+    conn.commit()
+    elapsed = (time.perf_counter() - start) * 1000
+    conn.close()
+    return {"median_ms": elapsed, "runs": 1}
+
+
+def bench_size(size_label, db_path, repeat, write_n):
+    results, sizes = {}, {}
+    paths = {}
+    for schema in ("v1", "v2"):
+        path = os.path.join(os.path.dirname(db_path), f"schema_{schema}_{size_label}.db")
+        for p in (path, path + "-wal", path + "-shm"):
+            if os.path.exists(p):
+                os.remove(p)
+        shutil.copy(db_path, path)
+        if schema == "v2":
+            start = time.perf_counter()
+            database_setup.migrate_v2(path)
+            results[f"migrate@{size_label}"] = {"median_ms": (time.perf_counter() - start) * 1000, "runs": 1}
+        else:
+            conn = sqlite3.connect(path)
+            conn.execute("VACUUM")
+            conn.close()
+        sizes[schema] = {"file_bytes": os.path.getsize(path), "tables": table_sizes(path)}
+        paths[schema] = path
+
+    for name, sql in QUERIES.items():
+        for schema, path in paths.items():
+            def cold(sql=sql, path=path):
+                RESULT_CACHE.clear()
+                assert query_db(sql, path, limit=50, governor=UNLIMITED)["success"]
+            results[f"{name}.{schema}@{size_label}"] = timed(cold, repeat)
+    for name, sql in NATIVE_V2.items():
+        def cold(sql=sql):
+            RESULT_CACHE.clear()
+            assert query_db(sql, paths["v2"], limit=50, governor=UNLIMITED)["success"]
+        results[f"{name}.v2_native@{size_label}"] = timed(cold, repeat)
+
+    for schema, path in paths.items():
+        results[f"write_rows.{schema}@{size_label}"] = write_rows(path, write_n, bulk=False)
+        results[f"write_bulk.{schema}@{size_label}"] = write_rows(path, write_n, bulk=True)
+    return results, sizes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Schema v1 vs dictionary-encoded v2")
+    parser.add_argument("--sizes", default="100k,1m", help=f"Comma separated fixture sizes ({', '.join(SIZES)})")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--write-rows", type=int, default=10_000, help="Rows appended in the write test")
+    parser.add_argument("--fixtures-dir", default=os.path.join(tempfile.gettempdir(), "print_bench"))
+    parser.add_argument("--out", default="bench_schema_v2.json")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    TRACER.path = None
+    os.makedirs(args.fixtures_dir, exist_ok=True)
+
+    results, sizes = {}, {}
+    labels = [s.strip() for s in args.sizes.split(",")]
+    for size_label in labels:
+        db_path = fixture(size_label, args.fixtures_dir, args.seed)
+        res, sizes[size_label] = bench_size(size_label, db_path, args.repeat, args.write_rows)
+        results.update(res)
+
+    for size_label in labels:
+        v1, v2 = sizes[size_label]["v1"], sizes[size_label]["v2"]
+        print(f"\n{size_label}: file {v1['file_bytes'] / 1e6:.1f} MB -> {v2['file_bytes'] / 1e6:.1f} MB "
+              f"({100 * (1 - v2['file_bytes'] / v1['file_bytes']):.0f}% smaller), "
+              f"migration {results[f'migrate@{size_label}']['median_ms'] / 1000:.1f}s")
+        print(f"  {'query':28s} {'v1 ms':>10s} {'v2 ms':>10s} {'v2/v1':>7s}")
+        for name in QUERIES:
+            a = results[f"{name}.v1@{size_label}"]["median_ms"]
+            b = results[f"{name}.v2@{size_label}"]["median_ms"]
+            print(f"  {name:28s} {a:10.2f} {b:10.2f} {b / max(a, 1e-6):6.2f}x")
+        for name in NATIVE_V2:
+            a = results[f"{name}.v1@{size_label}"]["median_ms"]
+            b = results[f"{name}.v2_native@{size_label}"]["median_ms"]
+            print(f"  {name + ' (native)':28s} {a:10.2f} {b:10.2f} {b / max(a, 1e-6):6.2f}x")
+        for kind in ("write_rows", "write_bulk"):
+            a = results[f"{kind}.v1@{size_label}"]["median_ms"]
+            b = results[f"{kind}.v2@{size_label}"]["median_ms"]
+            print(f"  {kind + f' +{args.write_rows}':28s} {a:10.2f} {b:10.2f} {b / max(a, 1e-6):6.2f}x")
+
+    with open(args.out, "w") as f:
+        json.dump({"created": time.time(), "results": results, "sizes": sizes}, f, indent=2)
+    print(f"\nResults written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+"""
+Concurrent-session load test: N DataAgent sessions (one thread each, like
+Streamlit) run scripted conversations against a generated db, with the LLM
+replaced by benchmarks/mock_llm.py. Reports throughput, turn latency
+percentiles and SQLite contention, so deployments can be sized offline.
+
+    python benchmarks/load_test.py --sessions 50 --turns 6 --size 1m
+    python benchmarks/load_test.py --sessions 20 --writer-rate 500 --no-result-cache --stream
+
+--writer-rate adds an ingest thread appending rows while the sessions read.
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import sqlite3
+import argparse
+import logging
+import tempfile
+import threading
+from datetime import datetime
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from src import database_setup, tools
+from src.agent import DataAgent
+from src.pool import get_pool
+from src.tracing import TRACER
+from bench_data_layer import fixture, SIZES
+from mock_llm import MockLLM, DEFAULT_RECORDING, load_recording, start_server
+
+
+def pct(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def summary(values):
+    return {"n": len(values), "p50": pct(values, 50), "p95": pct(values, 95), "p99": pct(values, 99),
+            "max": max(values) if values else None}
+
+
+class Writer(threading.Thread):
+    # Appends generated print jobs at a steady rate, the way a live printer
+    # log would, to see how reads hold up next to a writer
+    def __init__(self, db_path, rows_per_sec, batch=50, seed=0):
+        super().__init__(name="writer", daemon=True)
+        self.db_path = db_path
+        self.interval = batch / rows_per_sec
+        self.batch = batch
+        self.rng = np.random.default_rng(seed)
+        self.stop = threading.Event()
+        self.commits = []
+        self.busy = 0
+        self.rows = 0
+
+    def run(self):
+        conn = sqlite3.connect(self.db_path, timeout=5)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        while not self.stop.is_set():
+            rows = database_setup._make_chunk(self.rng, self.batch, datetime.now())
+            start = time.perf_counter()
+            try:
+                with conn:
+                    conn.executemany(database_setup.INSERT_SQL, rows)
+                self.commits.append((time.perf_counter() - start) * 1000)
+                self.rows += len(rows)
+            except sqlite3.OperationalError:
+                self.busy += 1  # "database is locked"
+            self.stop.wait(self.interval)
+        conn.close()
+
+
+def run_session(i, args, base_url, questions, barrier, results):
+    rng = random.Random(args.seed + i)
+    config = {
+        "db_path": args.db,
+        "base_url": base_url,
+        "embed_schema": True,
+        "result_format": "columnar",
+    }
+    agent = DataAgent("mock-key", config=config)
+    barrier.wait()
+    for _ in range(args.turns):
+        q = rng.choice(questions)
+        start = time.perf_counter()
+        first = None
+        try:
+            if args.stream:
+                for ev in agent.chat_stream(q):
+                    if ev["type"] == "token" and first is None:
+                        first = time.perf_counter() - start
+            else:
+                agent.chat_sync(q)
+            ok = True
+        except Exception as e:
+            logging.getLogger("LoadTest").error(f"Session {i} failed: {e}")
+            ok = False
+        elapsed = time.perf_counter() - start
+
+        spans = TRACER.get_trace(agent.last_trace_id) if agent.last_trace_id else []
+        results.append({
+            "ok": ok,
+            "latency_ms": elapsed * 1000,
+            "first_token_ms": first * 1000 if first is not None else None,
+            "llm_ms": [s["duration_ms"] for s in spans if s["name"] == "llm.completion"],
+            "sql_ms": [s["duration_ms"] for s in spans if s["name"] == "sql.execute"],
+            "tool_queue_ms": [s["attrs"]["tool_queue_ms"] for s in spans if "tool_queue_ms" in s["attrs"]],
+            "queries": sum(1 for s in spans if s["name"] == "sql.query"),
+            "cached": sum(1 for s in spans if s["name"] == "sql.query" and s["attrs"].get("cached")),
+            "sql_errors": sum(1 for s in spans if s["name"] == "sql.query" and s["attrs"].get("error")),
+        })
+        if args.think_ms:
+            time.sleep(rng.uniform(0, 2 * args.think_ms) / 1000)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent DataAgent load test against a mock LLM")
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--turns", type=int, default=5, help="Questions per session")
+    parser.add_argument("--size", default="1m", help=f"Fixture size ({', '.join(SIZES)})")
+    parser.add_argument("--db", help="Use this db instead of a generated fixture")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--fixtures-dir", default=os.path.join(tempfile.gettempdir(), "print_bench"))
+    parser.add_argument("--recording", help="Recorded conversations for the mock LLM")
+    parser.add_argument("--latency-ms", type=float, default=300, help="Mock LLM time to first byte")
+    parser.add_argument("--jitter-ms", type=float, default=100)
+    parser.add_argument("--token-ms", type=float, default=5)
+    parser.add_argument("--llm-url", help="Use an already running mock (or real) server instead")
+    parser.add_argument("--stream", action="store_true", help="Drive chat_stream instead of chat_sync")
+    parser.add_argument("--think-ms", type=float, default=0, help="Mean pause between a session's questions")
+    parser.add_argument("--writer-rate", type=float, default=0, help="Rows/s appended by a concurrent writer")
+    parser.add_argument("--no-result-cache", action="store_true", help="Every query hits SQLite")
+    parser.add_argument("--out", default="load_results.json")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    TRACER.path = None  # keep the spans in memory only
+    if not args.db:
+        os.makedirs(args.fixtures_dir, exist_ok=True)
+        args.db = fixture(args.size, args.fixtures_dir, args.seed)
+        if args.writer_rate:
+            # the writer appends rows, keep the shared fixture pristine
+            scratch = os.path.join(args.fixtures_dir, f"load_{args.size}_s{args.seed}.db")
+            shutil.copy(args.db, scratch)
+            args.db = scratch
+    if args.no_result_cache:
+        tools.RESULT_CACHE.max_bytes = 0
+
+    recording = load_recording(args.recording) if args.recording else DEFAULT_RECORDING
+    questions = [c["question"] for c in recording]
+    server = None
+    if args.llm_url:
+        base_url = args.llm_url
+    else:
+        server = start_server(MockLLM(recording, args.latency_ms, args.jitter_ms, args.token_ms, args.seed))
+        base_url = server.base_url
+
+    writer = Writer(args.db, args.writer_rate, seed=args.seed) if args.writer_rate else None
+    results = []
+    barrier = threading.Barrier(args.sessions + 1)
+    threads = [
+        threading.Thread(target=run_session, args=(i, args, base_url, questions, barrier, results), daemon=True)
+        for i in range(args.sessions)
+    ]
+    for t in threads:
+        t.start()
+    barrier.wait()  # agents are built (schema embedded), go
+    if writer:
+        writer.start()
+    start = time.perf_counter()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - start
+    if writer:
+        writer.stop.set()
+        writer.join()
+    if server:
+        server.shutdown()
+
+    turns = [r for r in results if r["ok"]]
+    queries = sum(r["queries"] for r in results)
+    report = {
+        "config": {k: v for k, v in vars(args).items()},
+        "wall_s": wall,
+        "turns": len(results),
+        "failed_turns": len(results) - len(turns),
+        "turns_per_s": len(turns) / wall,
+        "queries_per_s": queries / wall,
+        "turn_ms": summary([r["latency_ms"] for r in turns]),
+        "first_token_ms": summary([r["first_token_ms"] for r in turns if r["first_token_ms"] is not None]),
+        "llm_call_ms": summary([x for r in turns for x in r["llm_ms"]]),
+        "sql_ms": summary([x for r in results for x in r["sql_ms"]]),
+        "tool_queue_ms": summary([x for r in results for x in r["tool_queue_ms"]]),
+        "sqlite": {
+            "queries": queries,
+            "result_cache_hits": sum(r["cached"] for r in results),
+            "errors": sum(r["sql_errors"] for r in results),
+            "pool": get_pool(args.db).stats(),
+        },
+    }
+    if writer:
+        report["writer"] = {"rows": writer.rows, "busy_errors": writer.busy, "commit_ms": summary(writer.commits)}
+
+    def line(name, s):
+        if s["n"]:
+            print(f"{name:16s} p50 {s['p50']:8.1f}  p95 {s['p95']:8.1f}  p99 {s['p99']:8.1f}  max {s['max']:8.1f} ms  (n={s['n']})")
+
+    print(f"\n{args.sessions} sessions x {args.turns} turns on {args.db}")
+    print(f"{len(turns)}/{len(results)} turns in {wall:.1f}s -> {report['turns_per_s']:.2f} turns/s, {report['queries_per_s']:.1f} queries/s")
+    line("turn", report["turn_ms"])
+    line("first token", report["first_token_ms"])
+    line("llm call", report["llm_call_ms"])
+    line("sql execute", report["sql_ms"])
+    line("tool queue", report["tool_queue_ms"])
+    sq, pool = report["sqlite"], report["sqlite"]["pool"]
+    print(f"SQLite: {sq['queries']} queries, {sq['result_cache_hits']} cache hits, {sq['errors']} errors")
+    print(f"Pool:   {pool['checkouts']} checkouts, {pool['waited']} waited "
+          f"(total {pool['wait_ms_total']:.0f} ms, max {pool['wait_ms_max']:.1f} ms), {pool['exhausted']} exhausted")
+    if writer:
+        w = report["writer"]
+        print(f"Writer: {w['rows']} rows, {w['busy_errors']} busy errors")
+        line("writer commit", w["commit_ms"])
+
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
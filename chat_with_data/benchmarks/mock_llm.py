@@ -0,0 +1,247 @@
+"""
+OpenAI-compatible stand-in for load tests. Replays recorded completions
+(tool calls, then the answer) with configurable latency, so DataAgent can be
+driven without paying for API calls.
+
+    python benchmarks/mock_llm.py --port 8099 --latency-ms 400 --token-ms 10
+    # then point the agent at it: config["base_url"] = "http://127.0.0.1:8099/v1"
+
+Only POST /v1/chat/completions is implemented, streaming and non-streaming.
+A response is picked by the last user message and how many assistant turns
+have happened since, i.e. the tool round the agent is in.
+"""
+import sys
+import json
+import time
+import uuid
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Scripted conversations: question -> completions in order. A completion is
+# either {"tool_calls": [{"name", "arguments"}]} or {"content": "..."}.
+DEFAULT_RECORDING = [
+    {
+        "question": "What is the success rate for each printer?",
+        "rounds": [
+            {"tool_calls": [{"name": "query_database", "arguments": {"query": "SELECT printer_name, SUM(success_status) * 100.0 / COUNT(*) AS success_rate FROM print_jobs GROUP BY printer_name ORDER BY success_rate DESC"}}]},
+            {"content": "Your Bambu X1C leads on success rate, the Ender 3 trails the pack. Bed leveling on the Ender is worth a look."},
+        ],
+    },
+    {
+        "question": "How much PLA vs PETG have I used?",
+        "rounds": [
+            {"tool_calls": [{"name": "query_database", "arguments": {"query": "SELECT material_type, SUM(grams) / 1000.0 AS kg FROM print_daily_rollup WHERE material_type IN ('PLA', 'PETG') GROUP BY material_type"}}]},
+            {"content": "You've gone through quite a bit more PLA than PETG."},
+        ],
+    },
+    {
+        "question": "What are the most common reasons for failed prints?",
+        "rounds": [
+            {"tool_calls": [{"name": "query_database", "arguments": {"query": "SELECT failure_reason, COUNT(*) AS n FROM print_jobs WHERE success_status = 0 GROUP BY failure_reason ORDER BY n DESC LIMIT 10"}}]},
+            {"content": "Bed adhesion and spaghetti top the list. A clean bed and a brim fix most of those."},
+        ],
+    },
+    {
+        "question": "List the top 5 most expensive prints",
+        "rounds": [
+            {"tool_calls": [{"name": "query_database", "arguments": {"query": "SELECT model_name, printer_name, material_type, cost_usd FROM print_jobs ORDER BY cost_usd DESC LIMIT 5"}}]},
+            {"content": "Your priciest prints are big functional parts in premium filament."},
+        ],
+    },
+    {
+        "question": "Why is my PETG failing more than PLA?",
+        "rounds": [
+            {"tool_calls": [
+                {"name": "query_database", "arguments": {"query": "SELECT material_type, SUM(success_status) * 100.0 / COUNT(*) AS success_rate FROM print_jobs WHERE material_type IN ('PLA', 'PETG') GROUP BY material_type"}},
+                {"name": "query_database", "arguments": {"query": "SELECT failure_reason, COUNT(*) AS n FROM print_jobs WHERE material_type = 'PETG' AND success_status = 0 GROUP BY failure_reason ORDER BY n DESC"}},
+            ]},
+            {"tool_calls": [{"name": "query_database", "arguments": {"query": "SELECT nozzle_temp, SUM(success_status) * 100.0 / COUNT(*) AS success_rate, COUNT(*) AS n FROM print_jobs WHERE material_type = 'PETG' GROUP BY nozzle_temp ORDER BY nozzle_temp"}}]},
+            {"content": "PETG fails more at the low end of the nozzle range. Try printing it 10C hotter."},
+        ],
+    },
+    {
+        "question": "How much did I spend on filament last month?",
+        "rounds": [
+            {"tool_calls": [{"name": "query_database", "arguments": {"query": "SELECT SUM(cost) FROM print_daily_rollup WHERE day >= date('now', 'start of month', '-1 month') AND day < date('now', 'start of month')"}}]},
+            {"content": "Last month's filament spend is in the table above."},
+        ],
+    },
+]
+
+FALLBACK = {"content": "I don't have a recording for that question."}
+
+
+def recording_from_history(history):
+    # Turns a real agent session (agent.history) into recording entries, so
+    # sessions captured against OpenAI can be replayed here
+    out = []
+    for m in history:
+        if m["role"] == "user":
+            out.append({"question": m["content"], "rounds": []})
+        elif m["role"] == "assistant" and out:
+            if m.get("tool_calls"):
+                calls = [{"name": tc["function"]["name"], "arguments": json.loads(tc["function"]["arguments"] or "{}")}
+                         for tc in m["tool_calls"]]
+                out[-1]["rounds"].append({"tool_calls": calls})
+            else:
+                out[-1]["rounds"].append({"content": m.get("content") or ""})
+    return out
+
+
+def load_recording(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def _estimate_tokens(obj):
+    return len(json.dumps(obj, default=str)) // 4 + 1
+
+
+class MockLLM:
+    def __init__(self, recording=None, latency_ms=300, jitter_ms=100, token_ms=5, seed=None):
+        self.script = {c["question"]: c["rounds"] for c in (recording or DEFAULT_RECORDING)}
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.token_ms = token_ms
+        self.requests = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def pick(self, messages, with_tools):
+        # last user message + assistant messages after it = which round we're in
+        question, rnd = None, 0
+        for m in messages:
+            if m["role"] == "user":
+                question, rnd = m["content"], 0
+            elif m["role"] == "assistant":
+                rnd += 1
+        rounds = self.script.get(question) or [FALLBACK]
+        step = rounds[min(rnd, len(rounds) - 1)]
+        if "tool_calls" in step and not with_tools:
+            # out of tool rounds, the agent wants a plain answer
+            step = next((r for r in reversed(rounds) if "content" in r), FALLBACK)
+        return step
+
+    def delay(self):
+        with self._lock:
+            self.requests += 1
+            jitter = self._rng.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0
+        time.sleep(max(0.0, self.latency_ms + jitter) / 1000)
+
+    def completion(self, body):
+        step = self.pick(body["messages"], bool(body.get("tools")))
+        message = {"role": "assistant", "content": step.get("content")}
+        if "tool_calls" in step:
+            message["tool_calls"] = [
+                {"id": f"call_{uuid.uuid4().hex[:12]}", "type": "function",
+                 "function": {"name": c["name"], "arguments": json.dumps(c["arguments"])}}
+                for c in step["tool_calls"]
+            ]
+        usage = {
+            "prompt_tokens": _estimate_tokens(body["messages"]),
+            "completion_tokens": _estimate_tokens(message),
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        return message, usage
+
+
+def _envelope(body, obj, **fields):
+    return {"id": f"chatcmpl-{uuid.uuid4().hex[:16]}", "object": obj, "created": int(time.time()),
+            "model": body.get("model", "mock"), **fields}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+    mock = None
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self.send_error(404)
+            return
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        self.mock.delay()  # time to first byte
+        message, usage = self.mock.completion(body)
+        finish = "tool_calls" if message.get("tool_calls") else "stop"
+
+        if not body.get("stream"):
+            payload = _envelope(body, "chat.completion", usage=usage, choices=[
+                {"index": 0, "message": message, "finish_reason": finish}
+            ])
+            data = json.dumps(payload).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for delta in self._deltas(message):
+            self._event(_envelope(body, "chat.completion.chunk", choices=[{"index": 0, "delta": delta, "finish_reason": None}]))
+        self._event(_envelope(body, "chat.completion.chunk", choices=[{"index": 0, "delta": {}, "finish_reason": finish}]))
+        if (body.get("stream_options") or {}).get("include_usage"):
+            self._event(_envelope(body, "chat.completion.chunk", choices=[], usage=usage))
+        self._chunk(b"data: [DONE]\n\n")
+        self._chunk(b"")
+
+    def _deltas(self, message):
+        yield {"role": "assistant"}
+        for i, tc in enumerate(message.get("tool_calls") or []):
+            yield {"tool_calls": [{"index": i, "id": tc["id"], "type": "function",
+                                   "function": {"name": tc["function"]["name"], "arguments": ""}}]}
+            yield {"tool_calls": [{"index": i, "function": {"arguments": tc["function"]["arguments"]}}]}
+        # word-sized tokens, paced like a real model
+        for word in (message.get("content") or "").split(" "):
+            if self.mock.token_ms:
+                time.sleep(self.mock.token_ms / 1000)
+            yield {"content": word + " "}
+
+    def _event(self, obj):
+        self._chunk(f"data: {json.dumps(obj)}\n\n".encode())
+
+    def _chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def log_message(self, *args):
+        pass
+
+
+def start_server(mock, port=0, host="127.0.0.1"):
+    # port=0 picks a free port, the base_url to use is on server.base_url
+    handler = type("Handler", (_Handler,), {"mock": mock})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.base_url = f"http://{host}:{server.server_address[1]}/v1"
+    threading.Thread(target=server.serve_forever, name="mock-llm", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI-compatible mock LLM for load tests")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--recording", help="JSON recording (default: built-in sample questions)")
+    parser.add_argument("--latency-ms", type=float, default=300, help="Mean time to first byte")
+    parser.add_argument("--jitter-ms", type=float, default=100)
+    parser.add_argument("--token-ms", type=float, default=5, help="Delay per streamed word")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    recording = load_recording(args.recording) if args.recording else None
+    mock = MockLLM(recording, args.latency_ms, args.jitter_ms, args.token_ms, args.seed)
+    server = start_server(mock, args.port)
+    print(f"Mock LLM on {server.base_url} ({len(mock.script)} recorded questions)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+        sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,33 @@
+import os
 import json
+import types
+import asyncio
 import logging
-from typing import Generator, Optional
-from openai import OpenAI
+import threading
+import contextvars
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncGenerator, Generator, Optional
+from openai import AsyncOpenAI
 
-from src.tools import TOOL_DEFINITIONS, execute_tool, get_schema
+from src.tools import tool_definitions, execute_tool, get_schema, format_schema, get_sample_queries, encode_result
+from src.history import HistoryManager, HISTORY_BUDGET, KEEP_EXCHANGES, count_tokens
+from src.plan_cache import get_plan_cache, render_results
+from src.governor import QueryGovernor, QueryBudgetError
+from src.tracing import span, annotate
 
 # Logging setup
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(message)s')
 log = logging.getLogger("Agent")
 
+MAX_TOOL_ROUNDS = 5    # tool call rounds per user message before we force an answer
+TOOL_TIMEOUT = 30      # seconds per tool call
+LLM_CONCURRENCY = 32   # in-flight completions per process (per event loop)
+TOOL_CONCURRENCY = 8   # in-flight tool calls, i.e. SQLite work
+
+# Shared by all agents in the process, tool calls are mostly SQLite so threads are fine
+_tool_pool = ThreadPoolExecutor(max_workers=TOOL_CONCURRENCY, thread_name_prefix="tool")
+
 SYSTEM_PROMPT = """You are a helpful 3D printing analytics assistant. You help makers and engineers understand their print history, filament usage, and printer performance.
 
 ## Data Context
@@ -30,63 +49,453 @@ Help the user optimize their printing workflow.
 1. Use `query_database` to get real data. Don't guess.
 2. If the user asks for "success rate", calculate it: SUM(success_status) / COUNT(*) * 100.
 3. Be practical. If a user has many failures, suggest checking common issues like bed adhesion or nozzle clogs based on the data.
+   For "why is X failing?" start with `analyze_failures` (filter by material/printer/brand): one call ranks printers,
+   materials, brands, temperatures and layer heights by how much worse they fail. Only mention outliers marked significant as causes.
 4. Only read data. You cannot print files or modifying settings remotely.
 
 Keep answers concise and friendly, like a fellow maker."""
 
-class DataAgent:
-    def __init__(self, api_key: str, model="gpt-4o-mini", config=None):
-        self.client = OpenAI(api_key=api_key)
+# Appended when the db has the daily rollup (older dbs need database_setup.py --migrate)
+ROLLUP_NOTE = """## Daily Rollup
+There is also 'print_daily_rollup', pre-aggregated per day x printer x material x category:
+- day (YYYY-MM-DD), printer_name, material_type, project_category
+- jobs, successes, grams, hours, cost (sums for that day)
+It is much faster than print_jobs. Use it for totals, spend and trends over time,
+e.g. spend last month: SELECT SUM(cost) FROM print_daily_rollup WHERE day >= date('now', 'start of month', '-1 month') AND day < date('now', 'start of month').
+Success rate on the rollup: SUM(successes) * 100.0 / SUM(jobs).
+Use print_jobs when you need individual prints, brands, settings or failure reasons."""
+
+# Appended when the db has the print_search full-text index
+SEARCH_NOTE = """## Search
+To find prints by name or failure wording ("my dragon prints", "anything about warping"),
+call `search_prints` instead of LIKE '%...%' scans."""
+
+# Appended when tool results use the columnar encoding
+COLUMNAR_NOTE = """## Query Results Format
+query_database results are columnar: "data" maps each column to its list of values.
+Text columns with repeats look like {"dict": [...], "codes": [...]}: row i's value is dict[codes[i]].
+Numbers are rounded (2 decimals, or 3 significant digits below 1)."""
+
+SCHEMA_V2_NOTE = """print_jobs is a view over job_facts, which stores printer/material/brand/failure/category
+as ids into the dim_* tables. For big GROUP BYs on those, group job_facts by the *_id column
+and join the dim_* table for the names afterwards, it is much faster than grouping the view."""
+
+def build_system_prompt(config):
+    prompt = SYSTEM_PROMPT
+    res = get_schema(config.get("db_path", "data/print_analytics.db"))
+    # only point the model at tables this db actually has
+    if res["success"] and "print_daily_rollup" in res["schema"]:
+        prompt += "\n\n" + ROLLUP_NOTE
+    if res["success"] and "print_search" in res["schema"]:
+        prompt += "\n\n" + SEARCH_NOTE
+    if config.get("result_format") == "columnar":
+        prompt += "\n\n" + COLUMNAR_NOTE
+
+    # With embed_schema on, the model already knows the exact columns and
+    # rarely needs a get_database_schema round trip
+    if not config.get("embed_schema"):
+        return prompt
+
+    if not res["success"]:
+        log.warning(f"Schema not embedded: {res['error']}")
+        return prompt
+
+    prompt += "\n\n## Schema (already loaded, no need to call get_database_schema)\n" + format_schema(res["schema"])
+    if "job_facts" in res["schema"]:
+        prompt += "\n" + SCHEMA_V2_NOTE
+    return prompt
+
+class _Backends:
+    # Per event loop: one AsyncOpenAI client per key (so one HTTP connection pool
+    # for every session) plus the concurrency limits. asyncio objects are tied
+    # to the loop that created them, hence the per-loop registry.
+    def __init__(self):
+        self.clients = {}
+        self.llm_sem = asyncio.Semaphore(LLM_CONCURRENCY)
+        self.tool_sem = asyncio.Semaphore(TOOL_CONCURRENCY)
+
+    def client(self, api_key, base_url=None):
+        key = (api_key, base_url)
+        if key not in self.clients:
+            self.clients[key] = AsyncOpenAI(api_key=api_key, base_url=base_url)
+        return self.clients[key]
+
+_backends = {}
+
+def get_backends():
+    loop = asyncio.get_running_loop()
+    if loop not in _backends:
+        _backends[loop] = _Backends()
+    return _backends[loop]
+
+# Background loop used by the sync wrappers (Streamlit runs scripts in plain threads)
+_loop = None
+_loop_lock = threading.Lock()
+
+def _get_loop():
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="agent-loop", daemon=True).start()
+        return _loop
+
+def run_sync(coro):
+    return asyncio.run_coroutine_threadsafe(coro, _get_loop()).result()
+
+class AsyncDataAgent:
+    def __init__(self, api_key: str, model="gpt-4o-mini", config=None, client=None):
+        self.api_key = api_key
         self.model = model
         self.config = config or {}
-        self.history = [{"role": "system", "content": SYSTEM_PROMPT}]
+        self._client = client  # override, mostly for tests
+        self.history = [{"role": "system", "content": build_system_prompt(self.config)}]
+        self.tools = tool_definitions(self.config.get("db_path", "data/print_analytics.db"))
+        self.last_queries = []  # SQL run for the latest answer, used for exports
+        self.memory = HistoryManager(
+            budget=self.config.get("history_budget", HISTORY_BUDGET),
+            keep_exchanges=self.config.get("keep_exchanges", KEEP_EXCHANGES)
+        )
+        self.turn_tokens = []  # per-turn prompt token report
+        self._usage = None
+        self._turn_msg = None  # user message of the turn in progress
+        self.last_trace_id = None  # spans for the latest answer, see src/tracing.py
+        # per-session SQL limits, e.g. {"timeout": 5, "max_steps": 5e7, "session_seconds": 120}
+        self.governor = QueryGovernor(**self.config.get("query_budget", {}))
+        # question -> SQL cache, on when config has a "plan_cache" file path
+        self.plans = get_plan_cache(self.config["plan_cache"]) if self.config.get("plan_cache") else None
         log.info(f"Agent loaded: {model}")
 
     def reset(self):
-        self.history = [{"role": "system", "content": SYSTEM_PROMPT}]
+        self.history = [{"role": "system", "content": build_system_prompt(self.config)}]
+        self.tools = tool_definitions(self.config.get("db_path", "data/print_analytics.db"))
+        self.last_queries = []
+        self.turn_tokens = []
         log.info("History cleared")
 
-    def chat_sync(self, msg: str) -> str:
+    @property
+    def client(self):
+        # base_url in config points at any OpenAI-compatible server (e.g. benchmarks/mock_llm.py)
+        return self._client or get_backends().client(self.api_key, self.config.get("base_url"))
+
+    def _request(self, with_tools, stream):
+        kwargs = {"model": self.model, "messages": self.history}
+        if with_tools:
+            kwargs["tools"] = self.tools
+            kwargs["tool_choice"] = "auto"
+        if stream:
+            kwargs["stream"] = True
+            kwargs["stream_options"] = {"include_usage": True}
+        return kwargs
+
+    def _track(self, usage):
+        # Accumulates API-reported prompt tokens for the current turn
+        if usage is None:
+            return
+        annotate(prompt_tokens=usage.prompt_tokens or 0, completion_tokens=usage.completion_tokens or 0)
+        if self._usage is not None:
+            self._usage["prompt_tokens"] += usage.prompt_tokens or 0
+            self._usage["completion_tokens"] += usage.completion_tokens or 0
+
+    async def _complete(self, with_tools=True):
+        with span("llm.completion", model=self.model, tools=with_tools, stream=False):
+            async with get_backends().llm_sem:
+                completion = await self.client.chat.completions.create(**self._request(with_tools, False))
+            self._track(getattr(completion, "usage", None))
+        msg = completion.choices[0].message
+        return msg.content or "", msg.tool_calls or []
+
+    async def _stream_completion(self, with_tools, out):
+        # Pushes answer tokens into `out` as they arrive, returns (text, tool_calls).
+        # Tool calls come in as fragments keyed by index, so they get stitched back together.
+        text = []
+        calls = {}
+        with span("llm.completion", model=self.model, tools=with_tools, stream=True) as sp:
+            async with get_backends().llm_sem:
+                stream = await self.client.chat.completions.create(**self._request(with_tools, True))
+                async for chunk in stream:
+                    self._track(getattr(chunk, "usage", None))
+                    if not chunk.choices:
+                        continue
+                    if "first_chunk_ms" not in sp.attrs:
+                        sp.set(first_chunk_ms=round(sp.elapsed_ms(), 1))
+                    delta = chunk.choices[0].delta
+                    if delta.content:
+                        text.append(delta.content)
+                        await out.put({"type": "token", "text": delta.content})
+                    for part in delta.tool_calls or []:
+                        call = calls.setdefault(part.index, {"id": None, "name": "", "arguments": ""})
+                        if part.id:
+                            call["id"] = part.id
+                        if part.function and part.function.name:
+                            call["name"] += part.function.name
+                        if part.function and part.function.arguments:
+                            call["arguments"] += part.function.arguments
+
+        tool_calls = [
+            types.SimpleNamespace(
+                id=c["id"], type="function",
+                function=types.SimpleNamespace(name=c["name"], arguments=c["arguments"])
+            )
+            for _, c in sorted(calls.items())
+        ]
+        return "".join(text), tool_calls
+
+    async def _run_tool(self, tc):
+        fn_name = tc.function.name
+        try:
+            args = json.loads(tc.function.arguments or "{}")
+        except json.JSONDecodeError as e:
+            return {}, {"success": False, "error": f"Bad arguments: {e}"}
+
+        log.info(f"Exec {fn_name} {args}")
+        timeout = self.config.get("tool_timeout", TOOL_TIMEOUT)
+        # this call's own governor, so a timeout doesn't interrupt its siblings
+        governor = self.governor.child()
+        loop = asyncio.get_running_loop()
+        queued = loop.time()
+        try:
+            async with get_backends().tool_sem:
+                # time spent waiting for a tool slot, i.e. queueing in front of SQLite
+                annotate(tool_queue_ms=round((loop.time() - queued) * 1000, 1))
+                # SQLite is blocking, so it runs on the tool thread pool. The copied
+                # context carries the current span over so tool spans nest under the turn.
+                call = partial(execute_tool, fn_name, args, self.config, governor)
+                result = await asyncio.wait_for(
+                    loop.run_in_executor(_tool_pool, contextvars.copy_context().run, call),
+                    timeout
+                )
+        except asyncio.TimeoutError:
+            # the worker thread would keep grinding on the SQL, stop it for real
+            governor.cancel()
+            log.warning(f"{fn_name} timed out after {timeout}s")
+            result = QueryBudgetError("timeout", f"Tool timed out after {timeout}s").to_result()
+        except Exception as e:
+            log.error(f"{fn_name} crashed: {e}")
+            result = {"success": False, "error": str(e)}
+        return args, result
+
+    async def run_tools(self, tool_calls, out=None):
+        # One round of tool calls, run concurrently, results in original call order
+        async def one(tc):
+            # tool.call = queueing + execution, tool.execute (in tools.py) = execution only
+            with span("tool.call", tool=tc.function.name):
+                args, result = await self._run_tool(tc)
+            if out is not None:
+                await out.put({"type": "tool_done", "name": tc.function.name, "success": bool(result.get("success"))})
+            return args, result
+
+        done = await asyncio.gather(*(one(tc) for tc in tool_calls))
+        results = []
+        for tc, (args, result) in zip(tool_calls, done):
+            if tc.function.name == "query_database" and result.get("success"):
+                self.last_queries.append(args.get("query"))
+            results.append(result)
+        return results
+
+    @property
+    def db_key(self):
+        return os.path.abspath(self.config.get("db_path", "data/print_analytics.db"))
+
+    async def _in_thread(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(_tool_pool, partial(fn, *args))
+
+    async def _plan_lookup(self, msg, standalone):
+        # Replays SQL the agent wrote for this question before, as synthetic tool calls
+        if not (self.plans and standalone):
+            return None
+        queries = await self._in_thread(self.plans.get, self.db_key, msg)
+        if not queries:
+            return None
+        return [
+            types.SimpleNamespace(
+                id=f"plan_{i}", type="function",
+                function=types.SimpleNamespace(name="query_database", arguments=json.dumps({"query": q}))
+            )
+            for i, q in enumerate(queries)
+        ]
+
+    async def _turn(self, msg, out, stream):
+        # One traced user turn, the spans end up under self.last_trace_id
+        start = len(self.history)
+        self._turn_msg = None
+        with span("agent.turn", model=self.model, stream=stream) as sp:
+            self.last_trace_id = sp.trace_id
+            try:
+                text = await self._answer(msg, out, stream)
+            except (asyncio.CancelledError, GeneratorExit):
+                # Closed mid-turn (a Streamlit rerun closes the stream). An assistant
+                # tool_calls message without its tool replies would get every later
+                # request rejected, so the whole turn goes.
+                self._rollback(start)
+                raise
+            sp.set(**{k: v for k, v in self.turn_tokens[-1].items() if k != "turn"})
+        await out.put({"type": "done", "text": text})
+        return text
+
+    def _rollback(self, start):
+        # Compaction may have dropped older messages since the turn started, but
+        # never the exchange in progress, so find the turn's user message by identity
+        for i in range(len(self.history) - 1, 0, -1):
+            if self.history[i] is self._turn_msg:
+                start = i
+                break
+        del self.history[start:]
+        log.info("Turn cancelled, history rolled back")
+
+    async def _answer(self, msg, out, stream):
+        # The whole tool loop for one user message. Events go into `out`:
+        #   {"type": "tool_start", "name", "args"} / {"type": "tool_done", "name", "success"}
+        #   {"type": "token", "text"} / {"type": "done", "text"}
         log.info(f"User: {msg}")
-        self.history.append({"role": "user", "content": msg})
-
-        # First calling
-        completion = self.client.chat.completions.create(
-            model=self.model,
-            messages=self.history,
-            tools=TOOL_DEFINITIONS,
-            tool_choice="auto"
-        )
-        
-        resp_msg = completion.choices[0].message
-        tool_calls = resp_msg.tool_calls
-        
-        if tool_calls:
-            log.info(f"Tools called: {len(tool_calls)}")
-            self.history.append(resp_msg)
-            
+        # Only questions that don't lean on earlier chat are safe to cache by text
+        standalone = len(self.history) == 1 or msg in {q["text"] for q in get_sample_queries()}
+        self._turn_msg = {"role": "user", "content": msg}
+        self.history.append(self._turn_msg)
+        self.last_queries = []
+        tools_used = set()
+        self._usage = {
+            "turn": len(self.turn_tokens) + 1,
+            "history_tokens": count_tokens(self.history),  # before compaction
+            "sent_tokens": 0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "calls": 0
+        }
+
+        max_rounds = self.config.get("max_tool_rounds", MAX_TOOL_ROUNDS)
+        rounds = 0
+        plan = await self._plan_lookup(msg, standalone) if max_rounds > 0 else None
+        from_plan = plan is not None
+        while True:
+            # Out of rounds -> no tools offered, so the model has to answer with what it has
+            with_tools = rounds < max_rounds
+            if plan:
+                # Known question: skip the planning call, run its SQL on current
+                # data and leave only the (tool-less) phrasing call
+                text, tool_calls, plan = "", plan, None
+                rounds = max_rounds - 1
+            else:
+                self.history = self.memory.compact(self.history)
+                self._usage["sent_tokens"] += count_tokens(self.history)
+                self._usage["calls"] += 1
+                if stream:
+                    text, tool_calls = await self._stream_completion(with_tools, out)
+                else:
+                    text, tool_calls = await self._complete(with_tools)
+
+            if not (with_tools and tool_calls):
+                break
+
+            rounds += 1
+            log.info(f"Tools called: {len(tool_calls)} (round {rounds})")
+            self.history.append({
+                "role": "assistant",
+                "content": text or None,
+                "tool_calls": [
+                    {"id": tc.id, "type": "function", "function": {"name": tc.function.name, "arguments": tc.function.arguments}}
+                    for tc in tool_calls
+                ]
+            })
             for tc in tool_calls:
-                fn_name = tc.function.name
-                args = json.loads(tc.function.arguments)
-                
-                log.info(f"Exec {fn_name} {args}")
-                result = execute_tool(fn_name, args, self.config)
-                
+                await out.put({"type": "tool_start", "name": tc.function.name, "args": tc.function.arguments})
+
+            results = await self.run_tools(tool_calls, out)
+            for tc, result in zip(tool_calls, results):
+                tools_used.add(tc.function.name)
                 self.history.append({
                     "role": "tool",
                     "tool_call_id": tc.id,
-                    "content": json.dumps(result)
+                    "content": encode_result(result, self.config.get("result_format", "json"))
                 })
-                
-            # Follow up response
-            completion = self.client.chat.completions.create(
-                model=self.model,
-                messages=self.history
-            )
-            resp_msg = completion.choices[0].message
-            
-        final_text = resp_msg.content or ""
-        self.history.append({"role": "assistant", "content": final_text})
-        log.info(f"Response: {final_text[:50]}...")
-        
-        return final_text
+
+            if from_plan and self.config.get("plan_cache_mode") == "template":
+                # no LLM at all, answer straight from the results
+                text = render_results(results)
+                await out.put({"type": "token", "text": text})
+                break
+
+        self.history.append({"role": "assistant", "content": text})
+        log.info(f"Response: {text[:50]}...")
+
+        # Remember the SQL for next time if this was a plain read-only question
+        if (self.plans and standalone and not from_plan and self.last_queries
+                and tools_used <= {"query_database", "get_database_schema"}):
+            await self._in_thread(self.plans.put, self.db_key, msg, list(self.last_queries))
+
+        self._usage["from_plan_cache"] = from_plan
+        self.turn_tokens.append(self._usage)
+        log.info(f"Turn {self._usage['turn']} tokens: {self._usage}")
+        return text
+
+    async def chat(self, msg: str) -> str:
+        out = asyncio.Queue()  # nobody listens, events are just dropped
+        return await self._turn(msg, out, stream=False)
+
+    async def chat_stream(self, msg: str) -> AsyncGenerator[dict, None]:
+        out = asyncio.Queue()
+        task = asyncio.ensure_future(self._turn(msg, out, stream=True))
+        try:
+            while True:
+                getter = asyncio.ensure_future(out.get())
+                await asyncio.wait([getter, task], return_when=asyncio.FIRST_COMPLETED)
+                if getter.done():
+                    ev = getter.result()
+                    yield ev
+                    if ev["type"] == "done":
+                        break
+                else:
+                    getter.cancel()
+                    task.result()  # the turn died before "done", surface its error
+        finally:
+            if not task.done():
+                task.cancel()
+                # let it unwind (and roll the history back) before the next turn can start
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        await task
+
+class DataAgent:
+    # Sync facade over AsyncDataAgent for Streamlit. All the work happens on a
+    # shared background event loop, so every session shares one HTTP pool.
+    def __init__(self, api_key: str, model="gpt-4o-mini", config=None, client=None):
+        self.agent = AsyncDataAgent(api_key, model=model, config=config, client=client)
+
+    @property
+    def history(self):
+        return self.agent.history
+
+    @property
+    def config(self):
+        return self.agent.config
+
+    @property
+    def last_queries(self):
+        return self.agent.last_queries
+
+    @property
+    def turn_tokens(self):
+        return self.agent.turn_tokens
+
+    @property
+    def last_trace_id(self):
+        return self.agent.last_trace_id
+
+    def reset(self):
+        self.agent.reset()
+
+    def chat_sync(self, msg: str) -> str:
+        return run_sync(self.agent.chat(msg))
+
+    def chat_stream(self, msg: str) -> Generator[dict, None, None]:
+        events = self.agent.chat_stream(msg)
+        try:
+            while True:
+                try:
+                    yield run_sync(events.__anext__())
+                except StopAsyncIteration:
+                    break
+        finally:
+            run_sync(events.aclose())
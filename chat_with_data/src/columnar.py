@@ -0,0 +1,280 @@
+import os
+import json
+import time
+import shutil
+import logging
+import argparse
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+import duckdb  # optional dependency, tools.py falls back to SQLite without it
+
+from src.pool import get_pool, MAX_POOLS
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(message)s')
+log = logging.getLogger("Columnar")
+
+REFRESH_SEC = 30            # how often queries check SQLite for new jobs
+CHUNK_ROWS = 200_000        # rows pulled from SQLite per batch while exporting
+MAX_PART_FILES = 8          # small append files per month before they get merged
+
+# sqlite declared type -> parquet column type. Dates stay text so comparisons
+# like date >= '2024-01-01' behave exactly like they do in SQLite.
+_TYPES = {"INTEGER": "BIGINT", "REAL": "DOUBLE", "BOOLEAN": "INTEGER", "TEXT": "VARCHAR", "DATETIME": "VARCHAR"}
+
+def default_snapshot_dir(db_path):
+    base = os.path.splitext(os.path.abspath(db_path))[0]
+    return base + "_parquet"
+
+
+class ParquetSnapshot:
+    # print_jobs copied to Parquet, partitioned by month (month=YYYY-MM/part-*.parquet).
+    # New jobs are appended incrementally using the id as a watermark. A replaced
+    # db file or deleted rows trigger a full rebuild into a fresh generation dir.
+    # Edits to already exported rows are not picked up until refresh(full=True).
+    def __init__(self, db_path, out_dir=None, refresh_interval=REFRESH_SEC, chunk_rows=CHUNK_ROWS):
+        self.db_path = os.path.abspath(db_path)
+        self.out_dir = out_dir or default_snapshot_dir(db_path)
+        self.refresh_interval = refresh_interval
+        self.chunk_rows = chunk_rows
+        self._lock = threading.Lock()
+        self._checked = 0.0
+        self._worker = None
+        self._worker_lock = threading.Lock()  # not _lock, a refresh holds that throughout
+        self._rebuilding = False
+        self._con = None
+        self._view_dir = None
+        self.manifest = self._load_manifest()
+
+    # --- manifest -------------------------------------------------------
+
+    @property
+    def _manifest_path(self):
+        return os.path.join(self.out_dir, "manifest.json")
+
+    def _load_manifest(self):
+        try:
+            with open(self._manifest_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"generation": 0, "version": 0, "max_id": 0, "rows": 0, "inode": None}
+
+    def _save_manifest(self):
+        tmp = self._manifest_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(tmp, self._manifest_path)
+
+    def _gen_dir(self, generation=None):
+        gen = self.manifest["generation"] if generation is None else generation
+        return os.path.join(self.out_dir, f"gen-{gen:06d}")
+
+    @property
+    def version(self):
+        # bumps whenever rows land in the snapshot, used to key the result cache
+        return ("parquet", self.manifest["generation"], self.manifest["version"])
+
+    # --- refresh --------------------------------------------------------
+
+    def _source_state(self, count=False):
+        with get_pool(self.db_path).connection() as conn:
+            max_id = conn.execute("SELECT MAX(id) FROM print_jobs").fetchone()[0] or 0
+            rows = conn.execute("SELECT COUNT(*) FROM print_jobs").fetchone()[0] if count else None
+        return os.stat(self.db_path).st_ino, max_id, rows
+
+    @property
+    def ready(self):
+        # False until the first build is done and while a rebuild runs, the
+        # old generation no longer matches the db then
+        return bool(self.manifest["rows"]) and not self._rebuilding
+
+    def maybe_refresh(self, wait=True):
+        # Cheap check (inode + max id, both O(1)), at most every refresh_interval.
+        # wait=False leaves the refresh to a background thread and returns at once.
+        if time.monotonic() - self._checked < self.refresh_interval:
+            return 0
+        self._checked = time.monotonic()
+        inode, max_id, _ = self._source_state()
+        m = self.manifest
+        if inode == m["inode"] and max_id == m["max_id"] and m["rows"]:
+            return 0
+        if wait:
+            return self.refresh()
+        if inode != m["inode"] or max_id < m["max_id"]:
+            self._rebuilding = True  # stop serving the old generation right away
+        self.refresh_in_background()
+        return 0
+
+    def refresh_in_background(self, full=False):
+        # At most one refresh thread per snapshot, later calls while it runs are no-ops
+        with self._worker_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._background_refresh, args=(full,),
+                                                name="snapshot-refresh", daemon=True)
+                self._worker.start()
+            return self._worker
+
+    def _background_refresh(self, full):
+        try:
+            self.refresh(full)
+        except Exception as e:
+            log.error(f"Snapshot refresh of {self.db_path} failed: {e}")
+        finally:
+            self._rebuilding = False
+
+    def refresh(self, full=False):
+        with self._lock:
+            inode, max_id, rows = self._source_state(count=True)
+            m = self.manifest
+            # something other than appends happened (new file, deletes) -> start over
+            if full or inode != m["inode"] or max_id < m["max_id"] or rows < m["rows"]:
+                return self._rebuild(inode)
+            if max_id == m["max_id"]:
+                return 0
+
+            start = time.perf_counter()
+            added, last_id = self._export(self._gen_dir(), m["max_id"])
+            m.update(max_id=last_id, rows=m["rows"] + added, version=m["version"] + 1)
+            self._compact(self._gen_dir())
+            self._save_manifest()
+            log.info(f"Snapshot +{added} rows in {time.perf_counter() - start:.2f}s")
+            return added
+
+    def _rebuild(self, inode):
+        self._rebuilding = True
+        try:
+            return self._rebuild_generation(inode)
+        finally:
+            self._rebuilding = False
+
+    def _rebuild_generation(self, inode):
+        start = time.perf_counter()
+        old_dir = self._gen_dir() if self.manifest["rows"] else None
+        gen = self.manifest["generation"] + 1
+        new_dir = self._gen_dir(gen)
+        shutil.rmtree(new_dir, ignore_errors=True)
+        os.makedirs(new_dir)
+
+        added, last_id = self._export(new_dir, 0)
+        self.manifest = {"generation": gen, "version": 0, "max_id": last_id, "rows": added, "inode": inode}
+        self._save_manifest()
+        self._open_views()
+        if old_dir and old_dir != new_dir:
+            shutil.rmtree(old_dir, ignore_errors=True)
+        log.info(f"Snapshot rebuilt: {added} rows in {time.perf_counter() - start:.2f}s -> {new_dir}")
+        return added
+
+    def _export(self, gen_dir, since_id):
+        # Returns (rows written, last id written). The watermark comes from the
+        # rows themselves so jobs committed mid-export aren't skipped next time.
+        writer = duckdb.connect()
+        total, last_id = 0, since_id
+        with get_pool(self.db_path).connection() as conn:
+            cols = conn.execute("PRAGMA table_info(print_jobs)").fetchall()
+            select = ", ".join(f'CAST("{c[1]}" AS {_TYPES.get(c[2].upper(), "VARCHAR")}) AS "{c[1]}"' for c in cols)
+            cur = conn.execute("SELECT * FROM print_jobs WHERE id > ? ORDER BY id", (since_id,))
+            names = [d[0] for d in cur.description]
+            while True:
+                rows = cur.fetchmany(self.chunk_rows)
+                if not rows:
+                    break
+                df = pd.DataFrame.from_records(rows, columns=names)
+                months = df["date"].astype(str).str[:7].where(df["date"].notna(), "unknown")
+                for month, part in df.groupby(months):
+                    part_dir = os.path.join(gen_dir, f"month={month}")
+                    os.makedirs(part_dir, exist_ok=True)
+                    path = os.path.join(part_dir, f"part-{int(part['id'].iloc[0]):012d}.parquet")
+                    writer.register("part", part)
+                    writer.execute(f"COPY (SELECT {select} FROM part) TO '{_quote(path)}' (FORMAT PARQUET, COMPRESSION ZSTD)")
+                    writer.unregister("part")
+                total += len(rows)
+                last_id = int(df["id"].iloc[-1])
+        writer.close()
+        return total, last_id
+
+    def _compact(self, gen_dir):
+        # Lots of tiny append files slow scans down, fold them into one per month
+        for month in os.listdir(gen_dir):
+            part_dir = os.path.join(gen_dir, month)
+            files = sorted(f for f in os.listdir(part_dir) if f.endswith(".parquet"))
+            if len(files) <= MAX_PART_FILES:
+                continue
+            paths = [os.path.join(part_dir, f) for f in files]
+            tmp = os.path.join(part_dir, "compact.tmp")
+            con = duckdb.connect()
+            con.execute(
+                f"COPY (SELECT * FROM read_parquet({_sql_list(paths)}) ORDER BY id) TO '{_quote(tmp)}' (FORMAT PARQUET, COMPRESSION ZSTD)"
+            )
+            con.close()
+            os.replace(tmp, paths[0])
+            for p in paths[1:]:
+                os.remove(p)
+            log.info(f"Compacted {len(files)} files in {month}")
+
+    # --- querying -------------------------------------------------------
+
+    def _open_views(self):
+        con = duckdb.connect()
+        pattern = os.path.join(self._gen_dir(), "*", "*.parquet")
+        con.execute(
+            f"CREATE VIEW print_jobs AS SELECT * EXCLUDE (month) FROM read_parquet('{_quote(pattern)}', hive_partitioning = true)"
+        )
+        old, self._con, self._view_dir = self._con, con, self._gen_dir()
+        if old is not None:
+            old.close()
+
+    def cursor(self):
+        # One DuckDB cursor per query, they share the views but are safe across threads.
+        # Builds the snapshot first if there is none yet, check ready to avoid that.
+        if not self.manifest["rows"]:
+            self.refresh()
+        if self._con is None or self._view_dir != self._gen_dir():
+            with self._lock:
+                if self._con is None or self._view_dir != self._gen_dir():
+                    self._open_views()
+        cur = self._con.cursor()
+        cur.execute("SET integer_division = true")  # SQLite semantics for 5 / 2
+        # SQLite sorts NULL as the smallest value, DuckDB puts it last either way
+        cur.execute("SET default_null_order = 'nulls_first_on_asc_last_on_desc'")
+        return cur
+
+    def stats(self):
+        return {**self.manifest, "dir": self._gen_dir()}
+
+
+def _quote(path):
+    return path.replace("'", "''")
+
+
+def _sql_list(paths):
+    return "[" + ", ".join(f"'{_quote(p)}'" for p in paths) + "]"
+
+
+_snapshots = OrderedDict()  # least recently used first
+_snapshots_lock = threading.Lock()
+
+
+def get_snapshot(db_path, out_dir=None):
+    # Bounded like the SQLite pools. A dropped snapshot's DuckDB connection
+    # closes once the last cursor on it is done, the Parquet files stay.
+    key = os.path.abspath(db_path)
+    with _snapshots_lock:
+        if key not in _snapshots:
+            _snapshots[key] = ParquetSnapshot(key, out_dir)
+        _snapshots.move_to_end(key)
+        while len(_snapshots) > MAX_POOLS:
+            _snapshots.popitem(last=False)
+        return _snapshots[key]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or refresh the Parquet snapshot of print_jobs")
+    parser.add_argument("--db", default="data/print_analytics.db")
+    parser.add_argument("--out", help="Snapshot directory (default: next to the db)")
+    parser.add_argument("--full", action="store_true", help="Rebuild from scratch instead of appending new jobs")
+    args = parser.parse_args()
+
+    snap = ParquetSnapshot(args.db, args.out)
+    added = snap.refresh(full=args.full)
+    print(f"{added} rows written, snapshot now {snap.manifest['rows']} rows in {snap.stats()['dir']}")
@@ -1,8 +1,12 @@
 import sqlite3
 import random
+import argparse
+import time
 from datetime import datetime, timedelta
 import os
 
+import numpy as np
+
 # Real printer models I use or see often
 PRINTERS = [
     "Creality Ender 3 V2", "Bambu Lab X1 Carbon", "Prusa MK4", 
@@ -56,6 +60,337 @@ PRINT_MODELS = {
     ]
 }
 
+# analyze_failures groups jobs by printer, material, brand and these bins.
+# The cube's GROUP BY and idx_jobs_settings use the exact same expressions.
+NOZZLE_BIN = 5          # degrees per temperature bin
+BED_BIN = 10
+FAILURE_BINS = {
+    "nozzle_temp": f"CAST(nozzle_temp AS INTEGER) / {NOZZLE_BIN}",
+    "bed_temp": f"CAST(bed_temp AS INTEGER) / {BED_BIN}",
+    "layer_height": "ROUND(layer_height, 2)",
+}
+_BIN_KEYS = ", ".join(FAILURE_BINS.values())
+
+# Indexes for what the dashboard and agent actually ask. The wide ones are
+# covering, so the aggregates never have to touch the table rows at all.
+INDEXES = [
+    # success rate / counts per printer
+    ("idx_jobs_printer", "print_jobs(printer_name, success_status)"),
+    # usage + spend per material
+    ("idx_jobs_material", "print_jobs(material_type, weight_used_grams, cost_usd)"),
+    # failure breakdowns: WHERE success_status = 0 GROUP BY failure_reason
+    ("idx_jobs_failure", "print_jobs(success_status, failure_reason)"),
+    # date ranges ("last month") plus dashboard totals without a table scan
+    ("idx_jobs_date", "print_jobs(date, success_status, weight_used_grams, print_time_hours, cost_usd)"),
+    # top-N most expensive
+    ("idx_jobs_cost", "print_jobs(cost_usd)"),
+    # analyze_failures cube, on its GROUP BY expressions so sqlite streams the
+    # groups without a sort. The raw columns at the end make it covering.
+    ("idx_jobs_settings", f"print_jobs(printer_name, material_type, filament_brand, {_BIN_KEYS}, success_status, nozzle_temp, bed_temp, layer_height)"),
+]
+
+# Same indexes on the v2 fact table, integer ids instead of names
+INDEXES_V2 = [
+    ("idx_facts_printer", "job_facts(printer_id, success_status)"),
+    ("idx_facts_material", "job_facts(material_id, weight_used_grams, cost_usd)"),
+    ("idx_facts_failure", "job_facts(success_status, failure_id)"),
+    ("idx_facts_date", "job_facts(date, success_status, weight_used_grams, print_time_hours, cost_usd)"),
+    ("idx_facts_cost", "job_facts(cost_usd)"),
+    ("idx_facts_settings", f"job_facts(printer_id, material_id, brand_id, {_BIN_KEYS}, success_status, nozzle_temp, bed_temp, layer_height)"),
+]
+
+def create_indexes(conn):
+    c = conn.cursor()
+    for name, target in (INDEXES_V2 if schema_version(conn) == 2 else INDEXES):
+        c.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {target}")
+    # refresh planner stats (sqlite_stat1) so it actually picks them
+    c.execute("ANALYZE")
+    conn.commit()
+
+# Daily rollup, one row per day x printer x material x category. Triggers keep
+# it in sync with print_jobs so the dashboard never has to scan raw rows.
+ROLLUP_TABLE = """
+    CREATE TABLE IF NOT EXISTS print_daily_rollup (
+        day TEXT NOT NULL,
+        printer_name TEXT NOT NULL,
+        material_type TEXT NOT NULL,
+        project_category TEXT NOT NULL,
+        jobs INTEGER NOT NULL DEFAULT 0,
+        successes INTEGER NOT NULL DEFAULT 0,
+        grams REAL NOT NULL DEFAULT 0,
+        hours REAL NOT NULL DEFAULT 0,
+        cost REAL NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, printer_name, material_type, project_category)
+    ) WITHOUT ROWID
+"""
+
+# NULL keys would never hit ON CONFLICT, so they get bucketed as 'Unknown'
+_ROLLUP_KEY = "date({r}.date), IFNULL({r}.printer_name, 'Unknown'), IFNULL({r}.material_type, 'Unknown'), IFNULL({r}.project_category, 'Unknown')"
+_ROLLUP_VALS = "{sign}1, {sign}IFNULL({r}.success_status, 0), {sign}IFNULL({r}.weight_used_grams, 0), {sign}IFNULL({r}.print_time_hours, 0), {sign}IFNULL({r}.cost_usd, 0)"
+
+# v2 rows only carry ids, the rollup keeps names so STATS_SQL doesn't change
+_ROLLUP_KEY_V2 = ("date({r}.date), IFNULL((SELECT name FROM dim_printer WHERE id = {r}.printer_id), 'Unknown'), "
+                  "IFNULL((SELECT name FROM dim_material WHERE id = {r}.material_id), 'Unknown'), "
+                  "IFNULL((SELECT name FROM dim_category WHERE id = {r}.category_id), 'Unknown')")
+
+def _rollup_upsert(r, sign="", key=_ROLLUP_KEY):
+    return f"""
+        INSERT INTO print_daily_rollup (day, printer_name, material_type, project_category, jobs, successes, grams, hours, cost)
+        VALUES ({key.format(r=r)}, {_ROLLUP_VALS.format(r=r, sign=sign)})
+        ON CONFLICT (day, printer_name, material_type, project_category) DO UPDATE SET
+            jobs = jobs + excluded.jobs,
+            successes = successes + excluded.successes,
+            grams = grams + excluded.grams,
+            hours = hours + excluded.hours,
+            cost = cost + excluded.cost;
+    """
+
+_ROLLUP_PRUNE = "DELETE FROM print_daily_rollup WHERE jobs <= 0;"
+
+ROLLUP_TRIGGERS = [
+    f"CREATE TRIGGER IF NOT EXISTS trg_rollup_ins AFTER INSERT ON print_jobs BEGIN {_rollup_upsert('NEW')} END",
+    f"CREATE TRIGGER IF NOT EXISTS trg_rollup_del AFTER DELETE ON print_jobs BEGIN {_rollup_upsert('OLD', '-')} {_ROLLUP_PRUNE} END",
+    f"CREATE TRIGGER IF NOT EXISTS trg_rollup_upd AFTER UPDATE ON print_jobs BEGIN {_rollup_upsert('OLD', '-')} {_rollup_upsert('NEW')} {_ROLLUP_PRUNE} END",
+]
+
+# In v2 print_jobs is a view, so the rollup hangs off the fact table instead
+ROLLUP_TRIGGERS_V2 = [
+    f"CREATE TRIGGER IF NOT EXISTS trg_rollup_ins AFTER INSERT ON job_facts BEGIN {_rollup_upsert('NEW', key=_ROLLUP_KEY_V2)} END",
+    f"CREATE TRIGGER IF NOT EXISTS trg_rollup_del AFTER DELETE ON job_facts BEGIN {_rollup_upsert('OLD', '-', _ROLLUP_KEY_V2)} {_ROLLUP_PRUNE} END",
+    f"CREATE TRIGGER IF NOT EXISTS trg_rollup_upd AFTER UPDATE ON job_facts BEGIN {_rollup_upsert('OLD', '-', _ROLLUP_KEY_V2)} {_rollup_upsert('NEW', key=_ROLLUP_KEY_V2)} {_ROLLUP_PRUNE} END",
+]
+
+def create_rollups(conn):
+    # (Re)build the rollup from scratch, then let triggers maintain it
+    c = conn.cursor()
+    c.execute(ROLLUP_TABLE)
+    c.execute("DELETE FROM print_daily_rollup")
+    c.execute(f"""
+        INSERT INTO print_daily_rollup (day, printer_name, material_type, project_category, jobs, successes, grams, hours, cost)
+        SELECT {_ROLLUP_KEY.format(r='p')},
+               COUNT(*), SUM(IFNULL(p.success_status, 0)), SUM(IFNULL(p.weight_used_grams, 0)),
+               SUM(IFNULL(p.print_time_hours, 0)), SUM(IFNULL(p.cost_usd, 0))
+        FROM print_jobs p
+        GROUP BY 1, 2, 3, 4
+    """)
+    for sql in (ROLLUP_TRIGGERS_V2 if schema_version(conn) == 2 else ROLLUP_TRIGGERS):
+        c.execute(sql)
+    c.execute("ANALYZE print_daily_rollup")
+    conn.commit()
+
+def migrate(db_path="data/print_analytics.db"):
+    # Bring an existing db up to date without touching the data
+    if not os.path.exists(db_path):
+        raise FileNotFoundError(f"No database at {db_path}")
+
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    existing = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='index'")}
+    missing = [name for name, _ in (INDEXES_V2 if schema_version(conn) == 2 else INDEXES) if name not in existing]
+
+    create_indexes(conn)
+    triggers = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='trigger'")}
+    if "trg_rollup_ins" not in triggers:
+        create_rollups(conn)
+        missing.append("print_daily_rollup")
+    if "trg_search_ins" not in triggers:
+        create_search_index(conn)
+        missing.append("print_search")
+    conn.close()
+    print(f"Migrated {db_path}: added {missing or 'nothing'}")
+    return missing
+
+# --- schema v2 ------------------------------------------------------------
+# Dictionary-encoded layout: the five low-cardinality text columns live in
+# small lookup tables and job_facts stores their integer ids. print_jobs turns
+# into a view with exactly the old columns (INSTEAD OF triggers make it
+# writable too), so agent SQL, the dashboard and every writer keep working.
+
+# print_jobs columns in order, without id
+JOB_COLUMNS = [
+    "date", "model_name", "printer_name", "material_type", "filament_brand",
+    "weight_used_grams", "print_time_hours", "success_status", "failure_reason",
+    "layer_height", "infill_percentage", "nozzle_temp", "bed_temp", "cost_usd", "project_category",
+]
+
+# print_jobs column -> (lookup table, job_facts column)
+DIMENSIONS = {
+    "printer_name": ("dim_printer", "printer_id"),
+    "material_type": ("dim_material", "material_id"),
+    "filament_brand": ("dim_brand", "brand_id"),
+    "failure_reason": ("dim_failure", "failure_id"),
+    "project_category": ("dim_category", "category_id"),
+}
+
+FACT_COLUMNS = [DIMENSIONS[c][1] if c in DIMENSIONS else c for c in JOB_COLUMNS]
+
+FACTS_TABLE = """
+    CREATE TABLE job_facts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        date DATETIME,
+        model_name TEXT,
+        printer_id INTEGER REFERENCES dim_printer(id),
+        material_id INTEGER REFERENCES dim_material(id),
+        brand_id INTEGER REFERENCES dim_brand(id),
+        weight_used_grams REAL,
+        print_time_hours REAL,
+        success_status BOOLEAN,
+        failure_id INTEGER REFERENCES dim_failure(id),
+        layer_height REAL,
+        infill_percentage INTEGER,
+        nozzle_temp INTEGER,
+        bed_temp INTEGER,
+        cost_usd REAL,
+        category_id INTEGER REFERENCES dim_category(id)
+    )
+"""
+
+def _dim_id(col, r):
+    return f"(SELECT id FROM {DIMENSIONS[col][0]} WHERE name = {r}.{col})"
+
+# Names come from scalar subqueries, which only run for columns a query uses,
+# so SUM(cost_usd) FROM print_jobs stays a covering index scan on job_facts.
+# Joins don't get that: sqlite keeps every LEFT JOIN in aggregates, and inner
+# joins end up as cross joins of the lookup tables.
+JOBS_VIEW = "CREATE VIEW print_jobs AS SELECT f.id, " + ", ".join(
+    f"(SELECT name FROM {DIMENSIONS[c][0]} WHERE id = f.{DIMENSIONS[c][1]}) AS {c}" if c in DIMENSIONS else f"f.{c}"
+    for c in JOB_COLUMNS
+) + " FROM job_facts f"
+
+# OR IGNORE also skips NULL names (NOT NULL), those just stay NULL ids
+_DIM_INSERTS = " ".join(f"INSERT OR IGNORE INTO {table} (name) VALUES (NEW.{col});" for col, (table, _) in DIMENSIONS.items())
+_NEW_VALUES = ", ".join(_dim_id(c, "NEW") if c in DIMENSIONS else f"NEW.{c}" for c in JOB_COLUMNS)
+
+VIEW_TRIGGERS = [
+    f"""CREATE TRIGGER trg_jobs_ins INSTEAD OF INSERT ON print_jobs BEGIN {_DIM_INSERTS}
+        INSERT INTO job_facts (id, {', '.join(FACT_COLUMNS)}) VALUES (NEW.id, {_NEW_VALUES}); END""",
+    f"""CREATE TRIGGER trg_jobs_upd INSTEAD OF UPDATE ON print_jobs BEGIN {_DIM_INSERTS}
+        UPDATE job_facts SET (id, {', '.join(FACT_COLUMNS)}) = (NEW.id, {_NEW_VALUES}) WHERE id = OLD.id; END""",
+    "CREATE TRIGGER trg_jobs_del INSTEAD OF DELETE ON print_jobs BEGIN DELETE FROM job_facts WHERE id = OLD.id; END",
+]
+
+def schema_version(conn):
+    return 2 if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'job_facts'").fetchone() else 1
+
+def insert_jobs_sql(conn, source, with_id=False):
+    # Statements copying rows shaped like print_jobs from `source` (a table
+    # name) into the db. Set-based in v2 rather than row by row through the
+    # view's triggers, which is what makes ingest on v2 fast enough.
+    cols = (["id"] if with_id else []) + JOB_COLUMNS
+    if schema_version(conn) < 2:
+        return [f"INSERT INTO print_jobs ({', '.join(cols)}) SELECT {', '.join(cols)} FROM {source}"]
+    stmts = [
+        f"INSERT OR IGNORE INTO {table} (name) SELECT DISTINCT {col} FROM {source} WHERE {col} IS NOT NULL ORDER BY 1"
+        for col, (table, _) in DIMENSIONS.items()
+    ]
+    values = ", ".join(f"{DIMENSIONS[c][0]}.id" if c in DIMENSIONS else f"s.{c}" for c in cols)
+    joins = " ".join(f"LEFT JOIN {table} ON {table}.name = s.{col}" for col, (table, _) in DIMENSIONS.items())
+    fact_cols = (["id"] if with_id else []) + FACT_COLUMNS
+    stmts.append(f"INSERT INTO job_facts ({', '.join(fact_cols)}) SELECT {values} FROM {source} s {joins}")
+    return stmts
+
+def _create_v2(c):
+    for table, _ in DIMENSIONS.values():
+        c.execute(f"CREATE TABLE {table} (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE)")
+    c.execute(FACTS_TABLE)
+
+def migrate_v2(db_path="data/print_analytics.db", vacuum=True):
+    # Rewrite a v1 db into the v2 layout in place. Ids are kept, so rollup,
+    # ingest checkpoints and Parquet snapshots all stay valid.
+    if not os.path.exists(db_path):
+        raise FileNotFoundError(f"No database at {db_path}")
+
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    if schema_version(conn) == 2:
+        conn.close()
+        print(f"{db_path} is already on schema v2")
+        return False
+
+    start = time.perf_counter()
+    size = os.path.getsize(db_path)
+    c = conn.cursor()
+    c.execute("BEGIN IMMEDIATE")
+    try:
+        # new tables next to the old one, copy, then swap the table for the view
+        _create_v2(c)
+        for sql in insert_jobs_sql(conn, "print_jobs", with_id=True):
+            c.execute(sql)
+        # never hand out an id the old table already used (deleted tail rows)
+        c.execute("""
+            UPDATE sqlite_sequence SET seq = (SELECT MAX(seq) FROM sqlite_sequence WHERE name IN ('print_jobs', 'job_facts'))
+            WHERE name = 'job_facts'
+        """)
+        c.execute("DROP TABLE print_jobs")  # takes its indexes and rollup triggers with it
+        c.execute(JOBS_VIEW)
+        for sql in VIEW_TRIGGERS:
+            c.execute(sql)
+        for name, target in INDEXES_V2:
+            c.execute(f"CREATE INDEX {name} ON {target}")
+        has_rollup = c.execute("SELECT 1 FROM sqlite_master WHERE name = 'print_daily_rollup'").fetchone()
+        if has_rollup:
+            # same rows, the rollup contents are still right
+            for sql in ROLLUP_TRIGGERS_V2:
+                c.execute(sql)
+        if c.execute("SELECT 1 FROM sqlite_master WHERE name = 'print_search'").fetchone():
+            # same ids and text too, the index now reads through the view
+            for sql in SEARCH_TRIGGERS_V2:
+                c.execute(sql)
+        c.execute("COMMIT")
+    except BaseException:
+        c.execute("ROLLBACK")
+        conn.close()
+        raise
+
+    if not has_rollup:
+        create_rollups(conn)
+    if vacuum:
+        c.execute("VACUUM")  # give the space of the wide table back
+    c.execute("ANALYZE")
+    conn.close()
+    print(f"Migrated {db_path} to schema v2 in {time.perf_counter() - start:.1f}s: "
+          f"{size / 1e6:.1f} MB -> {os.path.getsize(db_path) / 1e6:.1f} MB")
+    return True
+
+# Full-text index over model names and failure reasons, so "dragon" or
+# "warping" is an index lookup instead of a LIKE '%...%' scan. External
+# content: it stores only the index, the text is read back from print_jobs.
+# Porter stemming + prefix queries make "warp" match "Model warping".
+SEARCH_TABLE = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS print_search USING fts5(
+        model_name, failure_reason,
+        content='print_jobs', content_rowid='id',
+        tokenize='porter unicode61 remove_diacritics 2', prefix='2 3'
+    )
+"""
+
+# FTS5 'delete' needs the exact old values, or the index silently goes bad
+_SEARCH_INSERT = "INSERT INTO print_search (rowid, model_name, failure_reason) VALUES ({r}.id, {r}.model_name, {fr});"
+_SEARCH_DELETE = "INSERT INTO print_search (print_search, rowid, model_name, failure_reason) VALUES ('delete', {r}.id, {r}.model_name, {fr});"
+
+def _search_triggers(table, changed, failure):
+    ins = _SEARCH_INSERT.format(r="NEW", fr=failure.format(r="NEW"))
+    dele = _SEARCH_DELETE.format(r="OLD", fr=failure.format(r="OLD"))
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS trg_search_ins AFTER INSERT ON {table} BEGIN {ins} END",
+        f"CREATE TRIGGER IF NOT EXISTS trg_search_del AFTER DELETE ON {table} BEGIN {dele} END",
+        f"CREATE TRIGGER IF NOT EXISTS trg_search_upd AFTER UPDATE OF {changed} ON {table} BEGIN {dele} {ins} END",
+    ]
+
+SEARCH_TRIGGERS = _search_triggers("print_jobs", "id, model_name, failure_reason", "{r}.failure_reason")
+SEARCH_TRIGGERS_V2 = _search_triggers("job_facts", "id, model_name, failure_id",
+                                      "(SELECT name FROM dim_failure WHERE id = {r}.failure_id)")
+
+def create_search_index(conn):
+    # (Re)build the full-text index from print_jobs, then let triggers maintain it
+    c = conn.cursor()
+    c.execute(SEARCH_TABLE)
+    for sql in (SEARCH_TRIGGERS_V2 if schema_version(conn) == 2 else SEARCH_TRIGGERS):
+        c.execute(sql)
+    c.execute("INSERT INTO print_search (print_search) VALUES ('rebuild')")
+    c.execute("INSERT INTO print_search (print_search) VALUES ('optimize')")
+    conn.commit()
+
 def create_db(db_path="data/print_analytics.db"):
     # make sure dir exists
     os.makedirs(os.path.dirname(db_path), exist_ok=True)
@@ -63,7 +398,16 @@ def create_db(db_path="data/print_analytics.db"):
     conn = sqlite3.connect(db_path)
     c = conn.cursor()
     
+    # WAL so the app's read-only pool never blocks on writers
+    c.execute("PRAGMA journal_mode=WAL")
+    
     # Clean slate
+    if schema_version(conn) == 2:
+        c.execute("DROP VIEW print_jobs")
+        c.execute("DROP TABLE job_facts")
+        for table, _ in DIMENSIONS.values():
+            c.execute(f"DROP TABLE {table}")
+    c.execute("DROP TABLE IF EXISTS print_search")
     c.execute("DROP TABLE IF EXISTS print_jobs")
     
     # Just one main table for now, keep it simple
@@ -178,23 +522,158 @@ def generate_data(conn, num_rows=550):
             layer_h, infill, nozzle, bed, cost, category
         ))
         
-    query = """
+    c.executemany(INSERT_SQL, data)
+    conn.commit()
+    print("Done! DB ready.")
+
+# Same physics as generate_data, as lookup tables for the vectorized path
+PREMIUM_BRANDS = ["Prusament", "Bambu Lab"]
+LAYER_HEIGHTS = [0.1, 0.15, 0.2, 0.24, 0.3]
+INFILLS = [10, 15, 20, 40, 100]
+
+# material -> ((nozzle lo, hi), (bed lo, hi)), inclusive like random.randint
+TEMP_RANGES = {
+    "PLA": ((195, 215), (50, 65)),
+    "PETG": ((230, 250), (70, 85)),
+    "ABS": ((240, 260), (90, 110)),
+    "ASA": ((240, 260), (90, 110)),
+    "TPU": ((210, 230), (40, 60)),
+}
+DEFAULT_TEMPS = ((200, 200), (60, 60))
+
+def _speed_factor(printer):
+    if "Ender" in printer: return 0.8
+    if "Bambu" in printer: return 3.0
+    return 1.0
+
+def _fail_chance(printer):
+    return 0.05 if ("Bambu" in printer or "Prusa" in printer) else 0.15
+
+def _make_chunk(rng, n, now):
+    # One chunk of rows, every column drawn as a whole array
+    cat = rng.integers(0, len(CATEGORIES), n)
+    printer = rng.integers(0, len(PRINTERS), n)
+    material = rng.integers(0, len(MATERIALS), n)
+    brand = rng.integers(0, len(BRANDS), n)
+
+    days_back = rng.integers(1, 366, n)
+    dates = np.datetime64(now, "us") - days_back.astype("timedelta64[D]")
+    dates = np.char.replace(np.datetime_as_string(dates, unit="us"), "T", " ")
+
+    # Models: flatten the per-category lists and index with offsets
+    model_lists = [PRINT_MODELS[c] for c in CATEGORIES]
+    flat_models = np.array(sum(model_lists, []))
+    lens = np.array([len(m) for m in model_lists])
+    offsets = np.concatenate([[0], np.cumsum(lens)[:-1]])
+    models = flat_models[offsets[cat] + (rng.random(n) * lens[cat]).astype(int)]
+    versioned = rng.random(n) > 0.7
+    suffix = np.char.add(" v", rng.integers(1, 6, n).astype(str))
+    models = np.where(versioned, np.char.add(models, suffix), models)
+
+    is_mini = cat == CATEGORIES.index("Miniatures")
+    weight = np.where(is_mini, rng.uniform(2, 50, n), rng.uniform(5, 500, n))
+
+    speed = np.array([_speed_factor(p) for p in PRINTERS])[printer]
+    print_time = np.round(weight / 12.0 / speed * rng.uniform(0.8, 1.2, n), 2)
+
+    is_fail = rng.random(n) < np.array([_fail_chance(p) for p in PRINTERS])[printer]
+    reasons = np.array(FAILURE_REASONS, dtype=object)[rng.integers(0, len(FAILURE_REASONS), n)]
+    failure_reason = np.where(is_fail, reasons, None)
+    # failed prints stop midway: less time, some wasted material
+    print_time = np.where(is_fail, print_time * rng.uniform(0.1, 0.9, n), print_time)
+    weight = np.where(is_fail, weight * rng.uniform(0.1, 0.9, n), weight)
+
+    layer_h = np.where(is_mini, 0.1, np.array(LAYER_HEIGHTS)[rng.integers(0, len(LAYER_HEIGHTS), n)])
+    infill = np.array(INFILLS)[rng.integers(0, len(INFILLS), n)]
+
+    temps = [TEMP_RANGES.get(m, DEFAULT_TEMPS) for m in MATERIALS]
+    nozzle_lo = np.array([t[0][0] for t in temps])[material]
+    nozzle_hi = np.array([t[0][1] for t in temps])[material]
+    bed_lo = np.array([t[1][0] for t in temps])[material]
+    bed_hi = np.array([t[1][1] for t in temps])[material]
+    nozzle = rng.integers(nozzle_lo, nozzle_hi + 1)
+    bed = rng.integers(bed_lo, bed_hi + 1)
+
+    premium = np.isin(np.array(BRANDS)[brand], PREMIUM_BRANDS)
+    cost = np.round(weight * np.where(premium, 0.035, 0.025), 2)
+
+    return list(zip(
+        dates.tolist(), models.tolist(),
+        np.array(PRINTERS)[printer].tolist(), np.array(MATERIALS)[material].tolist(),
+        np.array(BRANDS)[brand].tolist(),
+        np.round(weight, 2).tolist(), np.round(print_time, 2).tolist(),
+        (~is_fail).astype(int).tolist(), failure_reason.tolist(),
+        layer_h.tolist(), infill.tolist(), nozzle.tolist(), bed.tolist(),
+        cost.tolist(), np.array(CATEGORIES)[cat].tolist()
+    ))
+
+INSERT_SQL = """
     INSERT INTO print_jobs (
         date, model_name, printer_name, material_type, filament_brand,
         weight_used_grams, print_time_hours, success_status, failure_reason,
         layer_height, infill_percentage, nozzle_temp, bed_temp, cost_usd, project_category
     ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    """
-    
-    c.executemany(query, data)
-    conn.commit()
-    print("Done! DB ready.")
+"""
+
+def generate_data_fast(conn, num_rows=550, seed=None, chunk_size=100_000):
+    # NumPy version of generate_data for big load tests (10M+ rows). Works in
+    # chunks so memory stays flat, with the durability knobs off while loading.
+    rng = np.random.default_rng(seed)
+    now = datetime.now()
+
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute("PRAGMA cache_size=-262144")  # 256MB
+    conn.execute("PRAGMA temp_store=MEMORY")
+
+    print(f"Generating {num_rows} print jobs (chunks of {chunk_size})...")
+    start = time.perf_counter()
+    done = 0
+    while done < num_rows:
+        n = min(chunk_size, num_rows - done)
+        conn.executemany(INSERT_SQL, _make_chunk(rng, n, now))
+        conn.commit()
+        done += n
+        if num_rows > chunk_size:
+            print(f"  {done}/{num_rows} ({done / (time.perf_counter() - start):,.0f} rows/s)")
+
+    # back to normal for everyone reading afterwards
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA journal_mode=WAL")
+    print(f"Done! {num_rows} rows in {time.perf_counter() - start:.1f}s")
+
+def build_db(db_path, num_rows=550, seed=None, chunk_size=100_000, schema=1):
+    # leftover -wal/-shm from the old file would get replayed into the new one
+    for path in (db_path, db_path + "-wal", db_path + "-shm"):
+        if os.path.exists(path):
+            os.remove(path)
 
-if __name__ == "__main__":
-    db_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "print_analytics.db")
-    if os.path.exists(db_path):
-        os.remove(db_path)
-    
     conn = create_db(db_path)
-    generate_data(conn)
+    generate_data_fast(conn, num_rows, seed=seed, chunk_size=chunk_size)
+    # build indexes after the bulk insert, much cheaper than maintaining them row by row
+    create_indexes(conn)
+    create_rollups(conn)
+    create_search_index(conn)
     conn.close()
+    if schema == 2:
+        migrate_v2(db_path)
+
+if __name__ == "__main__":
+    default_db = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "print_analytics.db")
+
+    parser = argparse.ArgumentParser(description="Build (or migrate) the print analytics db")
+    parser.add_argument("--migrate", action="store_true", help="Add missing indexes to the existing db, keep data")
+    parser.add_argument("--db", default=default_db, help="Database file to write")
+    parser.add_argument("--rows", type=int, default=550, help="Number of print jobs to generate")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for reproducible data")
+    parser.add_argument("--chunk-size", type=int, default=100_000, help="Rows generated and inserted per batch")
+    parser.add_argument("--schema", type=int, choices=[1, 2], default=1,
+                        help="2 = dictionary-encoded fact table behind a print_jobs view (with --migrate: convert in place)")
+    args = parser.parse_args()
+
+    if args.migrate:
+        migrate(args.db)
+        if args.schema == 2:
+            migrate_v2(args.db)
+    else:
+        build_db(args.db, args.rows, seed=args.seed, chunk_size=args.chunk_size, schema=args.schema)
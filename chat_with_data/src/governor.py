@@ -0,0 +1,163 @@
+import re
+import time
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(message)s')
+log = logging.getLogger("Governor")
+
+# Per-query defaults, generous for real analytics but they stop a cartesian
+# self-join over print_jobs long before it ties up a worker
+QUERY_TIMEOUT_SEC = 5.0
+# No VM step limit by default: a plain COUNT/SUM over print_jobs takes 10-20
+# steps a row, so any fixed cap fails ordinary aggregates once the table grows
+# past a few million rows. The wall clock stops runaway queries either way.
+MAX_VM_STEPS = None
+MAX_RESULT_BYTES = 512 * 1024
+PROGRESS_EVERY = 10_000   # VM instructions between progress handler calls
+
+# What the agent is told for each kind of stop
+HINTS = {
+    "timeout": "Query ran too long. Filter with WHERE, aggregate with GROUP BY, or query print_daily_rollup instead. Avoid joining print_jobs to itself.",
+    "too_many_steps": "Query does too much work. Filter with WHERE, aggregate with GROUP BY, or query print_daily_rollup instead. Avoid joining print_jobs to itself.",
+    "result_too_large": "Result is too large to send back. Select fewer columns or aggregate.",
+    "cancelled": "Query was cancelled.",
+    "session_budget": "This session has used up its query time budget.",
+}
+# ...and instead, when the query that was stopped already aggregates
+AGGREGATED_HINTS = {
+    "timeout": "Query ran too long. Filter with WHERE (e.g. a date range), group by fewer columns, or query print_daily_rollup instead. Avoid joining print_jobs to itself.",
+    "too_many_steps": "Query does too much work. Filter with WHERE (e.g. a date range), group by fewer columns, or query print_daily_rollup instead. Avoid joining print_jobs to itself.",
+}
+_AGGREGATE_RE = re.compile(r"\bGROUP\s+BY\b|\b(COUNT|SUM|AVG|MIN|MAX|TOTAL|GROUP_CONCAT)\s*\(", re.IGNORECASE)
+
+
+class QueryBudgetError(Exception):
+    def __init__(self, kind, message):
+        super().__init__(message)
+        self.kind = kind
+
+    def to_result(self, query=None):
+        hint = HINTS.get(self.kind, "")
+        if query and self.kind in AGGREGATED_HINTS and _AGGREGATE_RE.search(query):
+            hint = AGGREGATED_HINTS[self.kind]
+        return {"success": False, "error": str(self), "error_type": self.kind, "hint": hint}
+
+
+class QueryGovernor:
+    # One per agent session. Enforces per-query wall clock / VM step / result
+    # size limits, tracks the session's total SQL time, and can interrupt
+    # whatever is running via cancel(). child() gives one tool call its own.
+    def __init__(self, timeout=QUERY_TIMEOUT_SEC, max_steps=MAX_VM_STEPS,
+                 max_result_bytes=MAX_RESULT_BYTES, session_seconds=None, parent=None):
+        self.timeout = timeout
+        self.max_steps = max_steps
+        self.max_result_bytes = max_result_bytes
+        self.session_seconds = session_seconds
+        self.parent = parent
+        self.used_seconds = 0.0
+        self.stopped = 0
+        self._active = set()
+        self._lock = threading.Lock()
+
+    def child(self):
+        # Same limits, and its SQL time and stops count toward this session, but
+        # its cancel() only interrupts what the one call using it runs. The
+        # session's cancel() still reaches it.
+        return QueryGovernor(self.timeout, self.max_steps, self.max_result_bytes, self.session_seconds, parent=self)
+
+    def _scopes(self):
+        return (self, self.parent) if self.parent else (self,)
+
+    @contextmanager
+    def guard(self, conn, errors=(sqlite3.OperationalError,)):
+        # conn is a sqlite3 connection or anything else with interrupt() (a
+        # DuckDB cursor), errors are what its driver raises when interrupted.
+        # The VM step limit needs sqlite's progress handler, the rest works for both.
+        session = self.parent or self
+        if session.session_seconds is not None and session.used_seconds >= session.session_seconds:
+            raise QueryBudgetError("session_budget", f"Session query budget of {session.session_seconds}s used up")
+
+        state = {"steps": 0, "reason": None}
+        start = time.monotonic()
+
+        # Wall clock from a timer: the progress handler doesn't fire while
+        # sqlite sorts or groups, so a big GROUP BY would run well past the limit
+        def expire():
+            state["reason"] = "timeout"
+            conn.interrupt()
+
+        def progress():
+            state["steps"] += PROGRESS_EVERY
+            if self.max_steps and state["steps"] > self.max_steps:
+                state["reason"] = "too_many_steps"
+            return 1 if state["reason"] else 0  # non-zero aborts the statement
+
+        timer = threading.Timer(self.timeout, expire) if self.timeout else None
+        steps = hasattr(conn, "set_progress_handler")
+        if steps:
+            conn.set_progress_handler(progress, PROGRESS_EVERY)
+        for g in self._scopes():
+            with g._lock:
+                g._active.add(conn)
+        if timer:
+            timer.start()
+        try:
+            yield state
+        except errors as e:
+            if state["reason"] or "interrupted" in str(e).lower():
+                self._stopped()
+                raise self._error(state["reason"] or "cancelled", time.monotonic() - start, state["steps"]) from e
+            raise
+        finally:
+            if timer:
+                timer.cancel()
+            if steps:
+                conn.set_progress_handler(None, 0)
+            elapsed = time.monotonic() - start
+            for g in self._scopes():
+                with g._lock:
+                    g._active.discard(conn)
+                    g.used_seconds += elapsed
+
+    def _stopped(self):
+        for g in self._scopes():
+            g.stopped += 1
+
+    def _error(self, kind, elapsed, steps):
+        if kind == "timeout":
+            msg = f"Query stopped after {elapsed:.1f}s (limit {self.timeout}s)"
+        elif kind == "too_many_steps":
+            msg = f"Query stopped after {steps:,} VM steps (limit {self.max_steps:,})"
+        else:
+            msg = "Query cancelled"
+        log.warning(msg)
+        return QueryBudgetError(kind, msg)
+
+    def check_result(self, rows):
+        # rough size of what we'd hand back to the model
+        nbytes = sum(len(str(v)) + 2 for r in rows for v in r)
+        if self.max_result_bytes and nbytes > self.max_result_bytes:
+            self._stopped()
+            raise QueryBudgetError(
+                "result_too_large",
+                f"Result is ~{nbytes:,} bytes (limit {self.max_result_bytes:,})"
+            )
+
+    def cancel(self):
+        # Interrupts every statement running under this governor (and its children) right now
+        with self._lock:
+            active = list(self._active)
+        for conn in active:
+            conn.interrupt()
+        if active:
+            log.info(f"Cancelled {len(active)} running quer{'y' if len(active) == 1 else 'ies'}")
+
+    def stats(self):
+        return {"used_seconds": self.used_seconds, "stopped": self.stopped, "session_seconds": self.session_seconds}
+
+
+# Used when a caller doesn't bring its own (no session budget)
+DEFAULT_GOVERNOR = QueryGovernor()
@@ -0,0 +1,119 @@
+import json
+import logging
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(message)s')
+log = logging.getLogger("History")
+
+HISTORY_BUDGET = 6000     # prompt tokens we allow the history to use
+KEEP_EXCHANGES = 3        # last N user turns are always kept verbatim
+OLD_RESULT_ROWS = 3       # rows kept from old query results
+
+try:
+    import tiktoken  # optional, exact counts for OpenAI models
+    _enc = tiktoken.get_encoding("o200k_base")
+except Exception:
+    _enc = None
+
+
+def count_text(text):
+    if not text:
+        return 0
+    if _enc is not None:
+        return len(_enc.encode(text))
+    return len(text) // 4 + 1  # rough but fine for budgeting
+
+
+def _field(msg, name):
+    # history holds dicts, but older code also appended SDK message objects
+    return msg.get(name) if isinstance(msg, dict) else getattr(msg, name, None)
+
+
+def count_tokens(messages):
+    total = 0
+    for m in messages:
+        total += 4  # per-message overhead in the chat format
+        total += count_text(_field(m, "content"))
+        for tc in _field(m, "tool_calls") or []:
+            fn = tc["function"] if isinstance(tc, dict) else tc.function
+            name = fn["name"] if isinstance(fn, dict) else fn.name
+            args = fn["arguments"] if isinstance(fn, dict) else fn.arguments
+            total += count_text(name) + count_text(args)
+    return total
+
+
+def _head(column, n):
+    # works for plain and dictionary-encoded columnar results
+    if isinstance(column, dict) and "codes" in column:
+        return {**column, "codes": column["codes"][:n]}
+    return column[:n]
+
+
+def shrink_tool_result(content):
+    # Old query results only need to remind the model what it already looked at
+    note = f"old result, only first {OLD_RESULT_ROWS} rows kept. Re-query if you need more."
+    try:
+        res = json.loads(content)
+    except (TypeError, ValueError):
+        # markdown tables: keep header + a few rows
+        lines = content.splitlines()
+        if len(lines) > OLD_RESULT_ROWS + 2 and lines[0].startswith("|"):
+            return "\n".join(lines[:OLD_RESULT_ROWS + 2] + [f"({note})"])
+        return content[:300] + "...(truncated)" if len(content) > 300 else content
+
+    if not isinstance(res, dict):
+        return content
+    if isinstance(res.get("data"), list) and len(res["data"]) > OLD_RESULT_ROWS:
+        res = dict(res, data=res["data"][:OLD_RESULT_ROWS], note=note)
+        return json.dumps(res)
+    if isinstance(res.get("data"), dict) and (res.get("count") or 0) > OLD_RESULT_ROWS:
+        res = dict(res, data={c: _head(v, OLD_RESULT_ROWS) for c, v in res["data"].items()}, note=note)
+        return json.dumps(res, separators=(",", ":"))
+    if "schema" in res:
+        return json.dumps({"success": res.get("success"), "note": "schema was shown earlier"})
+    return content
+
+
+class HistoryManager:
+    def __init__(self, budget=HISTORY_BUDGET, keep_exchanges=KEEP_EXCHANGES):
+        self.budget = budget
+        self.keep_exchanges = keep_exchanges
+
+    def _exchanges(self, history):
+        # Split everything after the system prompt into user-led exchanges.
+        # Dropping whole exchanges keeps tool_call / tool message pairs intact.
+        groups = []
+        for m in history[1:]:
+            if _field(m, "role") == "user" or not groups:
+                groups.append([])
+            groups[-1].append(m)
+        return groups
+
+    def compact(self, history):
+        if not self.budget or count_tokens(history) <= self.budget:
+            return history
+
+        system = history[0]
+        groups = self._exchanges(history)
+        keep = max(1, self.keep_exchanges)  # the exchange in progress always stays
+        old, recent = groups[:-keep], groups[-keep:]
+
+        # Step 1: shrink tool outputs in the older exchanges
+        old = [
+            [
+                {**m, "content": shrink_tool_result(m["content"])} if isinstance(m, dict) and m.get("role") == "tool" else m
+                for m in g
+            ]
+            for g in old
+        ]
+
+        # Step 2: still too big -> drop the oldest exchanges until it fits
+        def build():
+            return [system] + [m for g in old + recent for m in g]
+
+        compacted = build()
+        while old and count_tokens(compacted) > self.budget:
+            old.pop(0)
+            compacted = build()
+
+        log.info(f"History compacted: {count_tokens(history)} -> {count_tokens(compacted)} tokens")
+        return compacted
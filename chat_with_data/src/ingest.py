@@ -0,0 +1,390 @@
+import os
+import csv
+import glob
+import gzip
+import json
+import time
+import hashlib
+import sqlite3
+import logging
+import argparse
+from functools import lru_cache
+from datetime import datetime, timezone
+
+from src.database_setup import insert_jobs_sql
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(message)s')
+log = logging.getLogger("Ingest")
+
+BATCH_ROWS = 5000       # rows per write transaction, keeps write locks short
+PROGRESS_SEC = 5.0      # how often rows/sec gets logged
+POLL_SEC = 2.0          # --follow: how often files are checked for new lines
+
+# print_jobs columns in insert order (everything but id)
+COLUMNS = [
+    "date", "model_name", "printer_name", "material_type", "filament_brand",
+    "weight_used_grams", "print_time_hours", "success_status", "failure_reason",
+    "layer_height", "infill_percentage", "nozzle_temp", "bed_temp", "cost_usd", "project_category",
+]
+REQUIRED = {"date", "printer_name", "material_type"}
+
+# Names printer farm exports tend to use for our columns
+ALIASES = {
+    "timestamp": "date", "started_at": "date", "start_time": "date",
+    "model": "model_name", "file": "model_name", "filename": "model_name",
+    "printer": "printer_name", "material": "material_type", "filament": "material_type",
+    "brand": "filament_brand", "weight": "weight_used_grams", "weight_g": "weight_used_grams", "grams": "weight_used_grams",
+    "hours": "print_time_hours", "duration_h": "print_time_hours",
+    "success": "success_status", "status": "success_status", "result": "success_status",
+    "error": "failure_reason", "failure": "failure_reason",
+    "layer": "layer_height", "infill": "infill_percentage",
+    "nozzle": "nozzle_temp", "bed": "bed_temp", "cost": "cost_usd", "category": "project_category",
+}
+
+FLOATS = {"weight_used_grams", "print_time_hours", "layer_height", "cost_usd"}
+INTS = {"infill_percentage", "nozzle_temp", "bed_temp"}
+NUMERIC = sorted(FLOATS | INTS)
+RANGES = {
+    "weight_used_grams": (0, 100_000), "print_time_hours": (0, 2000), "layer_height": (0.01, 2.0),
+    "infill_percentage": (0, 100), "nozzle_temp": (0, 500), "bed_temp": (0, 200), "cost_usd": (0, 100_000),
+}
+SUCCESS = {"1": 1, "true": 1, "yes": 1, "ok": 1, "success": 1, "succeeded": 1, "done": 1,
+           "0": 0, "false": 0, "no": 0, "fail": 0, "failed": 0, "failure": 0, "error": 0, "cancelled": 0}
+
+# Bookkeeping lives in the same db so a batch and its checkpoint commit together.
+# Leading underscore keeps them out of the agent's schema.
+SETUP_SQL = [
+    "CREATE TABLE IF NOT EXISTS _ingest_seen (fp INTEGER PRIMARY KEY)",
+    """CREATE TABLE IF NOT EXISTS _ingest_checkpoints (
+        source TEXT PRIMARY KEY,
+        offset INTEGER NOT NULL,
+        line INTEGER NOT NULL,
+        size INTEGER NOT NULL,
+        header TEXT,
+        rows_added INTEGER NOT NULL DEFAULT 0,
+        updated REAL NOT NULL
+    )""",
+]
+
+
+class BadRow(ValueError):
+    pass
+
+
+def fingerprint(printer_name, date, model_name):
+    # A printer runs one job at a time, so printer + start time (+ model) is the job
+    key = f"{printer_name}\x1f{date}\x1f{model_name}".encode()
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "big") >> 1  # fits a signed int64
+
+
+@lru_cache(maxsize=256)
+def _column(key):
+    # header / json key -> our column name (keys repeat on every row, hence the cache)
+    key = key.strip().lower()
+    return ALIASES.get(key, key)
+
+
+def _parse_date(value):
+    if isinstance(value, str) and len(value) >= 19 and value[10] == " " and value[4] == "-":
+        # already 'YYYY-MM-DD HH:MM:SS[.ffffff]', the format we store: just check it
+        try:
+            datetime.fromisoformat(value)
+            return value
+        except ValueError:
+            raise BadRow("bad date")
+    if isinstance(value, (int, float)) or (isinstance(value, str) and value.replace(".", "", 1).isdigit()):
+        dt = datetime.fromtimestamp(float(value), tz=timezone.utc)
+    else:
+        try:
+            dt = datetime.fromisoformat(str(value).strip().replace("Z", "+00:00"))
+        except ValueError:
+            raise BadRow("bad date")
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return str(dt)  # same text format database_setup writes
+
+
+def clean_row(raw):
+    # raw dict from CSV/JSON -> tuple in COLUMNS order, or BadRow(reason)
+    row = {}
+    for k, v in raw.items():
+        if k is None:
+            raise BadRow("extra fields")
+        k = _column(k)
+        if isinstance(v, str):
+            v = v.strip()
+        if v == "" or v is None:
+            continue
+        row[k] = v
+
+    missing = REQUIRED - row.keys()
+    if missing:
+        raise BadRow(f"missing {sorted(missing)[0]}")
+
+    row["date"] = _parse_date(row["date"])
+    for col in NUMERIC:
+        if col not in row:
+            continue
+        try:
+            val = float(row[col])
+        except (TypeError, ValueError):
+            raise BadRow(f"bad {col}")
+        lo, hi = RANGES[col]
+        if not lo <= val <= hi:
+            raise BadRow(f"{col} out of range")
+        row[col] = int(round(val)) if col in INTS else val
+
+    if "success_status" in row:
+        status = SUCCESS.get(str(row["success_status"]).lower())
+        if status is None:
+            raise BadRow("bad success_status")
+        row["success_status"] = status
+    else:
+        row["success_status"] = 0 if row.get("failure_reason") else 1
+    if row["success_status"] == 1:
+        row.pop("failure_reason", None)
+
+    return tuple(row.get(c) for c in COLUMNS)
+
+
+class _LineReader:
+    # Binary line iterator that knows the byte offset of what it has handed
+    # out, so the checkpoint can point at the exact place to resume from
+    def __init__(self, f, offset=0, line=0):
+        self.f = f
+        self.offset = offset
+        self.line = line
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        raw = self.f.readline()
+        if not raw or not raw.endswith(b"\n"):
+            # EOF, or a line the writer hasn't finished yet: leave it for next time
+            raise StopIteration
+        self.offset += len(raw)
+        self.line += 1
+        return raw.decode("utf-8", errors="replace")
+
+
+def _fmt(path):
+    name = path[:-3] if path.endswith(".gz") else path
+    if name.endswith((".jsonl", ".ndjson", ".json")):
+        return "jsonl"
+    if name.endswith((".csv", ".tsv")):
+        return "csv"
+    raise ValueError(f"Unknown log format: {path}")
+
+
+def expand(paths):
+    files = []
+    for p in paths:
+        if os.path.isdir(p):
+            for ext in ("csv", "tsv", "jsonl", "ndjson", "csv.gz", "jsonl.gz"):
+                files += glob.glob(os.path.join(p, f"*.{ext}"))
+        else:
+            files += glob.glob(p) or [p]
+    return sorted(set(os.path.abspath(f) for f in files))
+
+
+class Ingestor:
+    def __init__(self, db_path, batch_rows=BATCH_ROWS, rejects_path=None, progress_sec=PROGRESS_SEC):
+        self.db_path = db_path
+        self.batch_rows = batch_rows
+        self.progress_sec = progress_sec
+        self.rejects = open(rejects_path, "a", encoding="utf-8") if rejects_path else None
+        self.stats = {"read": 0, "inserted": 0, "duplicates": 0, "rejected": 0, "reasons": {}}
+        self._start = time.perf_counter()
+        self._last_report = self._start
+
+        self.conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+        # WAL: readers keep reading the last committed state while we write
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA temp_store=MEMORY")
+        self.conn.create_function("ingest_fp", 3, fingerprint, deterministic=True)
+        self._setup()
+
+    def _setup(self):
+        if not self.conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'print_jobs'").fetchone():
+            raise RuntimeError(f"No print_jobs table in {self.db_path}. Run database_setup.py first!")
+        fresh = not self.conn.execute("SELECT 1 FROM sqlite_master WHERE name = '_ingest_seen'").fetchone()
+        self.conn.execute("BEGIN IMMEDIATE")
+        for sql in SETUP_SQL:
+            self.conn.execute(sql)
+        if fresh:
+            # jobs already in the db (generated or loaded some other way) count as seen
+            self.conn.execute("INSERT OR IGNORE INTO _ingest_seen SELECT ingest_fp(printer_name, date, model_name) FROM print_jobs")
+        self.conn.execute("COMMIT")
+        cols = ", ".join(["fp INTEGER"] + COLUMNS)
+        self.conn.execute(f"CREATE TEMP TABLE IF NOT EXISTS ingest_batch ({cols})")
+        # straight into job_facts + lookups on schema v2, not through the view
+        self.insert_sql = insert_jobs_sql(self.conn, "temp.ingest_batch")
+
+    def _reject(self, source, line, reason, raw):
+        self.stats["rejected"] += 1
+        self.stats["reasons"][reason] = self.stats["reasons"].get(reason, 0) + 1
+        if self.rejects:
+            self.rejects.write(json.dumps({"source": source, "line": line, "reason": reason, "row": raw}, default=str) + "\n")
+
+    def _checkpoint(self, source):
+        row = self.conn.execute(
+            "SELECT offset, line, size, header FROM _ingest_checkpoints WHERE source = ?", (source,)
+        ).fetchone()
+        return row or (0, 0, 0, None)
+
+    def _write(self, source, batch, offset, line, size, header):
+        # One short transaction: rows, dedupe keys and the checkpoint together,
+        # so a crash anywhere resumes exactly where the last commit left off
+        c = self.conn
+        c.execute("BEGIN IMMEDIATE")  # waits up to the 30s busy timeout for other writers
+        try:
+            c.executemany(f"INSERT INTO temp.ingest_batch VALUES ({', '.join('?' * (len(COLUMNS) + 1))})", batch)
+            # drop known jobs first: the count is what gets inserted, and rowcount
+            # can't be trusted when print_jobs is a view (INSTEAD OF triggers)
+            c.execute("DELETE FROM temp.ingest_batch WHERE fp IN (SELECT fp FROM _ingest_seen)")
+            added = c.execute("SELECT COUNT(*) FROM temp.ingest_batch").fetchone()[0]
+            for sql in self.insert_sql:
+                c.execute(sql)
+            c.execute("INSERT OR IGNORE INTO _ingest_seen SELECT fp FROM temp.ingest_batch")
+            c.execute("DELETE FROM temp.ingest_batch")
+            c.execute("""
+                INSERT INTO _ingest_checkpoints (source, offset, line, size, header, rows_added, updated)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (source) DO UPDATE SET offset = excluded.offset, line = excluded.line, size = excluded.size,
+                    header = excluded.header, rows_added = rows_added + excluded.rows_added, updated = excluded.updated
+            """, (source, offset, line, size, header, added, time.time()))
+            c.execute("COMMIT")
+        except BaseException:
+            c.execute("ROLLBACK")
+            raise
+        self.stats["inserted"] += added
+        self.stats["duplicates"] += len(batch) - added
+        self._progress()
+
+    def _progress(self, final=False):
+        now = time.perf_counter()
+        if not final and now - self._last_report < self.progress_sec:
+            return
+        self._last_report = now
+        s = self.stats
+        rate = s["read"] / max(now - self._start, 1e-9)
+        log.info(f"{s['read']:,} read, {s['inserted']:,} inserted, {s['duplicates']:,} dupes, "
+                 f"{s['rejected']:,} rejected ({rate:,.0f} rows/s)")
+
+    @staticmethod
+    def _json_records(lines):
+        for text in lines:
+            if not text.strip():
+                continue
+            try:
+                rec = json.loads(text)
+            except ValueError:
+                rec = None
+            yield rec if isinstance(rec, dict) else BadRow("bad json")
+
+    def ingest_file(self, path):
+        source = os.path.abspath(path)
+        fmt = _fmt(source)
+        size = os.path.getsize(source)
+        offset, line, old_size, header = self._checkpoint(source)
+        gz = source.endswith(".gz")
+        if size < old_size or (gz and size != old_size):
+            # truncated / rotated, or a .gz that was rewritten or not read to the end
+            # (can't seek into those) -> from the top, dedupe skips what already landed
+            offset, line, header = 0, 0, None
+        elif gz and size == old_size and line:
+            return 0  # compressed files are only read once they're complete
+        if not gz and offset >= size:
+            return 0
+
+        before = self.stats["inserted"]
+        with open(source, "rb") as raw:
+            f = gzip.GzipFile(fileobj=raw) if gz else raw
+            if gz:
+                reader = _LineReader(f)
+            else:
+                f.seek(offset)
+                reader = _LineReader(f, offset, line)
+
+            if fmt == "csv":
+                if header is None:
+                    header = next(reader, "").rstrip("\r\n")
+                    if not header:
+                        return 0
+                delim = "\t" if source.replace(".gz", "").endswith(".tsv") else ","
+                fields = next(csv.reader([header], delimiter=delim))
+                records = csv.DictReader(reader, fieldnames=fields, delimiter=delim)
+            else:
+                records = self._json_records(reader)
+
+            batch, seen = [], set()
+            for rec in records:
+                self.stats["read"] += 1
+                try:
+                    if isinstance(rec, BadRow):
+                        raise rec
+                    row = clean_row(rec)
+                except BadRow as e:
+                    self._reject(source, reader.line, str(e), rec if isinstance(rec, dict) else None)
+                    continue
+                fp = fingerprint(row[2], row[0], row[1])
+                if fp in seen:
+                    self.stats["duplicates"] += 1
+                    continue
+                seen.add(fp)
+                batch.append((fp,) + row)
+                if len(batch) >= self.batch_rows:
+                    # a .gz only gets its size checkpointed once it's been read to the end
+                    self._write(source, batch, reader.offset, reader.line, 0 if gz else size, header)
+                    batch, seen = [], set()
+
+            # flush the tail and checkpoint even when every row was rejected
+            self._write(source, batch, reader.offset, reader.line, size, header)
+        return self.stats["inserted"] - before
+
+    def run(self, paths, follow=False, poll=POLL_SEC):
+        try:
+            while True:
+                for path in expand(paths):
+                    added = self.ingest_file(path)
+                    if added:
+                        log.info(f"{os.path.basename(path)}: +{added:,} jobs")
+                if not follow:
+                    break
+                time.sleep(poll)
+        except KeyboardInterrupt:
+            log.info("Stopped, progress is checkpointed")
+        finally:
+            self._progress(final=True)
+            if self.rejects:
+                self.rejects.close()
+        s = self.stats
+        s["seconds"] = time.perf_counter() - self._start
+        s["rows_per_sec"] = s["read"] / max(s["seconds"], 1e-9)
+        return s
+
+    def close(self):
+        self.conn.close()
+
+
+if __name__ == "__main__":
+    default_db = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "print_analytics.db")
+
+    parser = argparse.ArgumentParser(description="Stream printer job logs (CSV/TSV/JSONL, optionally .gz) into print_jobs")
+    parser.add_argument("paths", nargs="+", help="Files, globs or directories of job logs")
+    parser.add_argument("--db", default=default_db, help="Database file to write")
+    parser.add_argument("--batch-rows", type=int, default=BATCH_ROWS, help="Rows per write transaction")
+    parser.add_argument("--rejects", help="Append rejected rows (with the reason) to this JSONL file")
+    parser.add_argument("--follow", action="store_true", help="Keep watching the files for new lines")
+    parser.add_argument("--poll", type=float, default=POLL_SEC, help="Seconds between checks with --follow")
+    args = parser.parse_args()
+
+    ingestor = Ingestor(args.db, batch_rows=args.batch_rows, rejects_path=args.rejects)
+    stats = ingestor.run(args.paths, follow=args.follow, poll=args.poll)
+    ingestor.close()
+    print(f"Done! {stats['inserted']:,} new jobs, {stats['duplicates']:,} duplicates, {stats['rejected']:,} rejected "
+          f"in {stats['seconds']:.1f}s ({stats['rows_per_sec']:,.0f} rows/s)")
+    for reason, n in sorted(stats["reasons"].items(), key=lambda x: -x[1]):
+        print(f"  {reason}: {n:,}")
@@ -0,0 +1,137 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(message)s')
+log = logging.getLogger("PlanCache")
+
+PLAN_TTL_SEC = 7 * 24 * 3600   # SQL for a question is reused for a week
+PLAN_MAX_ENTRIES = 1000
+
+# Words that don't change what the question asks for
+_FILLER = {"please", "pls", "hey", "hi", "can", "you", "could", "tell", "me", "show", "the", "a", "an"}
+
+
+def normalize_question(text):
+    text = re.sub(r"\b(what|how|where|who|which)'s\b", r"\1 is", text.lower())
+    words = re.sub(r"[^\w\s%]", " ", text).split()
+    return " ".join(w for w in words if w not in _FILLER)
+
+
+class PlanCache:
+    # Persistent question -> SQL map, kept in its own small sqlite file (the
+    # analytics db is opened read-only). Only the SQL is stored, never results,
+    # so a hit always re-runs against current data.
+    def __init__(self, path="data/plan_cache.db", ttl=PLAN_TTL_SEC, max_entries=PLAN_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS plans (
+                    db_key TEXT NOT NULL,
+                    question TEXT NOT NULL,
+                    queries TEXT NOT NULL,
+                    created REAL NOT NULL,
+                    last_used REAL NOT NULL,
+                    hits INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (db_key, question)
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_plans_last_used ON plans(last_used)")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=5)
+        try:
+            with conn:  # commit / rollback
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, db_key, question):
+        q = normalize_question(question)
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            row = conn.execute(
+                "SELECT queries, created FROM plans WHERE db_key = ? AND question = ?", (db_key, q)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                self.misses += 1
+                return None
+            conn.execute(
+                "UPDATE plans SET last_used = ?, hits = hits + 1 WHERE db_key = ? AND question = ?",
+                (now, db_key, q)
+            )
+        self.hits += 1
+        log.info(f"Plan hit: {q}")
+        return json.loads(row[0])
+
+    def put(self, db_key, question, queries):
+        q = normalize_question(question)
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute("""
+                INSERT INTO plans (db_key, question, queries, created, last_used) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (db_key, question) DO UPDATE SET
+                    queries = excluded.queries, created = excluded.created, last_used = excluded.last_used
+            """, (db_key, q, json.dumps(queries), now, now))
+            self._evict(conn, now)
+
+    def _evict(self, conn, now):
+        conn.execute("DELETE FROM plans WHERE created < ?", (now - self.ttl,))
+        # LRU beyond the size cap
+        conn.execute("""
+            DELETE FROM plans WHERE rowid IN (
+                SELECT rowid FROM plans ORDER BY last_used DESC LIMIT -1 OFFSET ?
+            )
+        """, (self.max_entries,))
+
+    def clear(self):
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM plans")
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": (self.hits / total * 100) if total else 0}
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_plan_cache(path):
+    with _caches_lock:
+        if path not in _caches:
+            _caches[path] = PlanCache(path)
+        return _caches[path]
+
+
+def render_results(results):
+    # Templated answer for plan hits when we skip the LLM completely
+    parts = []
+    for res in results:
+        if not res.get("success"):
+            parts.append(f"Query failed: {res.get('error')}")
+            continue
+        cols = res["columns"]
+        lines = ["| " + " | ".join(cols) + " |", "|" + "---|" * len(cols)]
+        for row in res["data"]:
+            cells = [f"{v:,.2f}" if isinstance(v, float) else str(v) for v in row]
+            lines.append("| " + " | ".join(cells) + " |")
+        if res.get("truncated"):
+            lines.append(f"\n_(first {res['count']} rows)_")
+        parts.append("\n".join(lines))
+    return "Here's what the data says:\n\n" + "\n\n".join(parts)
@@ -0,0 +1,260 @@
+import os
+import queue
+import sqlite3
+import threading
+import time
+import logging
+from collections import OrderedDict
+from contextlib import contextmanager
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(message)s')
+log = logging.getLogger("Pool")
+
+# Defaults tuned for a read-heavy analytics db
+POOL_SIZE = 8
+MAX_AGE_SEC = 600      # recycle connections after this long
+MAX_USES = 5000        # ...or after this many checkouts
+IDLE_PING_SEC = 30     # ping idle connections before handing them out
+MMAP_MB = 256
+# Small on purpose: sqlite sorts up to a cache's worth of rows in one step that
+# can't be interrupted, so a big cache lets GROUP BYs run past the governor's
+# timeout. Reads go through mmap anyway.
+CACHE_MB = 8
+BROKEN_CODES = {11, 26}  # SQLITE_CORRUPT, SQLITE_NOTADB: drop the connection
+
+# One process can serve many tenant dbs (one per print farm). Past this many
+# pools, or after this long without a checkout, a tenant's pool gets closed.
+MAX_POOLS = int(os.environ.get("MAX_TENANT_POOLS", 64))
+POOL_IDLE_SEC = 300
+
+
+class _Slot:
+    # Wraps a raw connection with the bookkeeping needed for recycling
+    def __init__(self, conn, inode):
+        self.conn = conn
+        self.inode = inode
+        self.opened = time.monotonic()
+        self.last_used = self.opened
+        self.uses = 0
+        self.data_version = None
+
+
+class ConnectionPool:
+    def __init__(self, db_path, size=POOL_SIZE, max_age=MAX_AGE_SEC, max_uses=MAX_USES,
+                 mmap_mb=MMAP_MB, cache_mb=CACHE_MB):
+        # Read-only: the pool never writes to the file, not even journal_mode.
+        # create_db and migrate put dbs in WAL mode so readers never block writers.
+        self.db_path = os.path.abspath(db_path)
+        self.size = size
+        self.max_age = max_age
+        self.max_uses = max_uses
+        self.mmap_bytes = mmap_mb * 1024 * 1024
+        self.cache_kb = cache_mb * 1024
+
+        # LIFO so the warmest connection (hot page cache) goes out first
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._local = threading.local()
+        self._closed = False
+        self._generation = 0
+        self._gen_lock = threading.Lock()
+        self.active = 0     # checkouts in progress, a busy pool is never evicted
+        self.touched = time.monotonic()
+
+        # contention counters, see stats()
+        self.checkouts = 0
+        self.waited = 0
+        self.wait_seconds = 0.0
+        self.max_wait = 0.0
+        self.exhausted = 0
+
+    def _inode(self):
+        try:
+            return os.stat(self.db_path).st_ino
+        except OSError:
+            return None
+
+    def _open(self):
+        if not os.path.exists(self.db_path):
+            raise sqlite3.OperationalError(f"Database not found: {self.db_path}")
+
+        uri = f"file:{self.db_path}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, timeout=5, check_same_thread=False)
+        conn.execute(f"PRAGMA mmap_size={self.mmap_bytes}")
+        conn.execute(f"PRAGMA cache_size=-{self.cache_kb}")
+        conn.execute("PRAGMA query_only=1")
+        # Connect full-text tables up front: the first use of one runs internal
+        # statements (a sqlite_master update) that check_query's authorizer blocks
+        for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE sql LIKE 'CREATE VIRTUAL TABLE%'").fetchall():
+            conn.execute(f'SELECT 1 FROM "{name}" LIMIT 0').fetchall()
+        return _Slot(conn, self._inode())
+
+    def _healthy(self, slot):
+        now = time.monotonic()
+        if now - slot.opened > self.max_age or slot.uses >= self.max_uses:
+            return False
+        # db file got replaced (e.g. database_setup.py re-ran) -> stale handle
+        if slot.inode != self._inode():
+            return False
+        if now - slot.last_used > IDLE_PING_SEC:
+            try:
+                slot.conn.execute("SELECT 1").fetchone()
+            except sqlite3.Error:
+                return False
+        return True
+
+    def _discard(self, slot):
+        try:
+            slot.conn.close()
+        except sqlite3.Error:
+            pass
+
+    def _checkout(self):
+        while True:
+            try:
+                slot = self._idle.get_nowait()
+            except queue.Empty:
+                return self._open()
+            if self._healthy(slot):
+                return slot
+            self._discard(slot)
+
+    def _checkin(self, slot, broken=False):
+        slot.uses += 1
+        slot.last_used = time.monotonic()
+        if self._closed or broken:
+            self._discard(slot)
+        else:
+            self._idle.put(slot)
+
+    @contextmanager
+    def connection(self, timeout=10):
+        # Re-entrant per thread: nested calls share the thread's checkout
+        held = getattr(self._local, "slot", None)
+        if held is not None:
+            yield held.conn
+            return
+
+        if not self._slots.acquire(blocking=False):
+            # all connections busy, this is where contention shows up
+            start = time.monotonic()
+            got = self._slots.acquire(timeout=timeout)
+            waited = time.monotonic() - start
+            with self._gen_lock:
+                self.waited += 1
+                self.wait_seconds += waited
+                self.max_wait = max(self.max_wait, waited)
+                self.exhausted += not got
+            if not got:
+                raise sqlite3.OperationalError("Connection pool exhausted")
+        with self._gen_lock:
+            self.checkouts += 1
+            self.active += 1
+
+        slot = None
+        broken = False
+        try:
+            slot = self._checkout()
+            self._local.slot = slot
+            yield slot.conn
+        except sqlite3.DatabaseError as e:
+            # Only a corrupt or replaced file makes the handle suspect. Rejected
+            # statements ("not authorized", several statements at once) leave it fine.
+            broken = (getattr(e, "sqlite_errorcode", 0) & 0xFF) in BROKEN_CODES
+            raise
+        finally:
+            self._local.slot = None
+            if slot is not None:
+                if slot.conn.in_transaction:
+                    slot.conn.rollback()
+                self._checkin(slot, broken)
+            with self._gen_lock:
+                self.active -= 1
+            self._slots.release()
+
+    def version(self):
+        # Change token for cache invalidation, call inside connection().
+        # data_version only moves for commits by *other* connections and is per
+        # handle, so compare against what this handle saw last time. WAL commits
+        # don't touch the main file, so the -wal stats go in too.
+        slot = getattr(self._local, "slot", None)
+        if slot is None:
+            raise RuntimeError("version() needs a checked-out connection")
+
+        dv = slot.conn.execute("PRAGMA data_version").fetchone()[0]
+        if slot.data_version is not None and dv != slot.data_version:
+            with self._gen_lock:
+                self._generation += 1
+        slot.data_version = dv
+        return (self._generation,) + self.stamp()
+
+    def stamp(self):
+        # File-level change token, costs two stat() calls and no query at all.
+        # Coarser than version() (checkpoints bump it too) but fine for dashboards.
+        return (_file_stamp(self.db_path), _file_stamp(self.db_path + "-wal"))
+
+    def stats(self):
+        return {
+            "size": self.size,
+            "checkouts": self.checkouts,
+            "waited": self.waited,
+            "wait_ms_total": self.wait_seconds * 1000,
+            "wait_ms_max": self.max_wait * 1000,
+            "exhausted": self.exhausted,
+            "idle": self._idle.qsize(),
+        }
+
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                self._discard(self._idle.get_nowait())
+            except queue.Empty:
+                break
+
+
+def _file_stamp(path):
+    try:
+        st = os.stat(path)
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+    except OSError:
+        return None
+
+
+_pools = OrderedDict()  # least recently used first
+_pools_lock = threading.Lock()
+
+
+def _evict_pools(keep, now):
+    # Oldest first, stops at the first pool that is recent enough while we're
+    # under MAX_POOLS. Busy pools are skipped, the limit can be exceeded briefly.
+    evicted = []
+    for key, pool in list(_pools.items()):
+        if len(_pools) <= MAX_POOLS and now - pool.touched < POOL_IDLE_SEC:
+            break
+        if key == keep or pool.active:
+            continue
+        del _pools[key]
+        evicted.append(pool)
+    return evicted
+
+
+def get_pool(db_path):
+    # One pool per db file, shared by every session in the process. Look it up
+    # per use rather than holding on to it, an evicted pool still works but
+    # opens a fresh connection every time.
+    key = os.path.abspath(db_path)
+    now = time.monotonic()
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = ConnectionPool(key)
+            _pools[key] = pool
+            log.info(f"Pool created for {key}")
+        _pools.move_to_end(key)
+        pool.touched = now
+        evicted = _evict_pools(key, now)
+    for old in evicted:
+        old.close()
+        log.info(f"Pool closed for {old.db_path} (idle)")
+    return pool
@@ -1,100 +1,905 @@
 import sqlite3
 import re
+import csv
+import json
 import logging
+import math
+import time
+import threading
 import requests
+import numpy as np
+import pandas as pd
+from collections import OrderedDict
+from itertools import combinations
+from contextlib import contextmanager
 from typing import Optional
 import os
 
+from src.pool import get_pool, MAX_POOLS
+from src.database_setup import DIMENSIONS, FAILURE_BINS, NOZZLE_BIN, BED_BIN
+from src.governor import DEFAULT_GOVERNOR, QueryBudgetError
+from src.tracing import span, annotate, traced
+
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(message)s')
 log = logging.getLogger("Tools")
 
-# Block dangerous stuff
-BAD_WORDS = [
-    "DROP", "DELETE", "TRUNCATE", "ALTER", "CREATE", "INSERT", "UPDATE",
-    "REPLACE", "RENAME", "GRANT", "REVOKE", "COMMIT", "ROLLBACK", "PRAGMA"
-]
+# Dev mode: EXPLAIN every agent query and log full table scans
+DEV_MODE = os.environ.get("PRINT_ANALYTICS_DEV", "").lower() in ("1", "true", "yes")
 
-def check_query(query):
-    q = query.upper().strip()
-    
-    # Basic check
-    if not q.startswith("SELECT"):
-        return False, "Query must start with SELECT"
-        
-    for w in BAD_WORDS:
-        # crude but works
-        if f" {w} " in f" {q} " or f"{w} " in f"{q} " or f" {w}" in f" {q}":
-            return False, f"Dangerous keyword found: {w}"
-            
-    if ";" in query.strip() and len(query.split(";")) > 2:
-        return False, "One query at a time please"
-        
-    return True, "OK"
+# Only these authorizer actions are allowed, everything else (writes, DDL,
+# PRAGMA, ATTACH, transactions...) gets the statement rejected
+READ_ACTIONS = {sqlite3.SQLITE_SELECT, sqlite3.SQLITE_READ, sqlite3.SQLITE_FUNCTION, sqlite3.SQLITE_RECURSIVE}
+
+# Friendlier names for the usual suspects in rejection messages
+ACTION_NAMES = {
+    sqlite3.SQLITE_INSERT: "INSERT", sqlite3.SQLITE_UPDATE: "UPDATE", sqlite3.SQLITE_DELETE: "DELETE",
+    sqlite3.SQLITE_CREATE_TABLE: "CREATE TABLE", sqlite3.SQLITE_DROP_TABLE: "DROP TABLE",
+    sqlite3.SQLITE_CREATE_INDEX: "CREATE INDEX", sqlite3.SQLITE_DROP_INDEX: "DROP INDEX",
+    sqlite3.SQLITE_ALTER_TABLE: "ALTER TABLE", sqlite3.SQLITE_PRAGMA: "PRAGMA",
+    sqlite3.SQLITE_ATTACH: "ATTACH", sqlite3.SQLITE_DETACH: "DETACH",
+    sqlite3.SQLITE_TRANSACTION: "transaction control", sqlite3.SQLITE_SAVEPOINT: "SAVEPOINT",
+}
+
+# Verdicts for statements we've already compiled. Compile errors (typos, missing
+# tables) aren't cached since the schema can change under them.
+_verdicts = OrderedDict()
+_verdicts_lock = threading.Lock()
+VERDICT_CACHE_SIZE = 2048
+
+def check_query(query, db_path="data/print_analytics.db"):
+    if not query or not query.strip():
+        return False, "Empty query"
+
+    key = (os.path.abspath(db_path), query)
+    with _verdicts_lock:
+        if key in _verdicts:
+            _verdicts.move_to_end(key)
+            return _verdicts[key]
+
+    denied = []
+
+    def authorizer(action, arg1, arg2, db_name, trigger):
+        if action in READ_ACTIONS:
+            return sqlite3.SQLITE_OK
+        denied.append((action, arg1))
+        return sqlite3.SQLITE_DENY
+
+    # EXPLAIN compiles the statement (which is when the authorizer runs)
+    # without actually executing it. sqlite also refuses multiple statements here.
+    try:
+        with get_pool(db_path).connection() as conn:
+            conn.set_authorizer(authorizer)
+            try:
+                conn.execute(f"EXPLAIN {query}")
+            finally:
+                conn.set_authorizer(None)
+        verdict = (True, "OK")
+    except (sqlite3.DatabaseError, sqlite3.ProgrammingError, sqlite3.Warning) as e:
+        if not denied:
+            return False, str(e)
+        action, target = denied[0]
+        what = ACTION_NAMES.get(action, f"action {action}") + (f" on {target}" if target else "")
+        verdict = (False, f"Only read queries are allowed (blocked: {what})")
+
+    with _verdicts_lock:
+        _verdicts[key] = verdict
+        while len(_verdicts) > VERDICT_CACHE_SIZE:
+            _verdicts.popitem(last=False)
+    return verdict
+
+def find_full_scans(conn, query):
+    # Returns the tables the planner would scan without an index
+    scans = []
+    for row in conn.execute(f"EXPLAIN QUERY PLAN {query}"):
+        detail = row[-1]
+        m = re.match(r"SCAN (\w+)", detail)
+        if m and "INDEX" not in detail and "CONSTANT ROW" not in detail:
+            scans.append(m.group(1))
+    return scans
+
+def check_plan(conn, query):
+    try:
+        scans = find_full_scans(conn, query)
+    except sqlite3.Error as e:
+        log.warning(f"Plan check failed: {e}")
+        return []
+    if scans:
+        log.warning(f"Full scan on {', '.join(scans)} for: {' '.join(query.split())}")
+    return scans
+
+# Splits out anything whose case (or spacing) can matter: '...' literals,
+# "..." (a string literal in SQLite when no column has that name), `...`
+# identifiers and comments
+_LITERAL_RE = re.compile(r"""('(?:[^']|'')*'|"(?:[^"]|"")*"|`(?:[^`]|``)*`|--[^\n]*\n?|/\*.*?(?:\*/|$))""", re.S)
+
+def normalize_sql(query):
+    parts = _LITERAL_RE.split(query.strip().rstrip(";").strip())
+    out = []
+    for i, p in enumerate(parts):
+        if i % 2:
+            out.append(p)  # literal, keep as-is ('PLA' != 'pla', "PLA" != "pla")
+        else:
+            out.append(re.sub(r"\s+", " ", p).upper())
+    return "".join(out)
+
+class ResultCache:
+    # LRU keyed on (db, normalized sql, ...), bounded by approx bytes rather than entries.
+    # Each entry remembers the db version it was computed against, and when.
+    # get(max_age=) still serves an entry from an older version while it is
+    # younger than that, for results where a few minutes' lag is fine. Entries put
+    # with a tenant (the db path) count against that tenant's share too, so one
+    # busy print farm can't push every other tenant out of the cache.
+    def __init__(self, max_bytes=32 * 1024 * 1024, tenant_bytes=None):
+        self.max_bytes = max_bytes
+        self.tenant_bytes = tenant_bytes or max_bytes // 4
+        self.size = 0
+        self._tenants = {}  # tenant -> bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, version, max_age=None):
+        with self._lock:
+            entry = self._data.get(key)
+            fresh = entry is not None and (entry[0] == version or (max_age and time.monotonic() - entry[4] < max_age))
+            if not fresh:
+                if entry is not None:
+                    self._drop(key)  # stale, db changed since
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, version, value, tenant=None):
+        nbytes = len(json.dumps(value, default=str))
+        if nbytes > (self.tenant_bytes if tenant is not None else self.max_bytes):
+            return
+        with self._lock:
+            if key in self._data:
+                self._drop(key)
+            self._data[key] = (version, value, nbytes, tenant, time.monotonic())
+            self.size += nbytes
+            if tenant is not None:
+                self._tenants[tenant] = self._tenants.get(tenant, 0) + nbytes
+                if self._tenants[tenant] > self.tenant_bytes:
+                    for old_key in [k for k, e in self._data.items() if e[3] == tenant]:
+                        if self._tenants[tenant] <= self.tenant_bytes:
+                            break
+                        self._drop(old_key)
+                        self.evictions += 1
+            while self.size > self.max_bytes:
+                old_key = next(iter(self._data))
+                self._drop(old_key)
+                self.evictions += 1
+
+    def _drop(self, key):
+        _, _, nbytes, tenant, _ = self._data.pop(key)
+        self.size -= nbytes
+        if tenant is not None:
+            left = self._tenants[tenant] - nbytes
+            if left:
+                self._tenants[tenant] = left
+            else:
+                del self._tenants[tenant]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._tenants.clear()
+            self.size = 0
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": (self.hits / total * 100) if total else 0,
+            "entries": len(self._data),
+            "bytes": self.size,
+            "tenants": len(self._tenants)
+        }
+
+RESULT_CACHE = ResultCache()
+
+def get_cache_stats():
+    return RESULT_CACHE.stats()
+
+class SQLiteBackend:
+    # Default backend: pooled read-only SQLite, limits enforced by the governor
+    name = "sqlite"
+
+    def __init__(self, db_path):
+        self.db_path = os.path.abspath(db_path)
+
+    @contextmanager
+    def session(self):
+        # yields (version for the result cache, fetch(query, n, governor) -> (cols, rows))
+        pool = get_pool(self.db_path)
+        with pool.connection() as conn:
+            def fetch(query, n, governor):
+                if DEV_MODE:
+                    check_plan(conn, query)
+                with governor.guard(conn):
+                    c = conn.cursor()
+                    c.execute(query)
+                    return [d[0] for d in c.description], c.fetchmany(n)
+
+            yield pool.version(), fetch
+
+
+class UnsupportedQuery(Exception):
+    # The backend can't run this SQL (dialect difference etc), use SQLite instead
+    pass
+
+
+# SQLite's LIKE ignores case (for ASCII), DuckDB's doesn't. GLOB and the
+# like()/glob() functions differ in the details, those stay on SQLite.
+_SQLITE_ONLY_RE = re.compile(r"\bGLOB\b|\bLIKE\s*\(", re.I)
+_LIKE_RE = re.compile(r"\bLIKE\b", re.I)
+
+def to_duckdb_sql(query):
+    parts = _LITERAL_RE.split(query)
+    for i in range(0, len(parts), 2):  # odd parts are literals and comments, left alone
+        if _SQLITE_ONLY_RE.search(parts[i]):
+            raise UnsupportedQuery("GLOB / like() run on SQLite")
+        parts[i] = _LIKE_RE.sub("ILIKE", parts[i])
+    return "".join(parts)
 
-def query_db(query, db_path="data/print_analytics.db"):
+
+class ColumnarBackend:
+    # DuckDB over a Parquet snapshot of print_jobs (see src/columnar.py). Pays
+    # off for big scans and aggregations over print_jobs. Other tables (the
+    # rollup is already small in SQLite) and SQLite-only SQL fall back to SQLiteBackend,
+    # so does everything while the snapshot is being built in the background.
+    name = "columnar"
+
+    def __init__(self, db_path):
+        from src.columnar import get_snapshot  # needs duckdb
+        import duckdb
+        self._duckdb = duckdb
+        self._get_snapshot = get_snapshot
+        self.db_path = os.path.abspath(db_path)
+
+    @property
+    def snapshot(self):
+        # looked up per use, like pools, so an evicted tenant's snapshot can go
+        return self._get_snapshot(self.db_path)
+
+    @contextmanager
+    def session(self):
+        snapshot = self.snapshot
+        snapshot.maybe_refresh(wait=False)
+        if not snapshot.ready:
+            raise UnsupportedQuery("Parquet snapshot is still being built")
+        cur = snapshot.cursor()
+        try:
+            def fetch(query, n, governor):
+                try:
+                    # same wall clock, session budget and cancel() as SQLite, through cur.interrupt()
+                    with governor.guard(cur, errors=(self._duckdb.InterruptException,)):
+                        cur.execute(to_duckdb_sql(query))
+                        return [d[0] for d in cur.description], cur.fetchmany(n)
+                except self._duckdb.Error as e:
+                    raise UnsupportedQuery(str(e)) from e
+
+            yield snapshot.version, fetch
+        finally:
+            cur.close()
+
+
+BACKENDS = {"sqlite": SQLiteBackend, "columnar": ColumnarBackend}
+DEFAULT_BACKEND = os.environ.get("QUERY_BACKEND", "sqlite")
+_backends = OrderedDict()
+_backends_lock = threading.Lock()
+
+def get_backend(db_path="data/print_analytics.db", kind=None):
+    kind = kind or DEFAULT_BACKEND
+    key = (kind, os.path.abspath(db_path))
+    with _backends_lock:
+        if key not in _backends:
+            try:
+                _backends[key] = BACKENDS[kind](db_path)
+            except ImportError as e:
+                log.warning(f"{kind} backend unavailable ({e}), using sqlite")
+                _backends[key] = SQLiteBackend(db_path)
+        _backends.move_to_end(key)
+        while len(_backends) > MAX_POOLS * len(BACKENDS):
+            _backends.popitem(last=False)
+        return _backends[key]
+
+def _run_query(backend, query, limit, governor):
+    key = (backend.name, backend.db_path, normalize_sql(query), limit)
+    with backend.session() as (version, fetch):
+        cached = RESULT_CACHE.get(key, version)
+        if cached is not None:
+            log.info("Cache hit")
+            annotate(cached=True, rows=cached["count"])
+            return dict(cached)
+
+        with span("sql.execute", backend=backend.name):
+            # Only pull what the chat can show, +1 to know if there's more
+            cols, rows = fetch(query, limit + 1, governor)
+
+    governor.check_result(rows)
+    truncated = len(rows) > limit
+    rows = rows[:limit]
+    annotate(cached=False, rows=len(rows), truncated=truncated)
+
+    result = {
+        "success": True,
+        "data": rows,
+        "columns": cols,
+        "count": len(rows),
+        "truncated": truncated
+    }
+    RESULT_CACHE.put(key, version, result, tenant=backend.db_path)
+    return dict(result)
+
+@traced("sql.query")
+def query_db(query, db_path="data/print_analytics.db", limit=50, governor=None, backend=None):
     log.info(f"Running SQL: {query}")
+    governor = governor or DEFAULT_GOVERNOR
+    annotate(sql=(query or "")[:500])
     
-    ok, msg = check_query(query)
+    # always validated against SQLite, whatever runs it afterwards
+    ok, msg = check_query(query, db_path)
     if not ok:
         log.warning(f"Query blocked: {msg}")
+        annotate(error=msg)
         return {"success": False, "error": msg}
 
     try:
-        conn = sqlite3.connect(db_path)
-        c = conn.cursor()
-        c.execute(query)
-        cols = [d[0] for d in c.description]
-        rows = c.fetchall()
-        conn.close()
-        
-        # Limit results for chat
-        limit = 50
-        truncated = False
-        if len(rows) > limit:
-            rows = rows[:limit]
-            truncated = True
-            
-        return {
-            "success": True, 
-            "data": rows, 
-            "columns": cols,
-            "count": len(rows),
-            "truncated": truncated
-        }
+        be = get_backend(db_path, backend)
+        annotate(backend=be.name)
+        try:
+            return _run_query(be, query, limit, governor)
+        except UnsupportedQuery as e:
+            log.info(f"{be.name} can't run this, falling back to sqlite: {e}")
+            annotate(backend="sqlite", fallback=str(e)[:200])
+            return _run_query(get_backend(db_path, "sqlite"), query, limit, governor)
+    except QueryBudgetError as e:
+        # structured so the agent can rewrite the query instead of just failing
+        annotate(error=str(e), error_type=e.kind)
+        return e.to_result(query)
     except Exception as e:
         log.error(f"SQL Error: {e}")
+        annotate(error=str(e))
+        return {"success": False, "error": str(e)}
+
+# Full-text search over model_name / failure_reason (print_search, see
+# database_setup.create_search_index), for the agent's fuzzy lookups
+SEARCH_FIELDS = {"any": None, "model": "model_name", "failure": "failure_reason"}
+_WORD_RE = re.compile(r"\w+")
+
+def _search_words(text):
+    words = list(dict.fromkeys(_WORD_RE.findall((text or "").lower())))
+    # single letters ("D&D" -> d, d) match half the index, only keep them if that's all there is
+    return [w for w in words if len(w) > 1] or words
+
+def build_match(text, field="any", any_word=False):
+    # Words -> FTS5 query. Each word is a quoted prefix term ("warp" finds
+    # "Model warping"), so nothing the user typed is read as FTS syntax.
+    words = _search_words(text)
+    if not words:
+        return None
+    expr = (" OR " if any_word else " AND ").join(f'"{w}"*' for w in words)
+    col = SEARCH_FIELDS[field]
+    return f"{col} : ({expr})" if col else expr
+
+def build_like(text, field="any", any_word=False):
+    # The same search as a LIKE filter on print_jobs, for dbs without the
+    # print_search index. A full scan, but governed like any other query.
+    words = _search_words(text)
+    if not words:
+        return None
+    cols = [SEARCH_FIELDS[field]] if SEARCH_FIELDS[field] else [c for c in SEARCH_FIELDS.values() if c]
+    # \w+ words carry no quotes or %, only _ needs escaping
+    terms = ["(" + " OR ".join(f"{c} LIKE '%{w}%' ESCAPE '\\'" for c in cols) + ")"
+             for w in (w.replace("_", "\\_") for w in words)]
+    return (" OR " if any_word else " AND ").join(terms)
+
+def _summarize(rows):
+    # (model, reason, jobs, ok, failed, cost, first, last) groups -> totals, per model, per reason
+    total = {"jobs": 0, "successes": 0, "cost_usd": 0.0, "first": None, "last": None}
+    models, reasons = {}, {}
+    for model, reason, jobs, ok, failed, cost, first, last in rows:
+        total["jobs"] += jobs
+        total["successes"] += ok or 0
+        total["cost_usd"] += cost or 0
+        total["first"] = min(filter(None, (total["first"], first)), default=None)
+        total["last"] = max(filter(None, (total["last"], last)), default=None)
+        m = models.setdefault(model, {"model_name": model, "jobs": 0, "successes": 0, "last": None})
+        m["jobs"] += jobs
+        m["successes"] += ok or 0
+        m["last"] = max(filter(None, (m["last"], last)), default=None)
+        if reason is not None and failed:
+            reasons[reason] = reasons.get(reason, 0) + failed
+
+    def rate(d):
+        return round(d["successes"] * 100 / d["jobs"], 1) if d["jobs"] else None
+
+    total["success_rate"] = rate(total)
+    total["cost_usd"] = round(total["cost_usd"], 2)
+    by_model = sorted(models.values(), key=lambda m: -m["jobs"])[:10]
+    for m in by_model:
+        m["success_rate"] = rate(m)
+    failures = [{"failure_reason": r, "n": n} for r, n in sorted(reasons.items(), key=lambda x: -x[1])[:10]]
+    return total, by_model, failures
+
+def _search(match, limit, db_path, governor, fulltext=True):
+    # match is an FTS query from build_match, or a build_like filter when fulltext is off
+    if fulltext:
+        literal = "'" + match.replace("'", "''") + "'"
+        source = f"print_search s JOIN print_jobs j ON j.id = s.rowid WHERE print_search MATCH {literal}"
+        ids = f"SELECT rowid FROM print_search WHERE print_search MATCH {literal} ORDER BY rowid DESC LIMIT {int(limit)}"
+    else:
+        source = f"print_jobs j WHERE {match}"
+        ids = f"SELECT id FROM print_jobs WHERE {match} ORDER BY id DESC LIMIT {int(limit)}"
+    # The index lookup is milliseconds, reading the matched rows is what costs:
+    # one pass groups them by model x reason, the latest jobs only touch `limit` rows
+    grouped = (f"SELECT j.model_name, j.failure_reason, COUNT(*), SUM(j.success_status), SUM(j.success_status = 0), "
+               f"SUM(j.cost_usd), MIN(j.date), MAX(j.date) FROM {source} GROUP BY 1, 2")
+    latest = (f"SELECT id, date, model_name, printer_name, material_type, success_status, failure_reason, cost_usd FROM print_jobs "
+              f"WHERE id IN ({ids}) ORDER BY id DESC")
+    # through query_db for the governor, result cache and tracing
+    groups = query_db(grouped, db_path=db_path, limit=10_000, governor=governor, backend="sqlite")
+    if not groups.get("success"):
+        return groups
+    jobs = query_db(latest, db_path=db_path, limit=limit, governor=governor, backend="sqlite")
+    if not jobs.get("success"):
+        return jobs
+
+    total, by_model, failures = _summarize(groups["data"])
+    return {
+        "success": True,
+        "match": match,
+        "matches": total,
+        "by_model": by_model,
+        "failures": failures,
+        "latest": [dict(zip(jobs["columns"], r)) for r in jobs["data"]],
+    }
+
+@traced("tool.search")
+def search_prints(text, field="any", limit=10, db_path="data/print_analytics.db", governor=None):
+    annotate(text=(text or "")[:200], field=field)
+    if field not in SEARCH_FIELDS:
+        return {"success": False, "error": f"field must be one of {', '.join(SEARCH_FIELDS)}"}
+    # dbs from before the search index get the (slower) LIKE scan
+    fulltext = "print_search" in _tables(db_path)
+    build = build_match if fulltext else build_like
+    annotate(fulltext=fulltext)
+    match = build(text, field)
+    if not match:
+        return {"success": False, "error": "Nothing to search for, pass a word like 'dragon' or 'warping'"}
+    limit = max(1, min(int(limit or 10), 50))
+    result = _search(match, limit, db_path, governor, fulltext)
+    if result.get("success") and not result["matches"]["jobs"] and " AND " in match:
+        # nothing has every word, settle for any of them
+        result = _search(build(text, field, any_word=True), limit, db_path, governor, fulltext)
+    if result.get("success"):
+        annotate(rows=result["matches"]["jobs"])
+    return result
+
+# Failure breakdown for "why is my PETG failing?" questions. One grouped scan
+# of print_jobs into a small cube, then every factor and pair of factors is
+# ranked in pandas, instead of the agent probing with a string of queries.
+# Failure reasons come from a second pass over just the failed jobs.
+FAILURE_FACTORS = ["printer_name", "material_type", "filament_brand", "nozzle_temp", "bed_temp", "layer_height"]
+FAILURE_FILTERS = {"material": "material_type", "printer": "printer_name", "brand": "filament_brand"}
+MIN_SEGMENT_JOBS = 30   # smaller groups are noise
+TOP_OUTLIERS = 10
+MAX_CUBE_ROWS = 2_000_000
+# A breakdown stays good for a while after new jobs land, ingest commits every
+# few seconds and would otherwise throw the cached one away each time
+FAILURE_CACHE_SEC = 300
+
+def _factor_key(col, facts):
+    # the GROUP BY term for a factor, exactly as idx_jobs_settings / idx_facts_settings have it
+    if col in FAILURE_BINS:
+        return FAILURE_BINS[col]
+    return DIMENSIONS[col][1] if facts else col
+
+def _where(filters, facts, *conds):
+    like = lambda v: f"LIKE '%{v.replace(chr(39), chr(39) * 2)}%'"
+    conds = list(conds) + [
+        f"{DIMENSIONS[col][1]} IN (SELECT id FROM {DIMENSIONS[col][0]} WHERE LOWER(name) {like(v)})" if facts
+        else f"LOWER({col}) {like(v)}"
+        for col, v in filters.items()
+    ]
+    return " WHERE " + " AND ".join(conds) if conds else ""
+
+def _with_names(sql, cols, facts):
+    # Schema v2: the query groups job_facts ids, names get looked up on its few result rows
+    if not facts:
+        return sql
+    names = ", ".join(f"(SELECT name FROM {DIMENSIONS[c][0]} WHERE id = g.{c}) AS {c}" if c in DIMENSIONS else f"g.{c}" for c in cols)
+    return f"SELECT {names} FROM ({sql}) g"
+
+def _failure_cube_sql(filters, facts=False):
+    # Plain SQL that SQLite and DuckDB read the same way, so it runs on either
+    # backend. Bins come back as bin numbers, _label_factors turns them into ranges.
+    keys = ", ".join(f"{_factor_key(f, facts)} AS {f}" for f in FAILURE_FACTORS)
+    sql = (f"SELECT {keys}, COUNT(*) AS jobs, SUM(CASE WHEN success_status = 0 THEN 1 ELSE 0 END) AS failures "
+           f"FROM {'job_facts' if facts else 'print_jobs'}{_where(filters, facts)} "
+           f"GROUP BY {', '.join(str(i + 1) for i in range(len(FAILURE_FACTORS)))}")
+    return _with_names(sql, FAILURE_FACTORS + ["jobs", "failures"], facts)
+
+def _segment_sql(segment, facts):
+    conds = []
+    for col, value in segment.items():
+        key = _factor_key(col, facts)
+        if value is None:
+            conds.append(f"{key} IS NULL")
+        elif isinstance(value, str):
+            literal = "'" + value.replace("'", "''") + "'"
+            conds.append(f"{key} = (SELECT id FROM {DIMENSIONS[col][0]} WHERE name = {literal})" if facts else f"{key} = {literal}")
+        else:
+            conds.append(f"{key} = {value!r}")
+    return " AND ".join(conds)
+
+def _failure_reasons_sql(filters, segments, facts=False):
+    # Failed jobs only (idx_jobs_failure hands them over in failure_reason order):
+    # how often each reason comes up overall and within each outlier segment
+    per_segment = "".join(f", SUM(CASE WHEN {_segment_sql(s, facts)} THEN 1 ELSE 0 END) AS s{i}" for i, s in enumerate(segments))
+    reason = DIMENSIONS["failure_reason"][1] if facts else "failure_reason"
+    sql = (f"SELECT {reason} AS failure_reason, COUNT(*) AS n{per_segment} "
+           f"FROM {'job_facts' if facts else 'print_jobs'}{_where(filters, facts, 'success_status = 0')} GROUP BY 1")
+    return _with_names(sql, ["failure_reason", "n"] + [f"s{i}" for i in range(len(segments))], facts)
+
+def _label_factors(cube):
+    # Every factor becomes a categorical of string labels ("unknown" for NULLs),
+    # labels are built per distinct value, the cube only gets codes. Also
+    # returns label -> value per factor, to turn segments back into SQL.
+    values = {}
+    for col, width in (("nozzle_temp", NOZZLE_BIN), ("bed_temp", BED_BIN)):
+        bins = pd.to_numeric(cube[col])
+        labels = {v: f"{int(v) * width}-{int(v) * width + width - 1}" for v in bins.dropna().unique()}
+        cube[col] = bins.map(labels)
+        values[col] = {label: int(v) for v, label in labels.items()}
+    height = pd.to_numeric(cube["layer_height"]).round(2)
+    labels = {v: f"{v:g}" for v in height.dropna().unique()}
+    cube["layer_height"] = height.map(labels)
+    values["layer_height"] = {label: float(v) for v, label in labels.items()}
+    for col in FAILURE_FACTORS:
+        values.setdefault(col, {v: v for v in cube[col].dropna().unique()})["unknown"] = None
+        cube[col] = cube[col].fillna("unknown").astype("category")
+    cube["jobs"] = cube["jobs"].astype("int64")
+    cube["failures"] = cube["failures"].fillna(0).astype("int64")
+    return cube, values
+
+def _z_scores(n, f, rest_n, rest_f):
+    # two-proportion z-test, group vs the jobs it's compared against
+    with np.errstate(divide="ignore", invalid="ignore"):
+        p = (f + rest_f) / (n + rest_n)
+        se = np.sqrt(p * (1 - p) * (1 / n + 1 / rest_n))
+        z = (f / n - rest_f / rest_n) / se
+    return np.where(se > 0, z, 0.0)
+
+def _pct(f, n):
+    return round(float(f) * 100 / float(n), 1) if n else None
+
+def _segments(cells, singles, total, factors):
+    # Single factors are compared against all other jobs. Pairs are compared
+    # against the rest of their worse parent, so "Ender 3 + PETG" only shows up
+    # when the combination is worse than the Ender 3 (or PETG) on its own.
+    frames = []
+    for f in factors:
+        g = singles[f].reset_index()
+        g["base_jobs"], g["base_failures"], g["compared_to"] = total[0], total[1], None
+        frames.append(g)
+    for a, b in combinations(factors, 2):
+        g = cells.groupby(level=[a, b], sort=False, observed=True).sum().reset_index()
+        pa = singles[a].reindex(g[a]).to_numpy()
+        pb = singles[b].reindex(g[b]).to_numpy()
+        use_a = pa[:, 1] / pa[:, 0] >= pb[:, 1] / pb[:, 0]
+        base = np.where(use_a[:, None], pa, pb)
+        g["base_jobs"], g["base_failures"] = base[:, 0], base[:, 1]
+        g["compared_to"] = np.where(use_a, a, b)
+        frames.append(g)
+    seg = pd.concat(frames, ignore_index=True)
+    seg["rest_jobs"] = seg["base_jobs"] - seg["jobs"]
+    seg["rest_failures"] = seg["base_failures"] - seg["failures"]
+    return seg
+
+def _factor_effects(singles, total, factors, min_jobs):
+    # How much failure rate moves with each factor: chi-square over its groups,
+    # reported as Cramer's V (0 = no effect) so factors compare with each other
+    n_all, f_all = total
+    p = f_all / n_all
+    out = []
+    for f in factors:
+        g = singles[f][singles[f]["jobs"] >= min_jobs]
+        if len(g) < 2 or p in (0, 1):
+            continue
+        expected = g["jobs"] * p
+        chi2 = (((g["failures"] - expected) ** 2) / expected + ((g["failures"] - expected) ** 2) / (g["jobs"] - expected)).sum()
+        rate = g["failures"] / g["jobs"]
+        worst, best = rate.idxmax(), rate.idxmin()
+        out.append({
+            "factor": f,
+            "effect": round(math.sqrt(chi2 / g["jobs"].sum()), 3),
+            "worst": {"value": worst, "failure_rate": _pct(g.at[worst, "failures"], g.at[worst, "jobs"]), "jobs": int(g.at[worst, "jobs"])},
+            "best": {"value": best, "failure_rate": _pct(g.at[best, "failures"], g.at[best, "jobs"]), "jobs": int(g.at[best, "jobs"])},
+        })
+    return sorted(out, key=lambda x: -x["effect"])
+
+def _failure_report(cube, filters, min_jobs):
+    # -> (result, outlier segments as column -> value, for _failure_reasons_sql)
+    scope = {"filters": filters}
+    if cube.empty:
+        return {"success": True, "scope": dict(scope, jobs=0, failures=0, failure_rate=None), "factors": [], "outliers": []}, []
+
+    cube, values = _label_factors(cube)
+    total = (int(cube["jobs"].sum()), int(cube["failures"].sum()))
+    scope.update(jobs=total[0], failures=total[1], failure_rate=_pct(total[1], total[0]))
+    for col in filters:
+        scope.setdefault("matched", {})[col] = sorted(cube[col].unique().tolist())[:10]
+
+    # a factor with one value in scope (the material filtered on, say) explains nothing
+    factors = [f for f in FAILURE_FACTORS if cube[f].nunique() > 1]
+    if not factors:
+        return {"success": True, "scope": scope, "factors": [], "outliers": []}, []
+    cells = cube.groupby(factors, sort=False, observed=True)[["jobs", "failures"]].sum()
+    singles = {f: cells.groupby(level=f, sort=False, observed=True).sum() for f in factors}
+    seg = _segments(cells, singles, total, factors)
+
+    seg = seg[(seg["jobs"] >= min_jobs) & (seg["rest_jobs"] >= min_jobs)].copy()
+    tests = len(seg)
+    seg["z"] = _z_scores(seg["jobs"], seg["failures"], seg["rest_jobs"], seg["rest_failures"])
+    worst = seg[seg["z"] > 0].nlargest(TOP_OUTLIERS, "z")
+
+    outliers, segments = [], []
+    for _, r in worst.iterrows():
+        segment = {f: r[f] for f in factors if isinstance(r[f], str)}
+        segments.append({f: values[f][label] for f, label in segment.items()})
+        p_value = 0.5 * math.erfc(r["z"] / math.sqrt(2))
+        outliers.append({
+            "segment": segment,
+            "jobs": int(r["jobs"]),
+            "failures": int(r["failures"]),
+            "failure_rate": _pct(r["failures"], r["jobs"]),
+            "compared_to": f"other {segment[r['compared_to']]} jobs" if r["compared_to"] else "all other jobs",
+            "baseline_rate": _pct(r["rest_failures"], r["rest_jobs"]),
+            "z": round(float(r["z"]), 2),
+            "p_value": float(f"{p_value:.2g}"),
+            # Bonferroni: we tested every segment, so a lone p < 0.05 means little
+            "significant": bool(p_value < 0.05 / max(tests, 1)),
+        })
+
+    return {
+        "success": True,
+        "scope": scope,
+        "factors": _factor_effects(singles, total, factors, min_jobs),
+        "outliers": outliers,
+        "segments_tested": tests,
+    }, segments
+
+def _add_reasons(result, reasons):
+    # reasons: failure_reason, n, s0, s1, ... (one count column per outlier)
+    reasons = reasons.dropna(subset=["failure_reason"]).set_index("failure_reason")
+    top = reasons["n"].nlargest(5)
+    result["failure_reasons"] = [{"failure_reason": k, "n": int(v)} for k, v in top.items()]
+    for i, outlier in enumerate(result["outliers"]):
+        counts = reasons[f"s{i}"]
+        outlier["top_failure_reason"] = counts.idxmax() if len(counts) and counts.max() > 0 else None
+
+def _analyze(backend, filters, min_jobs, governor):
+    # v2 only matters to sqlite, the columnar snapshot already has the names
+    facts = backend.name == "sqlite" and "job_facts" in get_schema(backend.db_path).get("schema", {})
+    sql = _failure_cube_sql(filters, facts)
+    key = (backend.name, backend.db_path, "analyze_failures", sql, min_jobs)
+    with backend.session() as (version, fetch):
+        cached = RESULT_CACHE.get(key, version, max_age=FAILURE_CACHE_SEC)
+        if cached is not None:
+            annotate(cached=True)
+            return dict(cached)
+        with span("sql.execute", backend=backend.name):
+            cols, rows = fetch(sql, MAX_CUBE_ROWS, governor)
+        cells = len(rows)
+
+        with span("failures.rank", cells=cells):
+            result, segments = _failure_report(pd.DataFrame.from_records(rows, columns=cols), filters, min_jobs)
+        result["failure_reasons"] = []
+        if result["scope"]["failures"]:
+            with span("sql.execute", backend=backend.name, query="failure_reasons"):
+                cols, rows = fetch(_failure_reasons_sql(filters, segments, facts), MAX_CUBE_ROWS, governor)
+            _add_reasons(result, pd.DataFrame.from_records(rows, columns=cols))
+    result["as_of"] = time.strftime("%Y-%m-%d %H:%M:%S")
+    annotate(cached=False, cells=cells)
+    RESULT_CACHE.put(key, version, result, tenant=backend.db_path)
+    return dict(result)
+
+@traced("tool.failures")
+def analyze_failures(material=None, printer=None, brand=None, min_jobs=MIN_SEGMENT_JOBS,
+                     db_path="data/print_analytics.db", governor=None, backend=None):
+    governor = governor or DEFAULT_GOVERNOR
+    args = {"material": material, "printer": printer, "brand": brand}
+    filters = {FAILURE_FILTERS[k]: v.strip().lower() for k, v in args.items() if v and v.strip()}
+    annotate(filters=filters)
+    min_jobs = max(1, int(min_jobs or MIN_SEGMENT_JOBS))
+    try:
+        be = get_backend(db_path, backend)
+        annotate(backend=be.name)
+        try:
+            return _analyze(be, filters, min_jobs, governor)
+        except UnsupportedQuery as e:
+            log.info(f"{be.name} can't run the failure cube, falling back to sqlite: {e}")
+            annotate(backend="sqlite", fallback=str(e)[:200])
+            return _analyze(get_backend(db_path, "sqlite"), filters, min_jobs, governor)
+    except QueryBudgetError as e:
+        annotate(error=str(e), error_type=e.kind)
+        result = e.to_result()
+        if e.kind in ("timeout", "too_many_steps"):
+            result["hint"] = "Too many jobs to break down at once. Narrow it with material, printer or brand."
+        return result
+    except Exception as e:
+        log.error(f"Failure analysis error: {e}")
+        annotate(error=str(e))
         return {"success": False, "error": str(e)}
 
+EXPORT_FORMATS = ["csv", "jsonl", "arrow"]
+
+def _write_csv(f, cols, chunks):
+    w = csv.writer(f)
+    w.writerow(cols)
+    for rows in chunks:
+        w.writerows(rows)
+
+def _write_jsonl(f, cols, chunks):
+    for rows in chunks:
+        f.writelines(json.dumps(dict(zip(cols, r)), default=str) + "\n" for r in rows)
+
+def _write_arrow(path, cols, chunks):
+    import pyarrow as pa  # optional, only needed for this format
+
+    writer = None
+    schema = None
+    for rows in chunks:
+        data = {col: [r[i] for r in rows] for i, col in enumerate(cols)}
+        if schema is None:
+            # all-NULL columns in the first chunk (e.g. failure_reason) default to text
+            inferred = pa.RecordBatch.from_pydict(data).schema
+            schema = pa.schema([
+                pa.field(f.name, pa.string()) if pa.types.is_null(f.type) else f
+                for f in inferred
+            ])
+            writer = pa.ipc.new_file(path, schema)
+        writer.write_batch(pa.RecordBatch.from_pydict(data, schema=schema))
+    if writer is None:
+        # empty result, still write a valid file
+        writer = pa.ipc.new_file(path, pa.schema([(col, pa.string()) for col in cols]))
+    writer.close()
+
+def export_query(query, out_path, fmt="csv", db_path="data/print_analytics.db", chunk_size=10000):
+    # Streams the full result set to disk chunk by chunk, never holding it all in memory
+    log.info(f"Exporting ({fmt}) SQL: {query}")
+
+    if fmt not in EXPORT_FORMATS:
+        return {"success": False, "error": f"Unknown format: {fmt}"}
+
+    ok, msg = check_query(query, db_path)
+    if not ok:
+        log.warning(f"Export blocked: {msg}")
+        return {"success": False, "error": msg}
+
+    total = 0
+    try:
+        with get_pool(db_path).connection() as conn:
+            c = conn.cursor()
+            c.execute(query)
+            cols = [d[0] for d in c.description]
+
+            def chunks():
+                nonlocal total
+                while True:
+                    rows = c.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    total += len(rows)
+                    yield rows
+
+            if fmt == "arrow":
+                _write_arrow(out_path, cols, chunks())
+            else:
+                with open(out_path, "w", newline="", encoding="utf-8") as f:
+                    if fmt == "csv":
+                        _write_csv(f, cols, chunks())
+                    else:
+                        _write_jsonl(f, cols, chunks())
+
+        log.info(f"Exported {total} rows to {out_path}")
+        return {"success": True, "path": out_path, "count": total, "columns": cols}
+    except ImportError:
+        return {"success": False, "error": "Arrow export needs pyarrow installed"}
+    except Exception as e:
+        log.error(f"Export Error: {e}")
+        return {"success": False, "error": str(e)}
+
+_schema_cache = OrderedDict()
+_schema_lock = threading.Lock()
+
+def _estimate_rows(conn, table):
+    # max(rowid) is a single b-tree seek, unlike count(*) which walks everything.
+    # Off when rows were deleted, but close enough for "how big is this table".
+    try:
+        return conn.execute(f"SELECT max(rowid) FROM {table}").fetchone()[0] or 0
+    except sqlite3.OperationalError:
+        pass
+    # WITHOUT ROWID tables: fall back to ANALYZE stats if we have them
+    try:
+        r = conn.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = ? LIMIT 1", (table,)).fetchone()
+        return int(r[0].split()[0]) if r else None
+    except sqlite3.OperationalError:
+        return None
+
 def get_schema(db_path="data/print_analytics.db"):
     try:
-        conn = sqlite3.connect(db_path)
-        c = conn.cursor()
-        
-        # Get tables
-        c.execute("SELECT name FROM sqlite_master WHERE type='table'")
-        tables = [r[0] for r in c.fetchall()]
-        
-        schema = {}
-        for t in tables:
-            c.execute(f"PRAGMA table_info({t})")
-            cols = [{
-                "name": r[1],
-                "type": r[2]
-            } for r in c.fetchall()]
+        pool = get_pool(db_path)
+        with pool.connection() as conn:
+            version = pool.version()
+            cached = _schema_cache.get(pool.db_path)
+            if cached and cached[0] == version:
+                return cached[1]
+
+            c = conn.cursor()
             
-            c.execute(f"SELECT count(*) FROM {t}")
-            row_count = c.fetchone()[0]
+            # Get tables (skip sqlite's and the ingest pipeline's bookkeeping tables)
+            # Views too: on schema v2 print_jobs is a view over job_facts
+            c.execute("SELECT name, type, sql FROM sqlite_master WHERE type IN ('table', 'view') AND name NOT LIKE 'sqlite_%' AND name NOT LIKE '\\_%' ESCAPE '\\'")
+            tables = c.fetchall()
+            # full-text indexes keep their data in <name>_data, <name>_idx, ... tables
+            virtual = {t for t, _, sql in tables if (sql or "").upper().startswith("CREATE VIRTUAL TABLE")}
             
-            schema[t] = {
-                "columns": cols,
-                "rows": row_count
-            }
-        conn.close()
-        return {"success": True, "schema": schema}
+            schema = {}
+            for t, kind, _ in tables:
+                if any(t.startswith(v + "_") for v in virtual):
+                    continue
+                c.execute(f"PRAGMA table_info({t})")
+                cols = [{
+                    "name": r[1],
+                    "type": r[2]
+                } for r in c.fetchall()]
+                
+                if kind == "view":
+                    schema[t] = {"columns": cols, "rows": None, "view": True}
+                    continue
+                if t in virtual:
+                    schema[t] = {"columns": cols, "rows": None, "fulltext": True}
+                    continue
+                schema[t] = {
+                    "columns": cols,
+                    "rows": _estimate_rows(conn, t)  # approximate
+                }
+        result = {"success": True, "schema": schema}
+        with _schema_lock:
+            _schema_cache[pool.db_path] = (version, result)
+            _schema_cache.move_to_end(pool.db_path)
+            while len(_schema_cache) > MAX_POOLS:
+                _schema_cache.popitem(last=False)
+        return result
     except Exception as e:
         return {"success": False, "error": str(e)}
 
+def _tables(db_path):
+    # table names from the (cached) schema, empty if the db can't be read
+    res = get_schema(db_path)
+    return res["schema"] if res["success"] else {}
+
+def format_schema(schema):
+    # Compact one-line-per-table form, cheap enough to live in the system prompt
+    lines = []
+    for t, info in schema.items():
+        cols = ", ".join(f"{c['name']} {c['type']}".strip() for c in info["columns"])
+        rows = f" ~{info['rows']} rows" if info.get("rows") is not None else ""
+        kind = " (view)" if info.get("view") else " (full-text index, use MATCH)" if info.get("fulltext") else ""
+        lines.append(f"- {t}{kind}{rows}: {cols}")
+    return "\n".join(lines)
+
 def create_issue(title, body, token=None):
     # If no token, just simulate it
     token = token or os.environ.get("GITHUB_TOKEN")
@@ -153,6 +958,38 @@ TOOL_DEFINITIONS = [
             }
         }
     },
+    {
+        "type": "function",
+        "function": {
+            "name": "search_prints",
+            "description": "Find prints by words in their model name or failure reason (e.g. 'dragon', 'warping', 'gear'). Uses a full-text index, far faster than LIKE '%...%' on print_jobs, and matches word prefixes and stems. Returns totals, success rate per matching model, failure reasons and the latest logged matching jobs. For other breakdowns of the same prints, query_database with: id IN (SELECT rowid FROM print_search WHERE print_search MATCH '<match from the result>').",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "text": {"type": "string", "description": "Words to look for, e.g. 'dragon' or 'layer shift'"},
+                    "field": {"type": "string", "enum": list(SEARCH_FIELDS), "description": "Search model names, failure reasons or both (default any)"},
+                    "limit": {"type": "integer", "description": "How many of the latest matching jobs to return (default 10, max 50)"}
+                },
+                "required": ["text"]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "analyze_failures",
+            "description": "Answer 'why are my prints failing?' in one call. Breaks failure rate down by printer, material, brand, nozzle/bed temperature bins (5/10 degrees) and layer height, plus every pair of those, and ranks the groups that fail significantly more than the rest (z-test, Bonferroni-corrected). Returns overall scope, how strongly each factor moves the failure rate, the top outlier groups with their main failure reason, and the top failure reasons. Prefer this over several exploratory query_database calls; use query_database afterwards for follow-up details.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "material": {"type": "string", "description": "Only jobs whose material contains this, e.g. 'PETG'"},
+                    "printer": {"type": "string", "description": "Only jobs whose printer name contains this, e.g. 'Ender'"},
+                    "brand": {"type": "string", "description": "Only jobs whose filament brand contains this"},
+                    "min_jobs": {"type": "integer", "description": f"Ignore groups with fewer jobs than this (default {MIN_SEGMENT_JOBS})"}
+                }
+            }
+        }
+    },
     {
         "type": "function",
         "function": {
@@ -178,11 +1015,89 @@ TOOL_DEFINITIONS = [
     }
 ]
 
-def execute_tool(name, args, config=None):
+# Added to query_database's description when the db has the daily rollup
+ROLLUP_HINT = (" For totals/spend/trends over time prefer the much faster daily rollup 'print_daily_rollup' "
+               "(day, printer_name, material_type, project_category, jobs, successes, grams, hours, cost).")
+
+def tool_definitions(db_path="data/print_analytics.db"):
+    # TOOL_DEFINITIONS trimmed to what this db can back, a db built by an
+    # older version has no rollup or search index until database_setup.py --migrate
+    tables = _tables(db_path)
+    tools = []
+    for tool in TOOL_DEFINITIONS:
+        fn = tool["function"]
+        if fn["name"] == "search_prints" and "print_search" not in tables:
+            continue
+        if fn["name"] == "query_database" and "print_daily_rollup" in tables:
+            tool = {**tool, "function": {**fn, "description": fn["description"] + ROLLUP_HINT}}
+        tools.append(tool)
+    return tools
+
+# How tool results are serialized for the model. "json" is the original
+# row-list dump, the others trade a bit of fidelity for far fewer tokens.
+RESULT_FORMATS = ["json", "columnar", "markdown"]
+
+def _round(v):
+    # cents for normal numbers, 3 significant digits for small ratios
+    if isinstance(v, float):
+        return round(v, 2) if abs(v) >= 1 else float(f"{v:.3g}")
+    return v
+
+def _encode_column(values):
+    values = [_round(v) for v in values] if any(isinstance(v, float) for v in values) else list(values)
+    strings = [v for v in values if isinstance(v, str)]
+    # dictionary-encode text columns full of repeats (printer, material, ...)
+    if len(strings) == len(values) and len(values) >= 4:
+        uniq = list(dict.fromkeys(values))
+        if len(uniq) <= len(values) // 2:
+            index = {v: i for i, v in enumerate(uniq)}
+            return {"dict": uniq, "codes": [index[v] for v in values]}
+    return values
+
+def _markdown_table(res):
+    cols = res["columns"]
+    lines = ["|" + "|".join(cols) + "|", "|" + "---|" * len(cols)]
+    for row in res["data"]:
+        lines.append("|" + "|".join("" if v is None else str(_round(v)) for v in row) + "|")
+    if res.get("truncated"):
+        lines.append(f"(first {res['count']} rows only)")
+    return "\n".join(lines)
+
+def encode_result(result, fmt="json"):
+    if fmt == "json" or not (result.get("success") and "columns" in result and "data" in result):
+        return json.dumps(result, default=str)
+
+    if fmt == "markdown":
+        return _markdown_table(result)
+
+    # columnar: one list per column, "codes" index into "dict" where present
+    cols = result["columns"]
+    values = list(zip(*result["data"])) or [()] * len(cols)
+    out = {
+        "success": True,
+        "count": result["count"],
+        "truncated": result["truncated"],
+        "data": {c: _encode_column(v) for c, v in zip(cols, values)}
+    }
+    return json.dumps(out, separators=(",", ":"), default=str)
+
+@traced("tool.execute")
+def execute_tool(name, args, config=None, governor=None):
+    annotate(tool=name)
+    db_path = (config or {}).get("db_path", "data/print_analytics.db")
     if name == "query_database":
-        return query_db(args.get("query"))
+        result = query_db(args.get("query"), db_path=db_path, governor=governor, backend=(config or {}).get("backend"))
+    elif name == "search_prints":
+        result = search_prints(args.get("text"), args.get("field") or "any", args.get("limit") or 10,
+                               db_path=db_path, governor=governor)
+    elif name == "analyze_failures":
+        result = analyze_failures(args.get("material"), args.get("printer"), args.get("brand"), args.get("min_jobs"),
+                                  db_path=db_path, governor=governor, backend=(config or {}).get("backend"))
     elif name == "get_database_schema":
-        return get_schema()
+        result = get_schema(db_path)
     elif name == "create_support_ticket":
-        return create_issue(args.get("title"), args.get("description"))
-    return {"success": False, "error": "Unknown tool"}
+        result = create_issue(args.get("title"), args.get("description"))
+    else:
+        result = {"success": False, "error": "Unknown tool"}
+    annotate(success=bool(result.get("success")))
+    return result
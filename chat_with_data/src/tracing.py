@@ -0,0 +1,200 @@
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+import contextvars
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(message)s')
+log = logging.getLogger("Tracing")
+
+# Set TRACE_FILE to also append spans there as JSON lines. Off by default,
+# spans carry the agent's raw SQL. Past TRACE_FILE_MAX_MB it moves to <file>.1
+# and a new one starts, so at most twice that is ever on disk.
+TRACE_FILE = os.environ.get("TRACE_FILE") or None
+TRACE_FILE_MAX_BYTES = int(float(os.environ.get("TRACE_FILE_MAX_MB", "50")) * 1024 * 1024)
+KEEP_TRACES = 200   # recent traces kept in memory for the UI
+
+# Histogram buckets (seconds) for the Prometheus export
+BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30]
+
+_current = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    def __init__(self, name, parent=None, attrs=None):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.span_id = uuid.uuid4().hex[:8]
+        self.attrs = dict(attrs or {})
+        self.start = time.time()
+        self._t0 = time.perf_counter()
+        self.duration_ms = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def elapsed_ms(self):
+        return (time.perf_counter() - self._t0) * 1000
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start,
+            "duration_ms": self.duration_ms,
+            "attrs": self.attrs,
+        }
+
+
+class Tracer:
+    def __init__(self, path=TRACE_FILE, max_bytes=TRACE_FILE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.traces = OrderedDict()
+        self._lock = threading.Lock()
+        self._file_lock = threading.Lock()  # file only, so a slow disk never holds up _lock
+        self._file = None
+        self._file_bytes = 0
+        # name -> [count, sum_seconds, per-bucket counts]
+        self._hist = defaultdict(lambda: [0, 0.0, [0] * len(BUCKETS)])
+        self._tokens = defaultdict(int)
+
+    def _write(self, line):
+        with self._file_lock:
+            if not self.path:
+                return
+            if self._file is None:
+                if os.path.dirname(self.path):
+                    os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                self._file = open(self.path, "a", buffering=1, encoding="utf-8")
+                self._file_bytes = self._file.tell()
+            if self.max_bytes and self._file_bytes and self._file_bytes + len(line) > self.max_bytes:
+                self._file.close()
+                os.replace(self.path, self.path + ".1")
+                self._file = open(self.path, "w", buffering=1, encoding="utf-8")
+                self._file_bytes = 0
+            self._file.write(line)
+            self._file_bytes += len(line)
+
+    def record(self, span):
+        secs = span.duration_ms / 1000
+        with self._lock:
+            spans = self.traces.setdefault(span.trace_id, [])
+            spans.append(span)
+            self.traces.move_to_end(span.trace_id)
+            while len(self.traces) > KEEP_TRACES:
+                self.traces.popitem(last=False)
+
+            h = self._hist[span.name]
+            h[0] += 1
+            h[1] += secs
+            for i, b in enumerate(BUCKETS):
+                if secs <= b:
+                    h[2][i] += 1
+            for kind in ("prompt_tokens", "completion_tokens"):
+                if span.attrs.get(kind):
+                    self._tokens[kind] += span.attrs[kind]
+
+        if self.path:
+            try:
+                self._write(json.dumps(span.to_dict(), default=str) + "\n")
+            except OSError as e:
+                log.warning(f"Trace file write failed: {e}")
+                self.path = None
+
+    def get_trace(self, trace_id):
+        with self._lock:
+            spans = list(self.traces.get(trace_id, []))
+        return sorted((s.to_dict() for s in spans), key=lambda d: d["start"])
+
+    def prometheus_text(self):
+        lines = [
+            "# HELP print_analytics_span_seconds Duration of traced operations",
+            "# TYPE print_analytics_span_seconds histogram",
+        ]
+        with self._lock:
+            for name, (count, total, buckets) in sorted(self._hist.items()):
+                for b, n in zip(BUCKETS, buckets):
+                    lines.append(f'print_analytics_span_seconds_bucket{{span="{name}",le="{b}"}} {n}')
+                lines.append(f'print_analytics_span_seconds_bucket{{span="{name}",le="+Inf"}} {count}')
+                lines.append(f'print_analytics_span_seconds_sum{{span="{name}"}} {total:.6f}')
+                lines.append(f'print_analytics_span_seconds_count{{span="{name}"}} {count}')
+            lines += [
+                "# HELP print_analytics_llm_tokens_total Tokens reported by the LLM API",
+                "# TYPE print_analytics_llm_tokens_total counter",
+            ]
+            for kind, n in sorted(self._tokens.items()):
+                lines.append(f'print_analytics_llm_tokens_total{{kind="{kind.replace("_tokens", "")}"}} {n}')
+        return "\n".join(lines) + "\n"
+
+
+TRACER = Tracer()
+
+
+@contextmanager
+def span(name, **attrs):
+    s = Span(name, _current.get(), attrs)
+    token = _current.set(s)
+    try:
+        yield s
+    except Exception as e:
+        s.set(error=str(e))
+        raise
+    finally:
+        s.duration_ms = s.elapsed_ms()
+        _current.reset(token)
+        TRACER.record(s)
+
+
+def annotate(**attrs):
+    # Adds attributes to whatever span is open right now (no-op outside one)
+    s = _current.get()
+    if s is not None:
+        s.set(**attrs)
+
+
+def current_trace_id():
+    s = _current.get()
+    return s.trace_id if s else None
+
+
+def traced(name):
+    def deco(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") not in ("", "/metrics"):
+            self.send_error(404)
+            return
+        body = TRACER.prometheus_text().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass  # scrapes every few seconds, don't spam the log
+
+
+def start_metrics_server(port, host="127.0.0.1"):
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    log.info(f"Prometheus metrics on http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,29 @@
+import os
+import sqlite3
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from src import database_setup
+
+
+@pytest.fixture(scope="session")
+def db_path(tmp_path_factory):
+    # Small generated db, tests never touch the tracked data/print_analytics.db
+    path = str(tmp_path_factory.mktemp("db") / "t.db")
+    database_setup.build_db(path, 500, seed=1)
+    return path
+
+
+@pytest.fixture(scope="session")
+def bare_db_path(db_path, tmp_path_factory):
+    # Just print_jobs, like a db from before the rollup and search index existed
+    path = str(tmp_path_factory.mktemp("db") / "bare.db")
+    with sqlite3.connect(path) as conn:
+        conn.execute("ATTACH DATABASE ? AS src", (db_path,))
+        conn.execute("CREATE TABLE print_jobs AS SELECT * FROM src.print_jobs")
+    conn.close()
+    return path
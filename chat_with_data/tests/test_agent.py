@@ -0,0 +1,96 @@
+"""
+Streaming turns against a scripted client that rejects requests the way the
+OpenAI API does when an assistant tool_calls message lacks its tool replies.
+
+    python -m pytest tests/test_agent.py
+"""
+import json
+import threading
+from types import SimpleNamespace
+
+from src import agent as agent_module
+from src.agent import AsyncDataAgent, DataAgent
+from src.tools import execute_tool
+
+SQL = "SELECT COUNT(*) FROM print_jobs"
+
+
+def _chunk(content=None, tool_calls=None):
+    delta = SimpleNamespace(content=content, tool_calls=tool_calls)
+    return SimpleNamespace(choices=[SimpleNamespace(delta=delta)], usage=None)
+
+
+class StreamingClient:
+    # Asks for SQL while the user spoke last and tools are offered, answers otherwise
+    def __init__(self):
+        self.requests = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    async def _create(self, **kwargs):
+        messages = kwargs["messages"]
+        for i, m in enumerate(messages):
+            if m.get("role") == "assistant" and m.get("tool_calls"):
+                replied = {r.get("tool_call_id") for r in messages[i + 1:i + 1 + len(m["tool_calls"])]}
+                if replied != {tc["id"] for tc in m["tool_calls"]}:
+                    raise RuntimeError("400: tool_calls must be followed by tool messages")
+        self.requests.append(kwargs)
+
+        if kwargs.get("tools") and messages[-1]["role"] == "user":
+            part = SimpleNamespace(index=0, id=f"call_{len(self.requests)}",
+                                   function=SimpleNamespace(name="query_database", arguments=json.dumps({"query": SQL})))
+            chunks = [_chunk(tool_calls=[part])]
+        else:
+            chunks = [_chunk("There are "), _chunk("500 prints.")]
+
+        async def stream():
+            for c in chunks:
+                yield c
+        return stream()
+
+
+def test_stream_closed_mid_tool_call_rolls_back(db_path, monkeypatch):
+    client = StreamingClient()
+    agent = DataAgent("test-key", config={"db_path": db_path}, client=client)
+    before = list(agent.history)
+
+    # hold the tool call until the stream is gone, or the turn may finish first
+    closed = threading.Event()
+
+    def slow_tool(*args):
+        closed.wait(5)
+        return execute_tool(*args)
+
+    monkeypatch.setattr(agent_module, "execute_tool", slow_tool)
+    events = agent.chat_stream("how many prints?")
+    for ev in events:
+        if ev["type"] == "tool_start":
+            break
+    events.close()  # what a Streamlit rerun does to the generator
+    closed.set()
+
+    assert agent.history == before
+    done = [ev for ev in agent.chat_stream("q2") if ev["type"] == "done"]
+    assert done and done[0]["text"] == "There are 500 prints."
+    assert [m["role"] for m in agent.history[1:]] == ["user", "assistant", "tool", "assistant"]
+
+
+def test_rollup_only_offered_when_the_db_has_it(db_path, bare_db_path):
+    agent = AsyncDataAgent("test-key", config={"db_path": db_path}, client=StreamingClient())
+    query_tool = next(t for t in agent.tools if t["function"]["name"] == "query_database")
+    assert "print_daily_rollup" in agent.history[0]["content"]
+    assert "print_daily_rollup" in query_tool["function"]["description"]
+
+    agent = AsyncDataAgent("test-key", config={"db_path": bare_db_path}, client=StreamingClient())
+    query_tool = next(t for t in agent.tools if t["function"]["name"] == "query_database")
+    assert "print_daily_rollup" not in agent.history[0]["content"]
+    assert "print_daily_rollup" not in query_tool["function"]["description"]
+
+
+def test_search_only_offered_when_the_db_has_the_index(db_path, bare_db_path):
+    agent = AsyncDataAgent("test-key", config={"db_path": db_path}, client=StreamingClient())
+    assert "search_prints" in [t["function"]["name"] for t in agent.tools]
+    assert "search_prints" in agent.history[0]["content"]
+
+    agent = AsyncDataAgent("test-key", config={"db_path": bare_db_path}, client=StreamingClient())
+    assert "search_prints" not in [t["function"]["name"] for t in agent.tools]
+    assert "search_prints" not in agent.history[0]["content"]
@@ -0,0 +1,47 @@
+"""
+Query limits as the agent sees them through query_database.
+
+    python -m pytest tests/test_governor.py
+"""
+from src.governor import QueryGovernor
+from src.tools import query_db
+
+
+def test_no_step_limit_by_default(db_path):
+    governor = QueryGovernor()
+    assert governor.max_steps is None
+    assert query_db("SELECT COUNT(*) FROM print_jobs", db_path=db_path, governor=governor)["success"]
+
+
+def test_aggregate_is_not_told_to_aggregate(db_path):
+    governor = QueryGovernor(max_steps=1_000)
+    grouped = query_db("SELECT a.printer_name, COUNT(*) FROM print_jobs a JOIN print_jobs b ON a.cost_usd < b.cost_usd GROUP BY 1",
+                       db_path=db_path, governor=governor)
+    assert grouped["error_type"] == "too_many_steps"
+    assert "GROUP BY" not in grouped["hint"]
+
+    rows = query_db("SELECT a.id FROM print_jobs a JOIN print_jobs b ON a.cost_usd < b.cost_usd ORDER BY a.id + b.id",
+                    db_path=db_path, governor=governor)
+    assert rows["error_type"] == "too_many_steps"
+    assert "aggregate with GROUP BY" in rows["hint"]
+
+
+class FakeConn:
+    # stands in for a connection mid-statement, counts interrupts
+    def __init__(self):
+        self.interrupts = 0
+
+    def interrupt(self):
+        self.interrupts += 1
+
+
+def test_child_cancel_leaves_siblings_running():
+    session = QueryGovernor(session_seconds=60)
+    first, second = session.child(), session.child()
+    a, b = FakeConn(), FakeConn()
+    with first.guard(a), second.guard(b):
+        first.cancel()  # what a tool timeout does
+        assert (a.interrupts, b.interrupts) == (1, 0)
+        session.cancel()  # the whole session still reaches both
+        assert (a.interrupts, b.interrupts) == (2, 1)
+    assert session.used_seconds > 0 and not session._active
@@ -0,0 +1,43 @@
+import gzip
+import shutil
+import sqlite3
+
+import pytest
+
+from src import ingest
+
+
+def _count(path):
+    with sqlite3.connect(path) as conn:
+        return conn.execute("SELECT COUNT(*) FROM print_jobs").fetchone()[0]
+
+
+def test_interrupted_gz_resumes(db_path, tmp_path, monkeypatch):
+    db = str(tmp_path / "ingest.db")
+    shutil.copy(db_path, db)
+    log = tmp_path / "log.csv.gz"
+    with gzip.open(log, "wt") as f:
+        f.write("date,printer,material,model\n")
+        for i in range(25):
+            f.write(f"2030-01-01 {i // 60:02d}:{i % 60:02d}:00,Test Printer,PLA,part_{i}\n")
+    before = _count(db)
+
+    real_write = ingest.Ingestor._write
+    calls = []
+
+    def crash_on_second(self, *args):
+        calls.append(1)
+        if len(calls) == 2:
+            raise KeyboardInterrupt
+        return real_write(self, *args)
+
+    monkeypatch.setattr(ingest.Ingestor, "_write", crash_on_second)
+    with pytest.raises(KeyboardInterrupt):
+        ingest.Ingestor(db, batch_rows=10).ingest_file(str(log))
+    monkeypatch.undo()
+    assert _count(db) == before + 10
+
+    assert ingest.Ingestor(db, batch_rows=10).ingest_file(str(log)) == 15
+    assert _count(db) == before + 25
+    # read to the end now, so it isn't read again
+    assert ingest.Ingestor(db, batch_rows=10).ingest_file(str(log)) == 0
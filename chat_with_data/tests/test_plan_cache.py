@@ -0,0 +1,92 @@
+"""
+Plan cache end to end: the agent talks to a fake OpenAI client, so every test
+can assert exactly how many LLM calls a question cost.
+
+    python -m pytest tests/test_plan_cache.py
+"""
+import os
+import json
+import asyncio
+import sqlite3
+from types import SimpleNamespace
+
+import pytest
+
+from src import plan_cache
+from src.agent import AsyncDataAgent
+
+SQL = "SELECT COUNT(*) AS failed FROM print_jobs WHERE success_status = 0"
+QUESTION = "How many prints failed?"
+
+
+class FakeClient:
+    # Stands in for AsyncOpenAI. While tools are offered and the user spoke
+    # last it asks for SQL, otherwise it answers. Every request is kept.
+    def __init__(self):
+        self.requests = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    async def _create(self, **kwargs):
+        self.requests.append(kwargs)
+        if kwargs.get("tools") and kwargs["messages"][-1]["role"] == "user":
+            call = SimpleNamespace(id="call_1", type="function",
+                                   function=SimpleNamespace(name="query_database", arguments=json.dumps({"query": SQL})))
+            message = SimpleNamespace(content=None, tool_calls=[call])
+        else:
+            message = SimpleNamespace(content="Some prints failed.", tool_calls=None)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)],
+                               usage=SimpleNamespace(prompt_tokens=100, completion_tokens=10))
+
+
+def ask(question, config):
+    # a fresh agent per question, so every question is standalone (cacheable)
+    client = FakeClient()
+    agent = AsyncDataAgent("test-key", config=config, client=client)
+    text = asyncio.run(agent.chat(question))
+    return agent, client, text
+
+
+@pytest.fixture
+def config(db_path, tmp_path):
+    return {"db_path": db_path, "plan_cache": str(tmp_path / "plans.db")}
+
+
+def test_miss_stores_sql(config):
+    agent, client, _ = ask(QUESTION, config)
+    assert len(client.requests) == 2  # planning call + answer
+    assert agent.plans.get(agent.db_key, QUESTION) == [SQL]
+    assert agent.turn_tokens[-1]["from_plan_cache"] is False
+
+
+def test_normalized_hit_replays_with_one_toolless_call(config):
+    ask(QUESTION, config)
+    agent, client, text = ask("hey, can you tell me how many prints failed", config)
+    assert len(client.requests) == 1
+    assert "tools" not in client.requests[0]
+    assert agent.last_queries == [SQL]
+    assert agent.turn_tokens[-1]["from_plan_cache"] is True
+    assert text == "Some prints failed."
+
+
+def test_template_mode_makes_no_calls(config):
+    ask(QUESTION, config)
+    agent, client, text = ask(QUESTION, dict(config, plan_cache_mode="template"))
+    assert client.requests == []
+    assert agent.last_queries == [SQL]
+    assert text.startswith("Here's what the data says")
+
+
+def test_expired_entries_are_evicted(config, monkeypatch):
+    cache = plan_cache.PlanCache(config["plan_cache"], ttl=60)
+    monkeypatch.setitem(plan_cache._caches, config["plan_cache"], cache)
+    ask(QUESTION, config)
+    cache.put(os.path.abspath(config["db_path"]), "which printer is busiest", ["SELECT 1"])
+
+    now = plan_cache.time.time()
+    monkeypatch.setattr(plan_cache.time, "time", lambda: now + 120)
+    # expired -> planned again from scratch, and the put evicts what's stale
+    _, client, _ = ask(QUESTION, config)
+    assert len(client.requests) == 2
+    with sqlite3.connect(config["plan_cache"]) as conn:
+        questions = [r[0] for r in conn.execute("SELECT question FROM plans")]
+    assert questions == [plan_cache.normalize_question(QUESTION)]
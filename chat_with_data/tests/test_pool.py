@@ -0,0 +1,15 @@
+"""
+The pool is read-only: opening one must not change the db file.
+
+    python -m pytest tests/test_pool.py
+"""
+import sqlite3
+
+from src.pool import get_pool
+
+
+def test_pool_leaves_journal_mode_alone(bare_db_path):
+    with get_pool(bare_db_path).connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM print_jobs").fetchone()[0] == 500
+    with sqlite3.connect(bare_db_path) as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "delete"
@@ -0,0 +1,22 @@
+"""
+search_prints on a db with the print_search index and on one without it,
+where it falls back to a LIKE scan of print_jobs.
+
+    python -m pytest tests/test_search.py
+"""
+from src.tools import search_prints
+
+
+def test_like_fallback_matches_fulltext(db_path, bare_db_path):
+    for text, field in [("dragon", "any"), ("warp", "failure"), ("gear", "model")]:
+        indexed = search_prints(text, field, db_path=db_path)
+        scanned = search_prints(text, field, db_path=bare_db_path)
+        assert indexed["success"] and scanned["success"], scanned
+        assert "LIKE" in scanned["match"] and indexed["matches"]["jobs"] > 0
+        assert scanned["matches"]["jobs"] >= indexed["matches"]["jobs"]
+
+
+def test_like_fallback_retries_with_any_word(bare_db_path):
+    result = search_prints("dragon zzzqqq", db_path=bare_db_path)
+    assert result["success"] and result["matches"]["jobs"] > 0
+    assert " OR " in result["match"]